@@ -263,6 +263,7 @@ echo ""
 echo "3️⃣  配置定时任务："
 echo "   crontab -e"
 echo "   添加: 0 9-11 * * * $INSTALL_DIR/venv/bin/python3 $INSTALL_DIR/src/scheduler_v2.py >> $INSTALL_DIR/logs/cron.log 2>&1"
+echo "   或使用常驻模式（推荐，二选一）: sudo cp $INSTALL_DIR/deploy/xhs-bot.service /etc/systemd/system/ && sudo systemctl enable --now xhs-bot"
 echo ""
 echo -e "${YELLOW}⚠️  重要提示：${NC}"
 echo "   MCP服务需要在本地（Mac）运行，不在服务器上"
@@ -2,7 +2,7 @@
 Prompt模板管理（V2）
 """
 
-from .guide_content import GUIDE_CONTENT_PROMPT
+from .guide_content import GUIDE_SYSTEM_PROMPT, GUIDE_USER_PROMPT
 
-__all__ = ['GUIDE_CONTENT_PROMPT']
+__all__ = ['GUIDE_SYSTEM_PROMPT', 'GUIDE_USER_PROMPT']
 
@@ -9,9 +9,16 @@
 5. 记录到飞书
 """
 
+import os
 import sys
+import time
+import asyncio
+import random
+import signal
 import argparse
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -31,19 +38,38 @@ from src.steps.step3_generate_guide import generate_guide_content
 from src.steps.text_card_mode import generate_text_card_content
 from src.steps.step5_publish import publish_to_xhs
 from src.steps.step6_logging import log_to_feishu
+from src.services.xhs_mcp_client import get_shared_client, run_async, shutdown_runtime
+from src.services.http_session import close_sessions
+from src.services.cassette import get_cassette
+from src.services.llm_cache import enable_llm_cache_reads
+from src.utils.tracing import start_trace, finish_trace, span, bind_context
+
+# 发布时间窗口（常驻模式在窗口内按当天的种子随机选择发布时间）
+PUBLISH_WINDOW_START = os.getenv("PUBLISH_WINDOW_START", "09:00")
+PUBLISH_WINDOW_END = os.getenv("PUBLISH_WINDOW_END", "11:00")
+
+# 常驻模式提前多少分钟准备内容（Step 0-4），到点只执行 Step 5 发布
+DAEMON_PREPARE_MINUTES = float(os.getenv("DAEMON_PREPARE_MINUTES", "15"))
+
+# 常驻模式每天准备内容前检查MCP会话的超时时间（秒）
+MCP_HEALTH_CHECK_TIMEOUT = 30
+
+# 常驻模式收到 SIGTERM / SIGINT 后设置
+_daemon_stop = threading.Event()
+
+
+class PublishCancelled(Exception):
+    """常驻进程在等待发布时间时被停止（已准备的内容不发布）"""
 
 
 def check_login_before_run():
     """在运行前检查登录状态"""
-    import asyncio
-    from src.services.xhs_mcp_client import XhsMcpClient
-    
     logger.info("="*60)
     logger.info("🔐 检查小红书登录状态...")
     logger.info("="*60)
     
     async def _check():
-        client = XhsMcpClient()
+        client = get_shared_client()
         try:
             status = await client.check_login_status()
             
@@ -61,7 +87,6 @@ def check_login_before_run():
                 logger.debug(f"二维码结果: {qr_result}")
                 
                 # 检查图片是否保存成功
-                import os
                 if not os.path.exists(qr_path):
                     logger.warning("二维码图片未生成，请检查MCP服务")
                 
@@ -77,7 +102,7 @@ def check_login_before_run():
             logger.warning("将继续执行，但可能会因为未登录而失败")
             return True  # 继续执行，让后续步骤处理错误
     
-    return asyncio.run(_check())
+    return run_async(_check())
 
 
 def main():
@@ -86,38 +111,194 @@ def main():
     parser.add_argument('--test', action='store_true', help='测试模式（不真正发布）')
     parser.add_argument('--city', type=str, help='指定城市（用于测试）')
     parser.add_argument('--force', action='store_true', help='强制执行（忽略时间窗口）')
+    parser.add_argument('--daemon', action='store_true', help='常驻模式：每天在发布窗口内的随机时间发布，提前准备内容')
     parser.add_argument('--skip-login-check', action='store_true', help='跳过登录检查')
+    parser.add_argument('--llm-cache', action='store_true', help='使用缓存的AI文案（重跑失败的当天任务时避免重复调用）')
+    parser.add_argument('--startup-profile', action='store_true', help='分析冷启动耗时（各模块导入耗时，-X importtime 格式）后退出')
     args = parser.parse_args()
     
-    # 检查登录状态（除非明确跳过）
-    if not args.skip_login_check:
-        if not check_login_before_run():
-            logger.error("❌ 未登录，退出执行")
-            sys.exit(1)
-    
-    if args.test:
-        logger.info("🧪 测试模式 V2")
-        run_test_mode(args.city)
-    else:
-        # 正常模式：由外部定时任务控制随机时间，直接执行
-        if args.force:
-            logger.info("🚀 强制执行模式")
+    if args.startup_profile:
+        from src.utils.startup_profile import profile_startup
+        print(profile_startup().format_report())
+        return
+    
+    if args.llm_cache:
+        enable_llm_cache_reads()
+    
+    try:
+        # 检查登录状态（除非明确跳过；常驻模式在每次准备内容前检查）
+        if not args.skip_login_check and not args.daemon:
+            if not check_login_before_run():
+                logger.error("❌ 未登录，退出执行")
+                sys.exit(1)
+        
+        if args.test:
+            logger.info("🧪 测试模式 V2")
+            run_test_mode(args.city)
+        elif args.daemon:
+            run_daemon_mode(args.city, check_login=not args.skip_login_check)
         else:
-            logger.info("🚀 开始执行（时间由定时任务控制）")
-        run_normal_mode(args.city)
+            # 正常模式：由外部定时任务控制随机时间，直接执行
+            if args.force:
+                logger.info("🚀 强制执行模式")
+            else:
+                logger.info("🚀 开始执行（时间由定时任务控制）")
+            run_normal_mode(args.city)
+    finally:
+        # 关闭共享的MCP会话、事件循环和HTTP连接池
+        shutdown_runtime()
+        close_sessions()
 
 
 def should_run_now():
     """判断当前是否应该执行"""
-    return RandomHelper.should_run_now("08:00", "10:00")
+    return RandomHelper.should_run_now(PUBLISH_WINDOW_START, PUBLISH_WINDOW_END)
 
 
-def run_normal_mode(city=None):
-    """正常模式：完整流程（支持双模式）"""
-    import random
+def run_daemon_mode(city=None, check_login=True):
+    """
+    常驻模式：每天在发布窗口内的随机时间发布一篇
+    
+    发布时间由 RandomHelper.next_publish_time 按当天的种子计算，提前 DAEMON_PREPARE_MINUTES 分钟
+    执行 Step 0-4（生成上下文、搜索、下载图片、生成文案），然后睡眠到发布时间只执行 Step 5。
+    MCP会话、飞书 access_token、AI客户端和HTTP连接池在进程内复用，不必每次冷启动重新建立。
+    
+    Args:
+        city: 指定城市（默认按权重随机）
+        check_login: 每次准备内容前检查小红书登录状态
+    """
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, _request_daemon_stop)
+    
+    logger.info("="*60)
+    logger.info(f"🌙 常驻模式：每天 {PUBLISH_WINDOW_START}-{PUBLISH_WINDOW_END} 随机时间发布，提前 {DAEMON_PREPARE_MINUTES:g} 分钟准备内容")
+    logger.info("="*60)
+    
+    while not _daemon_stop.is_set():
+        publish_at = RandomHelper.next_publish_time(PUBLISH_WINDOW_START, PUBLISH_WINDOW_END)
+        # 计算发布时间会用当天的种子重置全局随机数，恢复为真随机（不影响模式选择）
+        random.seed()
+        prepare_at = publish_at - timedelta(minutes=DAEMON_PREPARE_MINUTES)
+        logger.info(f"📅 下次发布: {publish_at.strftime('%Y-%m-%d %H:%M:%S')}（{prepare_at.strftime('%H:%M:%S')} 开始准备内容）")
+        
+        if not _sleep_until(prepare_at):
+            break
+        
+        # 常驻会话可能已在空闲期间断开（服务重启、网络中断），先检查再使用
+        _check_mcp_session()
+        
+        if check_login and not check_login_before_run():
+            logger.error("❌ 未登录，跳过本次发布")
+        else:
+            try:
+                run_normal_mode(city, publish_at=publish_at)
+            except Exception as e:
+                logger.exception(f"❌ 本次发布异常: {e}")
+        
+        # 准备失败时等过发布时间再计算下一次，避免同一天重复发布
+        _sleep_until(publish_at)
+    
+    logger.info("🌙 收到停止信号，常驻模式已停止")
+
+
+def _check_mcp_session():
+    """
+    检查共享的MCP会话是否可用，不可用时关闭并重新连接
+    
+    调用一次 check_login_status 作为健康检查；连接从未建立时跳过（第一次调用时自动连接）。
+    """
+    async def _check():
+        client = get_shared_client()
+        if client.tools is None:
+            return
+        try:
+            await asyncio.wait_for(client.call_tool("check_login_status", {}), timeout=MCP_HEALTH_CHECK_TIMEOUT)
+            logger.info("✅ MCP会话正常")
+        except Exception as e:
+            logger.warning(f"⚠️  MCP会话不可用（{e!r}），重新连接")
+            await client.reconnect()
+            logger.info("✅ MCP会话已重建")
+    
+    try:
+        run_async(_check())
+    except Exception as e:
+        logger.error(f"❌ 重新连接MCP服务失败: {e}")
+
+
+def _request_daemon_stop(signum, frame):
+    """
+    SIGTERM / SIGINT：停止常驻模式（正在等待发布的内容不再发布）
+    
+    信号处理函数里只设置标志，不写日志（主线程可能正持有日志的锁）。
+    """
+    _daemon_stop.set()
+
+
+def _sleep_until(target):
+    """
+    睡眠到指定时间（带时区的 datetime）
+    
+    每次最多睡60秒，醒来后按系统时间重新计算剩余时间（系统时间校正、休眠唤醒后不会错过），
+    最后一段精确睡到目标时间。
+    
+    Returns:
+        到达目标时间返回 True，收到停止信号返回 False
+    """
+    while True:
+        remaining = (target - datetime.now(target.tzinfo)).total_seconds()
+        if remaining <= 0:
+            return True
+        if _daemon_stop.wait(min(remaining, 60)):
+            return False
+
+
+def _wait_for_publish_time(publish_at):
+    """
+    等到发布时间（常驻模式提前准备好内容后调用）
+    
+    Returns:
+        等待的秒数（不计入发布耗时）
+    
+    Raises:
+        PublishCancelled: 等待期间收到停止信号
+    """
+    if publish_at is None:
+        return 0.0
+    
+    now = datetime.now(publish_at.tzinfo)
+    if now >= publish_at:
+        logger.warning(f"⚠️  内容准备完成时已过发布时间 {publish_at.strftime('%H:%M:%S')}，立即发布")
+        return 0.0
+    
+    logger.info(f"\n⏳ 内容已准备好，等待发布时间 {publish_at.strftime('%H:%M:%S')}（{(publish_at - now).total_seconds():.0f}秒）")
+    start = time.perf_counter()
+    with span("等待发布时间"):
+        if not _sleep_until(publish_at):
+            raise PublishCancelled("常驻进程已停止，取消本次发布")
+    return time.perf_counter() - start
+
+
+def run_normal_mode(city=None, mode=None, publish_at=None):
+    """
+    正常模式：完整流程（支持双模式）
+    
+    Args:
+        city: 指定城市（默认按权重随机）
+        mode: 'travel' 或 'text_card'（默认按比例随机）
+        publish_at: 发布时间（常驻模式）。准备好内容后等到该时间再执行 Step 5，默认立即发布
+    """
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        # 回放：使用录制时的模式和城市
+        mode = mode or cassette.meta.get('mode')
+        city = city or cassette.meta.get('city')
     
     # 随机决定使用哪种模式：80% 旅游攻略，20% 文字卡片
-    mode = 'travel' if random.random() < 0.8 else 'text_card'
+    if mode is None:
+        mode = 'travel' if random.random() < 0.8 else 'text_card'
+    
+    if cassette is not None:
+        cassette.note(mode=mode, date=datetime.now().strftime('%Y-%m-%d'))
     
     logger.info("="*60)
     logger.info("🚀 小红书自动发布系统 V2（双模式）")
@@ -127,7 +308,7 @@ def run_normal_mode(city=None):
     
     if mode == 'text_card':
         # 模式2：文字卡片模式
-        return run_text_card_mode()
+        return run_text_card_mode(publish_at)
     
     # 模式1：旅游攻略模式
     ctx = None
@@ -137,32 +318,34 @@ def run_normal_mode(city=None):
     }
     downloader = None
     current_step = "初始化"
+    waited = 0.0
     
     start_time = datetime.now()
+    trace = start_trace("travel", city=city)
     
     try:
         # Step 0: 生成上下文
         current_step = "Step 0: 生成上下文"
         logger.info(f"\n▶️  {current_step}")
-        ctx = generate_context(city=city)
+        with span(current_step):
+            ctx = generate_context(city=city)
         logger.info(f"   城市: {ctx['city']}")
+        trace.root.set(city=ctx['city'], topic=ctx.get('topic_name'))
+        if cassette is not None:
+            cassette.note(city=ctx['city'])
         
         # Step 1: 从小红书搜索内容
         current_step = "Step 1: 搜索小红书内容"
         logger.info(f"\n▶️  {current_step}")
-        xhs_data = search_xhs_content(ctx)
+        with span(current_step):
+            xhs_data = search_xhs_content(ctx)
         
-        # Step 2: 下载并处理图片
+        # Step 2 + Step 3: 并行执行（Step 3 只依赖 ctx 和 xhs_data，不需要本地图片）
         current_step = "Step 2: 下载并处理图片"
-        logger.info(f"\n▶️  {current_step}")
-        image_data = download_and_process_images(xhs_data)
+        logger.info(f"\n▶️  {current_step}（Step 3 AI生成攻略文案 同时进行）")
+        image_data, content = _overlap_images_and_guide(ctx, xhs_data)
         downloader = image_data['downloader']
         
-        # Step 3: 生成攻略式文案
-        current_step = "Step 3: AI生成攻略文案"
-        logger.info(f"\n▶️  {current_step}")
-        content = generate_guide_content(ctx, xhs_data)
-        
         # Step 4: 组装发布数据
         current_step = "Step 4: 组装发布数据"
         logger.info(f"\n▶️  {current_step}")
@@ -178,10 +361,13 @@ def run_normal_mode(city=None):
         logger.info(f"   图片: {len(post['images'])}张（本地路径）")
         logger.info(f"   标签: {len(post['tags'])}个")
         
+        waited = _wait_for_publish_time(publish_at)
+        
         # Step 5: 发布到小红书
         current_step = "Step 5: MCP发布到小红书"
         logger.info(f"\n▶️  {current_step}")
-        publish_result = publish_to_xhs(post)
+        with span(current_step):
+            publish_result = publish_to_xhs(post)
         
         # 记录成功
         result['status'] = 'success'
@@ -189,17 +375,28 @@ def run_normal_mode(city=None):
         result['publish_time'] = publish_result.get('publish_time')
         result['title'] = post['title']  # 保存标题用于飞书通知
         
-        # 计算耗时
-        duration = (datetime.now() - start_time).total_seconds()
+        # 记录已发布图片的感知哈希，避免以后重复发布
+        try:
+            downloader.record_published(post['images'])
+        except Exception as e:
+            logger.warning(f"记录已发布图片哈希失败: {e}")
+        
+        # 计算耗时（不含等待发布时间）
+        duration = (datetime.now() - start_time).total_seconds() - waited
         result['duration'] = f"{duration:.1f}"
         
         logger.info("\n" + "="*60)
         logger.info("✅ 发布成功")
         logger.info(f"⏱️  总耗时: {duration:.1f}秒")
         logger.info("="*60)
+    
+    except PublishCancelled as e:
+        logger.warning(f"⚠️  {e}")
+        result['status'] = 'cancelled'
         
     except Exception as e:
         logger.exception(f"❌ 执行失败: {e}")
+        current_step = getattr(e, 'failed_step', current_step)
         result['status'] = 'failed'
         result['error'] = str(e)
         result['failed_step'] = current_step
@@ -215,8 +412,8 @@ def run_normal_mode(city=None):
         # 立即发送失败通知
         logger.info("\n⚠️  检测到执行失败，立即发送飞书通知")
         try:
-            from src.services.feishu_client import FeishuClient
-            feishu = FeishuClient()
+            from src.services.feishu_client import get_shared_feishu_client
+            feishu = get_shared_feishu_client()
             simple_ctx = ctx if ctx else {'city': city if city else '未知', 'topic': '旅游攻略'}
             feishu.send_failure_notification(
                 simple_ctx, 
@@ -236,14 +433,68 @@ def run_normal_mode(city=None):
             except Exception as e:
                 logger.warning(f"清理临时文件失败: {e}")
         
-        # Step 6: 记录到飞书
-        if ctx:
+        # Step 6: 记录到飞书（附带各步骤耗时；取消发布时不记录）
+        if ctx and result['status'] != 'cancelled':
             logger.info("\n▶️  Step 6: 记录到飞书")
+            result['step_timings'] = trace.step_summary()
             try:
-                log_to_feishu(ctx, result)
+                with span("Step 6: 记录到飞书"):
+                    log_to_feishu(ctx, result)
                 logger.info("✅ 飞书记录完成")
             except Exception as e:
                 logger.error(f"❌ 飞书记录失败: {e}")
+        
+        finish_trace(trace, status=result['status'], failed_step=result.get('failed_step'))
+
+
+def _overlap_images_and_guide(ctx, xhs_data):
+    """
+    并行执行 Step 2（下载并处理图片）和 Step 3（AI生成攻略文案）
+    
+    Step 3 只需要 ctx 和 xhs_data，不依赖本地图片，所以在后台线程中先发起
+    大模型调用，主线程同时下载、裁剪、压缩图片，两者都完成后再返回。
+    
+    Args:
+        ctx: 上下文
+        xhs_data: Step 1 的搜索结果
+    
+    Returns:
+        (image_data, content) 元组
+    
+    Raises:
+        Step 2 或 Step 3 的异常。Step 2 失败时不等待 Step 3 结束，
+        异常上附带 failed_step 属性，便于调度器记录失败步骤。
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="step3")
+    guide_future = executor.submit(bind_context(_generate_guide_step), ctx, xhs_data)
+    
+    try:
+        try:
+            with span("Step 2: 下载并处理图片"):
+                image_data = download_and_process_images(xhs_data)
+        except Exception as e:
+            e.failed_step = "Step 2: 下载并处理图片"
+            raise
+        
+        try:
+            content = guide_future.result()
+        except Exception as e:
+            # Step 3 失败时清理已下载的图片
+            image_data['downloader'].cleanup()
+            e.failed_step = "Step 3: AI生成攻略文案"
+            raise
+        
+        logger.info("✅ Step 2 / Step 3 均已完成")
+        return image_data, content
+    
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _generate_guide_step(ctx, xhs_data):
+    """Step 3（在后台线程中运行，记录为独立的步骤 span）"""
+    with span("Step 3: AI生成攻略文案"):
+        return generate_guide_content(ctx, xhs_data)
 
 
 def run_test_mode(city=None):
@@ -252,28 +503,31 @@ def run_test_mode(city=None):
     logger.info("🧪 测试模式 V2 - 使用小红书真实内容")
     logger.info("="*60)
     
+    # 测试模式反复运行同样的内容，默认使用缓存的AI文案
+    enable_llm_cache_reads()
+    
     downloader = None
+    trace = start_trace("test", city=city)
+    status = "failed"
     
     try:
         # Step 0: 生成上下文
-        ctx = generate_context(city=city)
+        with span("Step 0: 生成上下文"):
+            ctx = generate_context(city=city)
         logger.info(f"\n📋 城市: {ctx['city']}")
         
         # Step 1: 从小红书搜索
         logger.info(f"\n▶️  Step 1: 从小红书搜索内容")
-        xhs_data = search_xhs_content(ctx)
+        with span("Step 1: 搜索小红书内容"):
+            xhs_data = search_xhs_content(ctx)
         logger.info(f"   找到 {len(xhs_data['images'])} 张图片")
         logger.info(f"   参考标题: {xhs_data.get('reference_title', 'N/A')[:50]}")
         
-        # Step 2: 下载图片
-        logger.info(f"\n▶️  Step 2: 下载并处理图片")
-        image_data = download_and_process_images(xhs_data)
+        # Step 2 + Step 3: 下载图片的同时生成文案
+        logger.info(f"\n▶️  Step 2: 下载并处理图片 / Step 3: 生成攻略式文案（并行）")
+        image_data, content = _overlap_images_and_guide(ctx, xhs_data)
         downloader = image_data['downloader']
         logger.info(f"   成功处理 {len(image_data['local_images'])} 张图片")
-        
-        # Step 3: 生成文案
-        logger.info(f"\n▶️  Step 3: 生成攻略式文案")
-        content = generate_guide_content(ctx, xhs_data)
         logger.info(f"\n✍️  文案:")
         logger.info(f"  标题: {content['title']}")
         logger.info(f"  正文:\n{content['content'][:300]}...")
@@ -282,6 +536,7 @@ def run_test_mode(city=None):
         logger.info("\n" + "="*60)
         logger.info("✅ 测试完成（未实际发布）")
         logger.info("="*60)
+        status = "success"
         
     except Exception as e:
         logger.exception(f"❌ 测试失败: {e}")
@@ -294,23 +549,33 @@ def run_test_mode(city=None):
                 downloader.cleanup()
             except Exception as e:
                 logger.warning(f"清理临时文件失败: {e}")
+        
+        finish_trace(trace, status=status)
 
 
-def run_text_card_mode():
-    """文字卡片模式：生成纯色背景+一句话内容"""
+def run_text_card_mode(publish_at=None):
+    """
+    文字卡片模式：生成纯色背景+一句话内容
+    
+    Args:
+        publish_at: 发布时间（常驻模式）。生成卡片后等到该时间再发布，默认立即发布
+    """
     result = {
         'status': 'unknown',
         'error': None
     }
     generator = None
     current_step = "初始化"
+    waited = 0.0
     
     start_time = datetime.now()
+    trace = start_trace("text_card")
     
     try:
         # 生成文字卡片内容
         current_step = "生成文字卡片内容"
-        card_data = generate_text_card_content()
+        with span(current_step):
+            card_data = generate_text_card_content()
         generator = card_data.get('generator')
         
         # 组装发布数据
@@ -328,10 +593,13 @@ def run_text_card_mode():
         logger.info(f"   图片: 1张")
         logger.info(f"   标签: {len(post['tags'])}个")
         
+        waited = _wait_for_publish_time(publish_at)
+        
         # 发布到小红书
         current_step = "MCP发布到小红书"
         logger.info(f"\n▶️  {current_step}")
-        publish_result = publish_to_xhs(post)
+        with span(current_step):
+            publish_result = publish_to_xhs(post)
         
         # 记录成功
         result['status'] = 'success'
@@ -339,14 +607,18 @@ def run_text_card_mode():
         result['publish_time'] = publish_result.get('publish_time')
         result['title'] = post['title']
         
-        # 计算耗时
-        duration = (datetime.now() - start_time).total_seconds()
+        # 计算耗时（不含等待发布时间）
+        duration = (datetime.now() - start_time).total_seconds() - waited
         result['duration'] = f"{duration:.1f}"
         
         logger.info("\n" + "="*60)
         logger.info("✅ 发布成功（文字卡片模式）")
         logger.info(f"⏱️  总耗时: {duration:.1f}秒")
         logger.info("="*60)
+    
+    except PublishCancelled as e:
+        logger.warning(f"⚠️  {e}")
+        result['status'] = 'cancelled'
         
     except Exception as e:
         logger.exception(f"❌ 执行失败: {e}")
@@ -363,8 +635,8 @@ def run_text_card_mode():
         # 立即发送失败通知
         logger.info("\n⚠️  检测到执行失败，立即发送飞书通知")
         try:
-            from src.services.feishu_client import FeishuClient
-            feishu = FeishuClient()
+            from src.services.feishu_client import get_shared_feishu_client
+            feishu = get_shared_feishu_client()
             simple_ctx = {'city': '文字卡片', 'topic': '日常分享'}
             feishu.send_failure_notification(
                 simple_ctx, 
@@ -384,14 +656,19 @@ def run_text_card_mode():
             except Exception as e:
                 logger.warning(f"清理临时文件失败: {e}")
         
-        # 记录到飞书（使用简单的ctx）
-        logger.info("\n▶️  记录到飞书")
-        try:
-            ctx = {'city': '文字卡片', 'topic': '日常分享'}
-            log_to_feishu(ctx, result)
-            logger.info("✅ 飞书记录完成")
-        except Exception as e:
-            logger.error(f"❌ 飞书记录失败: {e}")
+        # 记录到飞书（使用简单的ctx；取消发布时不记录）
+        if result['status'] != 'cancelled':
+            logger.info("\n▶️  记录到飞书")
+            result['step_timings'] = trace.step_summary()
+            try:
+                ctx = {'city': '文字卡片', 'topic': '日常分享'}
+                with span("记录到飞书"):
+                    log_to_feishu(ctx, result)
+                logger.info("✅ 飞书记录完成")
+            except Exception as e:
+                logger.error(f"❌ 飞书记录失败: {e}")
+        
+        finish_trace(trace, status=result['status'], failed_step=result.get('failed_step'))
     
     return result
 
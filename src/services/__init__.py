@@ -1,34 +1,106 @@
-"""服务层模块（V2）"""
+"""
+服务层模块（V2）
+
+各客户端在第一次使用时才导入（PEP 562），openai、langchain_mcp_adapters、PIL 等依赖导入较慢，
+只用到其中一部分（如 cassette、http_session）时不必全部加载。
+"""
 
 import os
-from .deepseek_client import DeepSeekClient
-from .qwen_client import QwenClient
-from .feishu_client import FeishuClient
-from .xhs_mcp_client import XhsMcpClient
-from .image_downloader import ImageDownloader
+import importlib
+import threading
+from ..utils.logger import logger
+
+# 名称 → 所在模块
+_LAZY_EXPORTS = {
+    "DeepSeekClient": ".deepseek_client",
+    "QwenClient": ".qwen_client",
+    "FeishuClient": ".feishu_client",
+    "XhsMcpClient": ".xhs_mcp_client",
+    "ImageDownloader": ".image_downloader",
+    "HedgedAIClient": ".hedged_client",
+}
+
+
+_shared_ai_client = None
+_shared_ai_lock = threading.Lock()
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
 
 
 def get_ai_client():
     """
     根据配置获取AI客户端
     
+    AI_PROVIDER=hedged 时同时使用两家（见 HedgedAIClient），
+    只配置了一家的密钥时退回单个服务商。
+    
     Returns:
-        DeepSeekClient 或 QwenClient
+        DeepSeekClient、QwenClient 或 HedgedAIClient
     """
     provider = os.getenv("AI_PROVIDER", "deepseek").lower()
     
-    if provider == "qwen":
+    if provider == "hedged":
+        return _get_hedged_client()
+    elif provider == "qwen":
+        from .qwen_client import QwenClient
         return QwenClient()
     else:
+        from .deepseek_client import DeepSeekClient
         return DeepSeekClient()
 
 
+def get_shared_ai_client():
+    """获取进程内共享的AI客户端（常驻模式下复用连接，不必每次重新创建）"""
+    global _shared_ai_client
+    
+    with _shared_ai_lock:
+        if _shared_ai_client is None:
+            _shared_ai_client = get_ai_client()
+        return _shared_ai_client
+
+
+def _get_hedged_client():
+    """按 AI_HEDGE_PRIMARY 排序创建两家客户端"""
+    from .deepseek_client import DeepSeekClient
+    from .qwen_client import QwenClient
+    from .hedged_client import HedgedAIClient, HEDGE_PRIMARY
+    
+    factories = {"deepseek": DeepSeekClient, "qwen": QwenClient}
+    order = sorted(factories, key=lambda name: name != HEDGE_PRIMARY)
+    
+    clients = {}
+    for name in order:
+        try:
+            clients[name] = factories[name]()
+        except ValueError as e:
+            logger.warning(f"对冲请求不使用 {name}: {e}")
+    
+    if not clients:
+        raise ValueError("DEEPSEEK_API_KEY 和 QWEN_API_KEY 均未设置")
+    if len(clients) == 1:
+        return next(iter(clients.values()))
+    return HedgedAIClient(clients)
+
+
 __all__ = [
     "DeepSeekClient",
     "QwenClient",
     "FeishuClient",
     "XhsMcpClient",
     "ImageDownloader",
-    "get_ai_client"
+    "HedgedAIClient",
+    "get_ai_client",
+    "get_shared_ai_client"
 ]
 
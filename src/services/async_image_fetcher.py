@@ -0,0 +1,135 @@
+"""
+异步图片下载
+
+基于 aiohttp 的图片预取：共享一个 ClientSession（限制每个主机的连接数），
+运行在与MCP客户端相同的常驻事件循环上。Step 1 拿到图片URL后立即开始下载，
+图片I/O与剩余的帖子详情请求重叠进行；Step 2 直接取用已下载的数据。
+"""
+
+import os
+import asyncio
+import threading
+from typing import Optional
+from .image_cache import ImageCache
+from .image_downloader import ImageStream, DOWNLOAD_CHUNK_SIZE
+from .cassette import cassette_call_async
+from .xhs_mcp_client import submit_async, register_shutdown_hook
+from ..utils.logger import logger
+from ..utils.tracing import span
+
+# 连接数限制（总数 / 每个主机）
+PREFETCH_LIMIT = int(os.getenv("IMAGE_PREFETCH_LIMIT", "16"))
+PREFETCH_LIMIT_PER_HOST = int(os.getenv("IMAGE_PREFETCH_PER_HOST", "4"))
+
+# 预览图（urlPre）只用于选图打分，不检查最小尺寸
+PREVIEW_MAX_BYTES = 2 * 1024 * 1024
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+
+class AsyncImageFetcher:
+    """异步图片下载器（所有协程都在常驻事件循环上运行）"""
+    
+    def __init__(self, limit: int = PREFETCH_LIMIT, limit_per_host: int = PREFETCH_LIMIT_PER_HOST):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session = None
+        self._cache = None
+        
+        if os.getenv("IMAGE_CACHE", "on").lower() != "off":
+            self._cache = ImageCache()
+    
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """获取共享会话（首次使用时在事件循环内创建）"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self._session
+    
+    async def fetch(self, url: str, preview: bool = False) -> bytes:
+        """
+        流式下载一张图片（与同步下载相同的文件头检查）
+        
+        不在这里重试：预取失败时 Step 2 会回退到带重试的同步下载。
+        
+        Args:
+            url: 图片URL
+            preview: 是否为预览图（不检查最小尺寸，数据上限更小）
+        
+        Raises:
+            ImageRejectedError: 图片不符合要求
+        """
+        with span("image.preview" if preview else "image.prefetch", url=url[:80]) as s:
+            data = await cassette_call_async(
+                "image", "preview" if preview else "original", {"url": url},
+                lambda: self._stream_download(url, preview)
+            )
+            s.set(bytes=len(data))
+        
+        return data
+    
+    async def _stream_download(self, url: str, preview: bool) -> bytes:
+        async with self._get_session().get(url) as response:
+            response.raise_for_status()
+                
+            if preview:
+                stream = ImageStream(min_side=0, max_bytes=PREVIEW_MAX_BYTES)
+            else:
+                stream = ImageStream()
+            stream.check_headers(response.headers.get('Content-Type'), response.headers.get('Content-Length'))
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                stream.feed(chunk)
+            
+        return stream.getvalue()
+    
+    async def _prefetch(self, url: str, preview: bool) -> Optional[bytes]:
+        # 已缓存的原图不再下载（Step 2 直接读缓存）
+        if not preview and self._cache and await asyncio.to_thread(self._cache.lookup, url):
+            return None
+        
+        logger.debug(f"预取{'预览图' if preview else '图片'}: {url[:50]}...")
+        return await self.fetch(url, preview)
+    
+    def prefetch(self, url: str, preview: bool = False):
+        """
+        开始在后台下载图片
+        
+        Args:
+            url: 图片URL
+            preview: 是否为预览图
+        
+        Returns:
+            concurrent.futures.Future，结果为图片数据（原图已缓存时为None）
+        """
+        return submit_async(self._prefetch(url, preview))
+    
+    async def close(self):
+        """关闭会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_fetcher_lock = threading.Lock()
+_shared_fetcher = None
+
+
+def get_image_fetcher() -> AsyncImageFetcher:
+    """获取进程内共享的异步图片下载器"""
+    global _shared_fetcher
+    
+    with _fetcher_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = AsyncImageFetcher()
+            register_shutdown_hook(_shared_fetcher.close)
+        return _shared_fetcher
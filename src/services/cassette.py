@@ -0,0 +1,491 @@
+"""
+录制 / 回放（cassette）
+
+把一次真实运行中的外部响应录制到一个 zip 文件，之后离线原样回放：
+- MCP工具调用结果（搜索、详情、发布、登录状态）
+- 大模型对话接口的响应（完整响应，或流式输出的文本片段）
+- 图片原始数据（原图和预览图）
+
+回放时不访问任何外部服务，按录制顺序快速返回（也可以按录制时的耗时等待），
+用于在真实数据上跑解析/流程基准、离线复现线上某一天的慢运行。
+
+配置（环境变量）：
+    XHS_CASSETTE_MODE     off（默认）/ record / replay
+    XHS_CASSETTE          cassette 文件路径（录制时默认写到 logs/cassettes/）
+    XHS_CASSETTE_LATENCY  回放时按录制耗时等待的比例（默认0：不等待）
+
+文件结构（zip）：
+    manifest.json      元数据（城市、模式、日期）和按录制顺序排列的全部记录
+    blobs/<sha256>     二进制数据（图片，按内容去重，不再压缩）
+"""
+
+import os
+import json
+import time
+import atexit
+import asyncio
+import hashlib
+import zipfile
+import importlib
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from ..utils.logger import logger, log_dir
+
+CASSETTE_VERSION = 1
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+CASSETTE_MODE = os.getenv("XHS_CASSETTE_MODE", MODE_OFF).lower()
+CASSETTE_PATH = os.getenv("XHS_CASSETTE", "")
+CASSETTE_LATENCY = float(os.getenv("XHS_CASSETTE_LATENCY", "0"))
+
+
+class CassetteMissError(LookupError):
+    """回放时找不到对应的录制记录"""
+
+
+class CassetteReplayError(RuntimeError):
+    """回放录制时发生的异常（原异常类型无法重建时使用）"""
+
+
+def request_key(request) -> str:
+    """请求内容的稳定哈希（作为匹配键）"""
+    text = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """
+    一盘录制记录
+    
+    每条记录：{kind, name, key, latency_ms, payload | blob | error}
+    - kind: mcp / llm / image
+    - name: 工具名 / 服务商 / original、preview
+    - key: 请求内容哈希
+    
+    回放匹配规则：
+    1. 同一请求（key 相同）按录制顺序依次返回，用完后重复返回最后一条
+    2. 找不到相同请求时（提示词里有时间、关键词随机等），按同一 kind/name 下的录制顺序返回下一条未用过的记录
+    """
+    
+    def __init__(self, path, mode: str):
+        self.path = Path(path)
+        self.mode = mode
+        self.meta = {}
+        self.entries = []
+        self._blobs = {}
+        self._lock = threading.Lock()
+        self._used = set()
+        self._saved = False
+        
+        if mode == MODE_REPLAY:
+            self._load()
+        else:
+            self.meta["recorded_at"] = datetime.now().isoformat(timespec="seconds")
+    
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+    
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+    
+    def note(self, **meta):
+        """录制时记录运行元数据（城市、模式等，回放时用于复现同样的流程）"""
+        if self.recording:
+            with self._lock:
+                self.meta.update(meta)
+    
+    # ---------- 录制 ----------
+    
+    def record(self, kind: str, name: str, request, latency: float, payload=None, error: Exception = None,
+               cancelled: bool = False):
+        """追加一条记录（payload 为 bytes 时存为二进制数据；cancelled 表示调用方在返回前取消了调用）"""
+        entry = {
+            "kind": kind,
+            "name": name,
+            "key": request_key(request),
+            "latency_ms": round(latency * 1000, 1)
+        }
+        if cancelled:
+            entry["cancelled"] = True
+        elif error is not None:
+            entry["error"] = {
+                "module": type(error).__module__,
+                "type": type(error).__qualname__,
+                "message": str(error)
+            }
+        elif isinstance(payload, (bytes, bytearray)):
+            digest = hashlib.sha256(payload).hexdigest()
+            entry["blob"] = digest
+            with self._lock:
+                self._blobs.setdefault(digest, bytes(payload))
+        else:
+            entry["payload"] = payload
+        
+        with self._lock:
+            self.entries.append(entry)
+    
+    def save(self):
+        """写入 zip 文件（先写临时文件再替换，中途失败不留下损坏的文件）"""
+        if not self.recording:
+            return
+        
+        with self._lock:
+            manifest = {
+                "version": CASSETTE_VERSION,
+                "meta": dict(self.meta),
+                "entries": list(self.entries)
+            }
+            blobs = dict(self._blobs)
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with zipfile.ZipFile(tmp_path, "w") as zf:
+            zf.writestr(
+                "manifest.json",
+                json.dumps(manifest, ensure_ascii=False, default=str),
+                compress_type=zipfile.ZIP_DEFLATED
+            )
+            for digest, data in blobs.items():
+                # 图片本身已压缩，直接存储
+                zf.writestr(f"blobs/{digest}", data, compress_type=zipfile.ZIP_STORED)
+        os.replace(tmp_path, self.path)
+        
+        self._saved = True
+        size_kb = self.path.stat().st_size / 1024
+        logger.info(f"📼 已录制 {len(manifest['entries'])} 条响应: {self.path}（{size_kb:.0f}KB）")
+    
+    # ---------- 回放 ----------
+    
+    def _load(self):
+        if not self.path.exists():
+            raise FileNotFoundError(f"cassette 文件不存在: {self.path}")
+        
+        with zipfile.ZipFile(self.path) as zf:
+            manifest = json.loads(zf.read("manifest.json"))
+            for name in zf.namelist():
+                if name.startswith("blobs/"):
+                    self._blobs[name[len("blobs/"):]] = zf.read(name)
+        
+        if manifest.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支持的 cassette 版本: {manifest.get('version')}")
+        
+        self.meta = manifest.get("meta", {})
+        self.entries = manifest.get("entries", [])
+        logger.info(f"📼 回放模式: {self.path}（{len(self.entries)} 条响应）")
+    
+    def lookup(self, kind: str, name: str, request, allow_cancelled: bool = False) -> dict:
+        """
+        查找下一条匹配的记录
+        
+        Args:
+            allow_cancelled: 是否返回录制时被取消的记录（只有异步调用会被取消）
+        
+        Raises:
+            CassetteMissError: 没有可用的记录
+        """
+        key = request_key(request)
+        
+        with self._lock:
+            same_request = [
+                i for i, e in enumerate(self.entries)
+                if e["key"] == key and e["kind"] == kind and (allow_cancelled or not e.get("cancelled"))
+            ]
+            for i in same_request:
+                if i not in self._used:
+                    self._used.add(i)
+                    return self.entries[i]
+            if same_request:
+                return self.entries[same_request[-1]]
+            
+            for i, e in enumerate(self.entries):
+                if i in self._used or (e.get("cancelled") and not allow_cancelled):
+                    continue
+                if e["kind"] == kind and e["name"] == name:
+                    self._used.add(i)
+                    logger.debug(f"回放 {kind}.{name}: 请求不同，按录制顺序返回")
+                    return e
+        
+        raise CassetteMissError(f"cassette 中没有 {kind}.{name} 的记录")
+    
+    def payload_of(self, entry: dict):
+        """
+        还原记录的返回值（录制时抛出的异常会重新抛出）
+        """
+        if entry.get("cancelled"):
+            raise CassetteReplayError(f"录制时 {entry['kind']}.{entry['name']} 在返回前已被取消")
+        if "error" in entry:
+            raise _rebuild_error(entry["error"])
+        if "blob" in entry:
+            return self._blobs[entry["blob"]]
+        return entry.get("payload")
+    
+    def iter_payloads(self, kind: str, name: Optional[str] = None):
+        """按录制顺序遍历某类成功的响应（供解析基准等工具使用）"""
+        for entry in self.entries:
+            if entry["kind"] != kind or "error" in entry or entry.get("cancelled"):
+                continue
+            if name is not None and entry["name"] != name:
+                continue
+            yield entry["name"], self.payload_of(entry)
+
+
+def _rebuild_error(error: dict) -> Exception:
+    """重建录制时的异常（构造失败时用 CassetteReplayError 代替）"""
+    message = error.get("message", "")
+    try:
+        module = importlib.import_module(error["module"])
+        exc_type = module
+        for part in error["type"].split("."):
+            exc_type = getattr(exc_type, part)
+        if isinstance(exc_type, type) and issubclass(exc_type, Exception):
+            return exc_type(message)
+    except Exception:
+        pass
+    return CassetteReplayError(f"{error.get('type')}: {message}")
+
+
+_cassette_lock = threading.Lock()
+_cassette = None
+_cassette_loaded = False
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    获取当前进程的 cassette（XHS_CASSETTE_MODE=off 时返回None）
+    
+    录制模式在进程退出时自动保存。
+    """
+    global _cassette, _cassette_loaded
+    
+    if _cassette_loaded:
+        return _cassette
+    
+    with _cassette_lock:
+        if _cassette_loaded:
+            return _cassette
+        
+        if CASSETTE_MODE == MODE_RECORD:
+            path = CASSETTE_PATH or log_dir / "cassettes" / f"cassette_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.zip"
+            _cassette = Cassette(path, MODE_RECORD)
+            atexit.register(_save_on_exit)
+            logger.info(f"📼 录制模式: 运行结束后写入 {path}")
+        elif CASSETTE_MODE == MODE_REPLAY:
+            if not CASSETTE_PATH:
+                raise ValueError("回放模式需要设置 XHS_CASSETTE")
+            _cassette = Cassette(CASSETTE_PATH, MODE_REPLAY)
+        elif CASSETTE_MODE != MODE_OFF:
+            logger.warning(f"未知的 XHS_CASSETTE_MODE: {CASSETTE_MODE}，不录制")
+        
+        _cassette_loaded = True
+        return _cassette
+
+
+def is_replaying() -> bool:
+    """是否处于回放模式（回放时不访问任何外部服务）"""
+    cassette = get_cassette()
+    return cassette is not None and cassette.replaying
+
+
+def replay_date():
+    """回放时录制当天的日期（用于复现按日期生成的随机参数），否则返回None"""
+    cassette = get_cassette()
+    if cassette is None or not cassette.replaying or "date" not in cassette.meta:
+        return None
+    return datetime.strptime(cassette.meta["date"], "%Y-%m-%d").date()
+
+
+def _save_on_exit():
+    if _cassette is not None and not _cassette._saved:
+        try:
+            _cassette.save()
+        except Exception as e:
+            logger.warning(f"保存 cassette 失败: {e}")
+
+
+def cassette_call(kind: str, name: str, request, call, encode=None, decode=None):
+    """
+    通过 cassette 执行一次外部调用
+    
+    Args:
+        kind: 记录类型（mcp / llm / image）
+        name: 名称（工具名、服务商等）
+        request: 决定返回值的请求内容（可JSON序列化）
+        call: 无参数函数，真正执行外部调用
+        encode: 返回值 → 可JSON序列化的数据（默认原样保存）
+        decode: 还原 encode 的结果
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return call()
+    
+    if cassette.replaying:
+        entry = cassette.lookup(kind, name, request)
+        if CASSETTE_LATENCY > 0:
+            time.sleep(entry["latency_ms"] / 1000 * CASSETTE_LATENCY)
+        payload = cassette.payload_of(entry)
+        return decode(payload) if decode else payload
+    
+    start = time.perf_counter()
+    try:
+        result = call()
+    except Exception as e:
+        cassette.record(kind, name, request, time.perf_counter() - start, error=e)
+        raise
+    cassette.record(kind, name, request, time.perf_counter() - start, payload=encode(result) if encode else result)
+    return result
+
+
+async def cassette_call_async(kind: str, name: str, request, call, encode=None, decode=None):
+    """cassette_call 的异步版本（call 返回协程）"""
+    cassette = get_cassette()
+    if cassette is None:
+        return await call()
+    
+    if cassette.replaying:
+        entry = cassette.lookup(kind, name, request, allow_cancelled=True)
+        if entry.get("cancelled"):
+            # 录制时调用方拿到足够结果后取消了这个调用（Step 1 凑够结果后，后台请求超过
+            # XHS_LATE_REQUEST_TIMEOUT 仍未返回时取消）：按录制时的耗时等待，
+            # 调用方会像录制时一样先拿到其他结果并取消它，保证回放走同样的路径
+            await asyncio.sleep(entry["latency_ms"] / 1000 * max(CASSETTE_LATENCY, 1))
+        elif CASSETTE_LATENCY > 0:
+            await asyncio.sleep(entry["latency_ms"] / 1000 * CASSETTE_LATENCY)
+        payload = cassette.payload_of(entry)
+        return decode(payload) if decode else payload
+    
+    start = time.perf_counter()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        cassette.record(kind, name, request, time.perf_counter() - start, cancelled=True)
+        raise
+    except Exception as e:
+        cassette.record(kind, name, request, time.perf_counter() - start, error=e)
+        raise
+    cassette.record(kind, name, request, time.perf_counter() - start, payload=encode(result) if encode else result)
+    return result
+
+
+def chat_completion(client, provider: str, **kwargs):
+    """
+    调用 OpenAI 兼容的对话接口（支持录制/回放）
+    
+    回放时返回由录制数据重建的 ChatCompletion 对象，调用方无需区分。
+    """
+    if get_cassette() is None:
+        return client.chat.completions.create(**kwargs)
+    
+    from openai.types.chat import ChatCompletion
+    
+    return cassette_call(
+        "llm", provider, {"provider": provider, **kwargs},
+        lambda: client.chat.completions.create(**kwargs),
+        encode=lambda response: response.model_dump(mode="json"),
+        decode=ChatCompletion.model_validate
+    )
+
+
+class ChatStream:
+    """
+    对话接口的流式响应
+    
+    迭代得到逐段的文本，结束后 usage 为用量（dict）。
+    close() 断开连接，服务端随即停止生成。
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self.usage = None
+    
+    def __iter__(self):
+        for chunk in self._stream:
+            if getattr(chunk, "usage", None):
+                self.usage = chunk.usage.model_dump()
+            for choice in chunk.choices:
+                if choice.delta.content:
+                    yield choice.delta.content
+    
+    def close(self):
+        self._stream.close()
+
+
+class _RecordingStream(ChatStream):
+    """录制模式：把收到的文本片段和用量写入 cassette（中途断开时录制已收到的部分）"""
+    
+    def __init__(self, stream, on_finish):
+        super().__init__(stream)
+        self._on_finish = on_finish
+        self._chunks = []
+    
+    def __iter__(self):
+        for text in super().__iter__():
+            self._chunks.append(text)
+            yield text
+        self._finish()
+    
+    def close(self):
+        super().close()
+        self._finish()
+    
+    def _finish(self):
+        if self._on_finish is not None:
+            self._on_finish({"chunks": self._chunks, "usage": self.usage})
+            self._on_finish = None
+
+
+class _ReplayedStream(ChatStream):
+    """回放录制的文本片段（兼容非流式录制的完整响应）"""
+    
+    def __init__(self, payload):
+        super().__init__(None)
+        if "chunks" in payload:
+            self._chunks = payload["chunks"]
+        else:
+            self._chunks = [choice["message"]["content"] for choice in payload.get("choices", [])]
+        self.usage = payload.get("usage")
+    
+    def __iter__(self):
+        return iter(self._chunks)
+    
+    def close(self):
+        pass
+
+
+def chat_completion_stream(client, provider: str, **kwargs) -> ChatStream:
+    """
+    以流式方式调用 OpenAI 兼容的对话接口（支持录制/回放）
+    
+    Returns:
+        ChatStream（调用方用完后需要 close）
+    """
+    kwargs = {**kwargs, "stream": True, "stream_options": {"include_usage": True}}
+    
+    cassette = get_cassette()
+    if cassette is None:
+        return ChatStream(client.chat.completions.create(**kwargs))
+    
+    request = {"provider": provider, **kwargs}
+    if cassette.replaying:
+        entry = cassette.lookup("llm", provider, request)
+        if CASSETTE_LATENCY > 0:
+            time.sleep(entry["latency_ms"] / 1000 * CASSETTE_LATENCY)
+        return _ReplayedStream(cassette.payload_of(entry))
+    
+    start = time.perf_counter()
+    try:
+        stream = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        cassette.record("llm", provider, request, time.perf_counter() - start, error=e)
+        raise
+    
+    return _RecordingStream(
+        stream,
+        lambda payload: cassette.record("llm", provider, request, time.perf_counter() - start, payload=payload)
+    )
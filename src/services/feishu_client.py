@@ -10,10 +10,16 @@ import time
 import hmac
 import hashlib
 import base64
-import requests
+import threading
 from datetime import datetime
+from .http_session import get_session
+from .cassette import is_replaying
 from ..utils.logger import logger
 from ..utils.retry import retry_on_failure
+from ..utils.tracing import traced
+
+# 飞书开放平台地址（可指向本地模拟服务做离线测试）
+FEISHU_BASE_URL = os.getenv("FEISHU_BASE_URL", "https://open.feishu.cn")
 
 
 class FeishuClient:
@@ -25,13 +31,22 @@ class FeishuClient:
         self.webhook_url = os.getenv("FEISHU_WEBHOOK_URL")
         self.base_id = os.getenv("FEISHU_TABLE_ID")  # 这是base_id（多维表格ID）
         self.table_id = os.getenv("FEISHU_TABLE_TABLE_ID")  # 具体的table_id
+        self.base_url = FEISHU_BASE_URL.rstrip("/")
         
-        if not self.webhook_url:
+        if is_replaying():
+            # 回放模式不访问线上飞书（通知和表格记录都跳过）
+            logger.info("回放模式，跳过飞书通知和表格记录")
+            self.app_id = self.app_secret = self.webhook_url = self.base_id = self.table_id = None
+        elif not self.webhook_url:
             logger.warning("FEISHU_WEBHOOK_URL 未设置，将跳过飞书通知")
         
         self._access_token = None
         self._token_expires_at = 0
+        
+        # 共享连接池，复用到 open.feishu.cn 的连接
+        self.session = get_session("feishu")
     
+    @traced("feishu.get_access_token")
     def get_access_token(self):
         """获取访问令牌"""
         if not self.app_id or not self.app_secret:
@@ -43,14 +58,14 @@ class FeishuClient:
             return self._access_token
         
         # 获取新token
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+        url = f"{self.base_url}/open-apis/auth/v3/tenant_access_token/internal"
         data = {
             "app_id": self.app_id,
             "app_secret": self.app_secret
         }
         
         try:
-            response = requests.post(url, json=data, timeout=10)
+            response = self.session.post(url, json=data, timeout=10)
             result = response.json()
             
             if result.get("code") == 0:
@@ -84,6 +99,7 @@ class FeishuClient:
         sign = base64.b64encode(hmac_code).decode('utf-8')
         return sign
     
+    @traced("feishu.upload_image")
     def upload_image(self, image_path=None, image_data=None):
         """
         上传图片到飞书获取image_key
@@ -100,7 +116,7 @@ class FeishuClient:
             logger.warning("无法获取access_token，跳过图片上传")
             return None
         
-        url = "https://open.feishu.cn/open-apis/im/v1/images"
+        url = f"{self.base_url}/open-apis/im/v1/images"
         
         try:
             # 准备图片数据
@@ -127,7 +143,7 @@ class FeishuClient:
                 'Authorization': f'Bearer {access_token}'
             }
             
-            response = requests.post(
+            response = self.session.post(
                 url,
                 headers=headers,
                 data=data,
@@ -149,6 +165,7 @@ class FeishuClient:
             logger.error(f"图片上传异常: {e}")
             return None
     
+    @traced("feishu.send_webhook_message")
     @retry_on_failure(max_attempts=2)
     def send_webhook_message(self, title, content_lines):
         """
@@ -201,7 +218,7 @@ class FeishuClient:
             card["sign"] = sign
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.webhook_url,
                 json=card,
                 timeout=10
@@ -346,6 +363,7 @@ class FeishuClient:
         
         self.send_webhook_message("❌ 小红书发布失败", content_lines)
     
+    @traced("feishu.get_table_id")
     def get_table_id(self):
         """
         获取多维表格中的第一个table_id
@@ -362,13 +380,13 @@ class FeishuClient:
             return None
         
         # 获取表格列表
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.base_id}/tables"
+        url = f"{self.base_url}/open-apis/bitable/v1/apps/{self.base_id}/tables"
         headers = {
             "Authorization": f"Bearer {access_token}"
         }
         
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.session.get(url, headers=headers, timeout=10)
             result = response.json()
             
             if result.get("code") == 0 and result.get("data", {}).get("items"):
@@ -385,6 +403,7 @@ class FeishuClient:
             logger.error(f"获取table_id异常: {e}")
             return None
     
+    @traced("feishu.append_table_record")
     def append_table_record(self, record):
         """
         添加表格记录
@@ -413,7 +432,7 @@ class FeishuClient:
             return
         
         # 构建API请求
-        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.base_id}/tables/{table_id}/records"
+        url = f"{self.base_url}/open-apis/bitable/v1/apps/{self.base_id}/tables/{table_id}/records"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -429,7 +448,7 @@ class FeishuClient:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=10)
+            response = self.session.post(url, headers=headers, json=data, timeout=10)
             result = response.json()
             
             if result.get("code") == 0:
@@ -455,3 +474,16 @@ class FeishuClient:
         logger.warning("query_recent_records 未实现，返回空列表")
         return []
 
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_feishu_client() -> FeishuClient:
+    """获取进程内共享的飞书客户端（复用 access_token，常驻模式下不必每次重新获取）"""
+    global _shared_client
+    
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = FeishuClient()
+        return _shared_client
@@ -0,0 +1,283 @@
+"""
+对冲请求（hedged requests）
+
+同一个prompt先发给主服务商，超过对冲延迟仍未返回时再发给另一家，
+取先返回且解析成功的结果，另一家的请求立即取消（断开流式连接，服务端随即停止生成）。
+主服务商在对冲前就失败时，立即改用另一家。
+
+对冲延迟取主服务商历史耗时的分位数（默认P90），样本不足时使用 AI_HEDGE_DELAY。
+耗时样本和各服务商的请求数、胜出次数、token用量跨运行累计，保存在 data/ai_hedge_stats.json。
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from ..utils.logger import logger
+from ..utils.tracing import traced, current_span, bind_context
+from .llm_stream import StreamHandle
+
+DEFAULT_STATS_PATH = Path(__file__).parent.parent.parent / "data" / "ai_hedge_stats.json"
+
+# 主服务商（先发请求的一家）
+HEDGE_PRIMARY = os.getenv("AI_HEDGE_PRIMARY", "deepseek").lower()
+
+# 对冲延迟：主服务商历史耗时的分位数
+HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "90"))
+
+# 历史样本不足时的对冲延迟（秒）
+HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DELAY", "20"))
+
+# 至少多少个样本才按分位数计算
+HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "5"))
+
+# 每个服务商保留的耗时样本数
+MAX_LATENCY_SAMPLES = 50
+
+
+class HedgeStats:
+    """
+    各服务商的耗时样本和计数（线程安全，跨运行累计）
+    
+    被取消的请求按取消时已耗费的时间记一个样本（实际耗时只会更长），
+    否则慢请求总被取消、样本里只剩快的，分位数会越算越小。
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.getenv("AI_HEDGE_STATS") or DEFAULT_STATS_PATH)
+        self._lock = threading.Lock()
+        self._data = self._load()
+    
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _provider(self, provider: str) -> dict:
+        return self._data.setdefault(provider, {
+            "requests": 0,
+            "wins": 0,
+            "failures": 0,
+            "cancelled": 0,
+            "tokens": 0,
+            "cancelled_chars": 0,
+            "latencies": []
+        })
+    
+    def hedge_delay(self, provider: str) -> float:
+        """对冲延迟（秒）：历史耗时的 HEDGE_PERCENTILE 分位数"""
+        with self._lock:
+            samples = sorted(self._provider(provider)["latencies"])
+        
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        
+        index = max(0, math.ceil(HEDGE_PERCENTILE / 100 * len(samples)) - 1)
+        return samples[min(index, len(samples) - 1)]
+    
+    def record(self, provider: str, outcome: str, latency: Optional[float] = None,
+               usage: Optional[dict] = None, chars: int = 0):
+        """
+        记录一次请求
+        
+        Args:
+            outcome: win（采用）/ cancelled（被取消）/ failed（失败）
+            latency: 耗时（秒，失败时不计入样本）
+            usage: 用量（dict，被取消的流式请求没有用量）
+            chars: 被取消前已收到的字符数
+        """
+        with self._lock:
+            stats = self._provider(provider)
+            stats["requests"] += 1
+            if outcome == "win":
+                stats["wins"] += 1
+            elif outcome == "failed":
+                stats["failures"] += 1
+            else:
+                stats["cancelled"] += 1
+                stats["cancelled_chars"] += chars
+            
+            stats["tokens"] += (usage or {}).get("total_tokens") or 0
+            if latency is not None and outcome != "failed":
+                stats["latencies"] = (stats["latencies"] + [round(latency, 3)])[-MAX_LATENCY_SAMPLES:]
+    
+    def summary(self) -> str:
+        """各服务商胜出率和用量，如 "deepseek 胜出 8/10（80%）tokens 12000 取消 2 次 | qwen ..." """
+        parts = []
+        with self._lock:
+            for provider, stats in self._data.items():
+                requests = stats["requests"]
+                rate = stats["wins"] / requests * 100 if requests else 0
+                parts.append(
+                    f"{provider} 胜出 {stats['wins']}/{requests}（{rate:.0f}%）"
+                    f"tokens {stats['tokens']} 取消 {stats['cancelled']} 次 失败 {stats['failures']} 次"
+                )
+        return " | ".join(parts)
+    
+    def save(self):
+        """写入文件（写入失败只记录警告）"""
+        with self._lock:
+            data = json.loads(json.dumps(self._data))
+        
+        tmp_path = self.path.with_suffix(".json.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"保存对冲统计失败: {e}")
+
+
+class HedgedAIClient:
+    """
+    对冲请求的AI客户端（AI_PROVIDER=hedged）
+    
+    只有 generate_content_from_prompt 会对冲，其他方法（analyze_image 等）直接使用主服务商。
+    """
+    
+    def __init__(self, clients: dict, stats: Optional[HedgeStats] = None):
+        """
+        Args:
+            clients: {服务商: 客户端}，按请求顺序排列（第一个为主服务商）
+            stats: 统计数据（默认读取 data/ai_hedge_stats.json）
+        """
+        if len(clients) < 2:
+            raise ValueError("对冲请求至少需要两个服务商")
+        
+        self.clients = clients
+        self.providers = list(clients)
+        self.primary = clients[self.providers[0]]
+        self.stats = stats or HedgeStats()
+    
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+    
+    @traced("llm.hedged")
+    def generate_content_from_prompt(self, prompt, on_field=None, system_prompt=None):
+        """
+        从自定义prompt生成文案（主服务商超过对冲延迟未返回时同时请求另一家）
+        
+        Args:
+            prompt: 完整的prompt文本
+            on_field: 字段生成完整时的回调 on_field(字段名, 值)。
+                      先生成字段的一家实时回调；最终采用另一家时按它的结果重新回调
+            system_prompt: system 消息（两家使用相同的消息）
+        
+        Returns:
+            先返回且解析成功的文案
+        """
+        primary, backup = self.providers[0], self.providers[1]
+        delay = self.stats.hedge_delay(primary)
+        span = current_span()
+        span.set(hedge_delay=round(delay, 2))
+        
+        handles = {}
+        starts = {}
+        futures = {}
+        fields = {provider: [] for provider in self.providers}
+        leader = []
+        fields_lock = threading.Lock()
+        
+        def make_on_field(provider):
+            def _on_field(name, value):
+                with fields_lock:
+                    fields[provider].append((name, value))
+                    if not leader:
+                        leader.append(provider)
+                    forward = leader[0] == provider
+                if forward and on_field:
+                    on_field(name, value)
+            return _on_field
+        
+        def launch(provider):
+            handle = StreamHandle()
+            handles[provider] = handle
+            starts[provider] = time.perf_counter()
+            future = _run_in_thread(
+                f"hedge-{provider}",
+                bind_context(self.clients[provider].generate_content_from_prompt),
+                prompt, on_field=make_on_field(provider), handle=handle, system_prompt=system_prompt
+            )
+            futures[future] = provider
+            return future
+        
+        pending = {launch(primary)}
+        done, _ = wait(pending, timeout=delay)
+        if not done:
+            logger.info(f"⏱️  {primary} 超过 {delay:.1f}s 未返回，同时请求 {backup}")
+            span.set(hedged=True)
+            pending.add(launch(backup))
+        
+        failed = set()
+        last_error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    provider = futures[future]
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        last_error = e
+                        failed.add(provider)
+                        self.stats.record(provider, "failed")
+                        logger.warning(f"⚠️  {provider} 生成失败: {e}")
+                        if backup not in handles:
+                            logger.info(f"改用 {backup}")
+                            span.set(hedged=True)
+                            pending.add(launch(backup))
+                        continue
+                    
+                    self._finish(provider, handles, starts, failed)
+                    span.set(winner=provider)
+                    if on_field and leader and leader[0] != provider:
+                        for name, value in fields[provider]:
+                            on_field(name, value)
+                    return content
+            
+            raise last_error
+        
+        finally:
+            self.stats.save()
+            logger.info(f"📊 对冲统计: {self.stats.summary()}")
+    
+    def _finish(self, winner: str, handles: dict, starts: dict, failed: set):
+        """采用 winner 的结果，取消其他还在进行的请求并记录统计"""
+        now = time.perf_counter()
+        
+        for provider, handle in handles.items():
+            if provider == winner or provider in failed:
+                continue
+            handle.cancel()
+            self.stats.record(provider, "cancelled", now - starts[provider], handle.usage, handle.received_chars)
+            logger.info(f"🏁 采用 {winner} 的结果，已取消 {provider} 的请求")
+        
+        handle = handles[winner]
+        self.stats.record(winner, "win", now - starts[winner], handle.usage)
+
+
+def _run_in_thread(name: str, func, *args, **kwargs) -> Future:
+    """
+    在守护线程中执行函数
+    
+    被取消的请求可能还阻塞在建立连接上，用守护线程避免进程退出时等它结束。
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
@@ -0,0 +1,61 @@
+"""
+HTTP连接池
+
+按用途共享 requests.Session，复用 TCP/TLS 连接（keep-alive），
+避免每次请求都重新握手（图片CDN、open.feishu.cn 等）
+"""
+
+import threading
+
+# 各用途的连接池配置
+#   pool_connections: 缓存的主机连接池数量
+#   pool_maxsize: 每个主机最多保持的连接数
+#   pool_block: 连接数达到上限时等待（限制对单个主机的并发）
+POOL_CONFIGS = {
+    "image": {"pool_connections": 8, "pool_maxsize": 8, "pool_block": True},
+    "feishu": {"pool_connections": 2, "pool_maxsize": 4, "pool_block": False},
+}
+
+DEFAULT_POOL_CONFIG = {"pool_connections": 4, "pool_maxsize": 4, "pool_block": False}
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_session(name: str) -> "requests.Session":
+    """
+    获取共享的HTTP会话（进程内按名称复用）
+    
+    Args:
+        name: 用途名称（image / feishu）
+    
+    Returns:
+        requests.Session
+    """
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            # requests 在第一次创建会话时才导入
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            config = POOL_CONFIGS.get(name, DEFAULT_POOL_CONFIG)
+            # 重试由 tenacity 统一负责，连接池本身不重试
+            adapter = HTTPAdapter(max_retries=0, **config)
+            
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[name] = session
+        
+        return session
+
+
+def close_sessions():
+    """关闭所有共享会话（进程结束前调用）"""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    
+    for session in sessions:
+        session.close()
@@ -0,0 +1,220 @@
+"""
+图片磁盘缓存
+
+按内容寻址的持久化缓存，同一张图片的原始数据和处理结果在多次运行间复用
+（失败重试、测试模式反复跑同一个城市时不再重复下载和处理）
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from ..utils.logger import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "images"
+
+# 命中时距上次记录的访问时间超过该秒数才写回索引（LRU 淘汰不需要精确的访问时间）
+ATIME_UPDATE_INTERVAL = 600
+
+
+def _sha256(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_hash_of(data: bytes) -> str:
+    """图片内容哈希（缓存中的内容寻址键）"""
+    return _sha256(data)
+
+
+class ImageCache:
+    """
+    图片缓存
+    
+    目录结构：
+        raw/<内容哈希>                  原始图片数据
+        processed/<内容哈希>_<版本>.jpg  处理后的图片
+        index.json                      URL → 内容哈希映射 + 各文件大小和最近访问时间
+    
+    index.json 在多个进程间共享（修改时加文件锁，原子替换写回），总大小超过上限时按最近访问时间淘汰（LRU）。
+    读取使用进程内的索引副本，index.json 被改写后才重新解析；图片文件的读写都在锁外进行，
+    命中时的访问时间按 ATIME_UPDATE_INTERVAL 节流更新，并行下载/处理时不会在缓存上排队。
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[float] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("IMAGE_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.max_bytes = int(float(max_mb or os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        
+        (self.cache_dir / "raw").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "processed").mkdir(parents=True, exist_ok=True)
+        
+        self.index_path = self.cache_dir / "index.json"
+        self._lock_path = self.cache_dir / "index.lock"
+        self._thread_lock = threading.Lock()
+        # 进程内的索引副本：(index.json 的文件标识, 索引)，整体替换，读取时不加锁
+        self._snapshot = (None, {"urls": {}, "entries": {}})
+    
+    def lookup(self, url: str) -> Optional[str]:
+        """返回URL对应的内容哈希（未缓存返回None）"""
+        return self._current_index()["urls"].get(_sha256(url.encode("utf-8")))
+    
+    def get_raw(self, url: str) -> Optional[bytes]:
+        """读取URL对应的原始图片数据"""
+        content_hash = self.lookup(url)
+        if content_hash is None:
+            return None
+        return self._read(f"raw/{content_hash}")
+    
+    def put_raw(self, url: str, data: bytes) -> str:
+        """
+        保存原始图片数据
+        
+        Returns:
+            内容哈希
+        """
+        content_hash = content_hash_of(data)
+        rel_path = f"raw/{content_hash}"
+        
+        # 文件按内容寻址，在锁外写入（并发写入同一内容的结果相同）
+        written = rel_path not in self._current_index()["entries"]
+        if written:
+            self._write_file(rel_path, data)
+        
+        with self._locked_index() as index:
+            if not written and rel_path not in index["entries"]:
+                # 刚被其他进程淘汰（少见），补写文件
+                self._write_file(rel_path, data)
+            index["urls"][_sha256(url.encode("utf-8"))] = content_hash
+            self._touch(index, rel_path, len(data))
+            self._evict(index)
+        
+        return content_hash
+    
+    def get_processed(self, content_hash: str, variant: str) -> Optional[bytes]:
+        """读取处理后的图片（variant 标识处理参数，参数变化时自动失效）"""
+        return self._read(f"processed/{content_hash}_{variant}.jpg")
+    
+    def put_processed(self, content_hash: str, variant: str, data: bytes):
+        """保存处理后的图片"""
+        rel_path = f"processed/{content_hash}_{variant}.jpg"
+        
+        # 先写文件再登记到索引（未登记的文件不会被淘汰）
+        self._write_file(rel_path, data)
+        with self._locked_index() as index:
+            self._touch(index, rel_path, len(data))
+            self._evict(index)
+    
+    def _read(self, rel_path: str) -> Optional[bytes]:
+        """读取缓存文件（访问时间较旧时更新）"""
+        entry = self._current_index()["entries"].get(rel_path)
+        if entry is None:
+            return None
+        
+        try:
+            data = (self.cache_dir / rel_path).read_bytes()
+        except OSError:
+            # 文件被外部删除或被其他进程淘汰，清掉索引
+            with self._locked_index() as index:
+                index["entries"].pop(rel_path, None)
+            return None
+        
+        if time.time() - entry["atime"] > ATIME_UPDATE_INTERVAL:
+            with self._locked_index() as index:
+                if rel_path in index["entries"]:
+                    self._touch(index, rel_path, len(data))
+        
+        logger.debug(f"图片缓存命中: {rel_path}")
+        return data
+    
+    def _write_file(self, rel_path: str, data: bytes):
+        """原子写入（先写临时文件再改名）"""
+        path = self.cache_dir / rel_path
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def _touch(index, rel_path: str, size: int):
+        index["entries"][rel_path] = {"size": size, "atime": time.time()}
+    
+    def _evict(self, index):
+        """总大小超过上限时，按最近访问时间从旧到新淘汰"""
+        total = sum(entry["size"] for entry in index["entries"].values())
+        if total <= self.max_bytes:
+            return
+        
+        evicted = 0
+        for rel_path, entry in sorted(index["entries"].items(), key=lambda item: item[1]["atime"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                (self.cache_dir / rel_path).unlink()
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del index["entries"][rel_path]
+            evicted += 1
+        
+        # 清理指向已淘汰原图的URL映射
+        live = {path[len("raw/"):] for path in index["entries"] if path.startswith("raw/")}
+        index["urls"] = {k: v for k, v in index["urls"].items() if v in live}
+        
+        logger.info(f"图片缓存淘汰 {evicted} 个文件，当前 {total / (1024 * 1024):.1f}MB")
+    
+    def _current_index(self) -> dict:
+        """
+        进程内的索引副本（不修改）
+        
+        index.json 只会被原子替换，文件标识（修改时间、大小、inode）变化后重新读取，读取不需要文件锁。
+        """
+        stamp = self._index_stamp()
+        cached_stamp, index = self._snapshot
+        if stamp != cached_stamp:
+            index = self._load_index()
+            self._snapshot = (stamp, index)
+        return index
+    
+    def _index_stamp(self):
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"urls": {}, "entries": {}}
+    
+    @contextmanager
+    def _locked_index(self):
+        """修改索引：在线程锁 + 文件锁保护下读取最新的索引，退出前写回并更新进程内副本"""
+        with self._thread_lock:
+            lock_file = open(self._lock_path, "w")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                
+                index = self._load_index()
+                
+                yield index
+                
+                tmp_path = self.index_path.with_suffix(".json.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self.index_path)
+                self._snapshot = (self._index_stamp(), index)
+            finally:
+                # 关闭文件即释放 flock
+                lock_file.close()
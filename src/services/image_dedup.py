@@ -0,0 +1,147 @@
+"""
+图片去重
+
+基于感知哈希（pHash）识别近似重复的图片：
+- 同一批次内：多个帖子转载同一张图时只保留一张
+- 跨批次：记录已发布图片的哈希，永远不重复发布同一张图
+"""
+
+import os
+import json
+import time
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+from ..utils.logger import logger
+
+
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent.parent / "data" / "published_hashes.json"
+
+# 计算哈希用的缩略图尺寸（pHash 内部会再缩到 32x32）
+HASH_THUMB_SIZE = 64
+
+# 已发布哈希最多保留条数
+MAX_PUBLISHED_HASHES = 5000
+
+
+class DuplicateImageError(ValueError):
+    """图片与已选图片或已发布图片近似重复"""
+
+
+class ImageDeduplicator:
+    """感知哈希去重器（线程安全，可在并行下载中共享）"""
+    
+    def __init__(self, threshold: Optional[int] = None, index_path: Optional[str] = None):
+        """
+        Args:
+            threshold: 汉明距离不超过该值视为重复（默认 IMAGE_DEDUP_THRESHOLD 或 6）
+            index_path: 已发布图片哈希索引文件
+        """
+        self.threshold = threshold if threshold is not None else int(os.getenv("IMAGE_DEDUP_THRESHOLD", "6"))
+        self.index_path = Path(index_path or os.getenv("IMAGE_DEDUP_INDEX") or DEFAULT_INDEX_PATH)
+        
+        self._lock = threading.Lock()
+        self._batch = {}  # key -> ImageHash
+        self._published = self._load_published()
+    
+    @staticmethod
+    def compute_hash(data: bytes) -> "imagehash.ImageHash":
+        """从原始图片数据计算pHash（JPEG 用 draft 模式直接解码出小图）"""
+        import imagehash
+        from PIL import Image
+        
+        with Image.open(BytesIO(data)) as img:
+            img.draft('L', (HASH_THUMB_SIZE, HASH_THUMB_SIZE))
+            thumb = img.convert('L')
+            thumb.thumbnail((HASH_THUMB_SIZE, HASH_THUMB_SIZE))
+            return imagehash.phash(thumb)
+    
+    def register(self, key: str, data: bytes) -> "imagehash.ImageHash":
+        """
+        检查并登记一张图片
+        
+        Args:
+            key: 图片标识（URL）
+            data: 原始图片数据
+        
+        Returns:
+            图片的pHash
+        
+        Raises:
+            DuplicateImageError: 与本批次已登记或已发布的图片近似重复
+        """
+        image_hash = self.compute_hash(data)
+        
+        with self._lock:
+            for published in self._published:
+                if image_hash - published <= self.threshold:
+                    raise DuplicateImageError(f"图片已发布过（pHash {image_hash}）")
+            
+            for other_key, other_hash in self._batch.items():
+                if other_key != key and image_hash - other_hash <= self.threshold:
+                    raise DuplicateImageError(f"与已选图片近似重复（pHash {image_hash}）")
+            
+            self._batch[key] = image_hash
+        
+        return image_hash
+    
+    def forget(self, key: str):
+        """撤销登记（图片后续处理失败时调用，避免误伤它的近似图）"""
+        with self._lock:
+            self._batch.pop(key, None)
+    
+    def get_hash(self, key: str) -> Optional["imagehash.ImageHash"]:
+        """获取已登记图片的pHash"""
+        with self._lock:
+            return self._batch.get(key)
+    
+    def record_published(self, hashes):
+        """
+        把已发布图片的哈希写入索引
+        
+        Args:
+            hashes: ImageHash 列表
+        """
+        hashes = [h for h in hashes if h is not None]
+        if not hashes:
+            return
+        
+        with self._lock:
+            entries = self._read_index()
+            now = time.time()
+            entries.extend({"hash": str(h), "time": now} for h in hashes)
+            entries = entries[-MAX_PUBLISHED_HASHES:]
+            
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.index_path)
+            
+            import imagehash
+            self._published = [imagehash.hex_to_hash(e["hash"]) for e in entries]
+        
+        logger.info(f"✅ 已记录 {len(hashes)} 张已发布图片的哈希")
+    
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    def _load_published(self):
+        # imagehash（连带 numpy）导入较慢，创建去重器时才导入
+        import imagehash
+        
+        published = []
+        for entry in self._read_index():
+            try:
+                published.append(imagehash.hex_to_hash(entry["hash"]))
+            except (KeyError, ValueError, TypeError):
+                continue
+        
+        if published:
+            logger.debug(f"加载已发布图片哈希 {len(published)} 条")
+        return published
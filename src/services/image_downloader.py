@@ -5,46 +5,239 @@
 """
 
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from PIL import Image
+from PIL import Image, ImageFile
 from io import BytesIO
+from typing import Optional
+from .http_session import get_session
+from .image_cache import ImageCache, content_hash_of
+from .image_dedup import ImageDeduplicator, DuplicateImageError
+from .cassette import cassette_call, is_replaying
 from ..utils.logger import logger
 from ..utils.retry import retry_on_network_error
+from ..utils.tracing import span, traced, current_span, bind_context
+
+# 小红书图片要求
+MIN_SIDE = 1000                     # 最短边不小于1000px
+MAX_SIDE = 2048                     # 处理后最长边（保持宽高比）
+MAX_FILE_BYTES = 5 * 1024 * 1024    # 文件大小 ≤5MB
+JPEG_QUALITY = 90                   # 默认编码质量
+JPEG_MIN_QUALITY = 40               # 压缩到5MB以内时允许的最低质量
+
+# 下载限制：源图最短边低于该值（缩略图）或数据超过上限时，读到文件头就放弃下载
+MIN_SOURCE_SIDE = int(os.getenv("IMAGE_MIN_SOURCE_SIDE", str(MIN_SIDE)))
+MAX_DOWNLOAD_BYTES = int(float(os.getenv("IMAGE_MAX_DOWNLOAD_MB", "20")) * 1024 * 1024)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HEADER_SNIFF_BYTES = 256 * 1024     # 超过该长度仍无法识别文件头则视为非图片
+
+# 小红书水印通常在底部，裁剪掉底部10%
+WATERMARK_CROP_RATIO = 0.9
+
+
+# 处理流程版本（裁剪/缩放/编码逻辑变化时修改，使缓存中的旧处理结果失效）
+PROCESS_VERSION = "v1"
+
+# 源图远大于目标尺寸时先在解码阶段缩小（JPEG draft / Image.reduce），
+# 最后一步再用 LANCZOS 精细缩放；该值越大画质越接近完整解码
+REDUCING_GAP = 3.0
+
+
+class ImageRejectedError(ValueError):
+    """图片不符合要求（非图片、尺寸过小或数据过大），不重试"""
+
+
+class ImageStream:
+    """
+    流式下载缓冲区
+    
+    数据直接写入处理用的缓冲区，文件头解析器只在识别出格式和尺寸前接收数据；
+    非图片、尺寸过小或数据过大时立即抛出 ImageRejectedError，调用方断开连接即可。
+    同步（requests）和异步（aiohttp）下载共用。
+    """
+    
+    def __init__(self, min_side: int = MIN_SOURCE_SIDE, max_bytes: int = MAX_DOWNLOAD_BYTES):
+        self.min_side = min_side
+        self.max_bytes = max_bytes
+        self._buffer = BytesIO()
+        self._parser = ImageFile.Parser()
+        self.size = None  # 文件头解析出的 (宽, 高)
+    
+    def check_headers(self, content_type: Optional[str], content_length: Optional[str]):
+        """根据响应头提前拒绝"""
+        content_type = (content_type or '').split(';')[0].strip().lower()
+        if content_type and not content_type.startswith('image/') and content_type != 'application/octet-stream':
+            raise ImageRejectedError(f"非图片响应: {content_type}")
+        
+        if int(content_length or 0) > self.max_bytes:
+            raise ImageRejectedError(f"图片过大: {int(content_length) / (1024 * 1024):.1f}MB")
+    
+    def feed(self, chunk: bytes):
+        """写入一段数据"""
+        self._buffer.write(chunk)
+        if self._buffer.tell() > self.max_bytes:
+            raise ImageRejectedError(f"图片超过 {self.max_bytes // (1024 * 1024)}MB 上限")
+        
+        if self.size is None:
+            self._parser.feed(chunk)
+            img = self._parser.image
+            if img is not None:
+                width, height = img.size
+                if min(width, height) < self.min_side:
+                    raise ImageRejectedError(f"图片尺寸过小: {img.format} {width}x{height}")
+                self.size = img.size
+            elif self._buffer.tell() > HEADER_SNIFF_BYTES:
+                raise ImageRejectedError("无法识别图片格式")
+    
+    def getvalue(self) -> bytes:
+        """下载完成后取出数据"""
+        if self.size is None:
+            raise ImageRejectedError("无法识别图片格式")
+        return self._buffer.getvalue()
 
 
 class ImageDownloader:
     """图片下载器"""
     
-    def __init__(self, output_dir: str = "temp_images"):
+    def __init__(self, output_dir: str = "temp_images", draft_decode: bool = True,
+                 cache: Optional[ImageCache] = None, dedup: Optional[ImageDeduplicator] = None,
+                 prefetched: Optional[dict] = None):
+        """
+        Args:
+            output_dir: 输出目录
+            draft_decode: 大图是否使用 JPEG draft 模式 / reduce 预缩放
+            cache: 图片缓存，默认使用 cache/images（IMAGE_CACHE=off 时不使用缓存）
+            dedup: 感知哈希去重器，默认启用（IMAGE_DEDUP=off 时不去重）
+            prefetched: Step 1 已开始后台下载的图片 {URL: Future}
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.draft_decode = draft_decode
+        
+        if cache is None and os.getenv("IMAGE_CACHE", "on").lower() != "off":
+            cache = ImageCache()
+        self.cache = cache
+        
+        if dedup is None and os.getenv("IMAGE_DEDUP", "on").lower() != "off":
+            dedup = ImageDeduplicator()
+        self.dedup = dedup
+        
+        self.prefetched = dict(prefetched or {})
+        
+        # 本地路径 -> 图片URL（用于发布后记录哈希）
+        self._sources = {}
     
-    @retry_on_network_error
-    def download_image(self, url: str, filename: str) -> str:
+    @property
+    def process_variant(self) -> str:
+        """处理参数标识（作为缓存键的一部分）"""
+        return f"{PROCESS_VERSION}_{MAX_SIDE}_{'draft' if self.draft_decode else 'full'}"
+    
+    def fetch_image_bytes(self, url: str) -> bytes:
         """
-        下载图片
+        获取图片原始数据（优先读缓存，不落盘到输出目录）
         
         Args:
             url: 图片URL
-            filename: 保存文件名
         
         Returns:
-            本地文件路径
+            图片二进制数据
+        """
+        if self.cache:
+            data = self.cache.get_raw(url)
+            if data is not None:
+                logger.info(f"使用缓存图片: {url[:50]}...")
+                current_span().set(source="cache", bytes=len(data))
+                return data
+        
+        data = self._take_prefetched(url)
+        if data is None:
+            data = self._download_bytes(url)
+        
+        if self.cache:
+            self.cache.put_raw(url, data)
+        
+        return data
+    
+    def _take_prefetched(self, url: str) -> Optional[bytes]:
+        """
+        取用后台预取的数据（等待下载完成）
+        
+        预取因网络原因失败时返回None，由同步下载（带重试）兜底；
+        图片不符合要求时直接抛出 ImageRejectedError。
+        """
+        future = self.prefetched.pop(url, None)
+        if future is None:
+            return None
+        
+        try:
+            data = future.result()
+        except ImageRejectedError:
+            raise
+        except Exception as e:
+            logger.debug(f"预取失败，改为直接下载: {e}")
+            return None
+        
+        if data is not None:
+            logger.info(f"使用预取图片: {url[:50]}...")
+            current_span().set(source="prefetch", bytes=len(data))
+        return data
+    
+    def cancel_prefetch(self):
+        """取消未使用的预取"""
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+    
+    @traced("image.download")
+    @retry_on_network_error
+    def _download_bytes(self, url: str) -> bytes:
+        """
+        从网络流式下载图片
+        
+        边下载边解析文件头（格式和尺寸），非图片、最短边小于 MIN_SOURCE_SIDE
+        或数据超过 MAX_DOWNLOAD_BYTES 时立即断开，不再下载剩余数据。
+        
+        Raises:
+            ImageRejectedError: 图片不符合要求
         """
         logger.info(f"下载图片: {url[:50]}...")
         
+        data = cassette_call("image", "original", {"url": url}, lambda: self._stream_download(url))
+        current_span().set(bytes=len(data))
+        return data
+    
+    def _stream_download(self, url: str) -> bytes:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         }
         
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
+        with get_session("image").get(url, headers=headers, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            
+            stream = ImageStream()
+            stream.check_headers(response.headers.get('Content-Type'), response.headers.get('Content-Length'))
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                stream.feed(chunk)
+        
+        return stream.getvalue()
+    
+    def download_image(self, url: str, filename: str) -> str:
+        """
+        下载图片
+        
+        Args:
+            url: 图片URL
+            filename: 保存文件名
+        
+        Returns:
+            本地文件路径
+        """
+        data = self.fetch_image_bytes(url)
         
         # 保存原图
         output_path = self.output_dir / filename
         with open(output_path, 'wb') as f:
-            f.write(response.content)
+            f.write(data)
         
         logger.info(f"✅ 已保存: {output_path}")
         
@@ -63,16 +256,13 @@ class ImageDownloader:
         logger.info(f"去除水印: {image_path}")
         
         try:
-            img = Image.open(image_path)
-            width, height = img.size
+            with Image.open(image_path) as img:
+                width, height = img.size
+                cropped = _to_rgb(img).crop((0, 0, width, int(height * WATERMARK_CROP_RATIO)))
             
-            # 小红书水印通常在底部，裁剪掉底部10%
-            crop_height = int(height * 0.9)
-            cropped = img.crop((0, 0, width, crop_height))
-            
-            # 保存处理后的图片
             output_path = image_path.replace('.jpg', '_no_watermark.jpg')
-            cropped.save(output_path, 'JPEG', quality=95)
+            with open(output_path, 'wb') as f:
+                f.write(encode_jpeg(cropped))
             
             logger.info(f"✅ 水印已去除: {output_path}")
             
@@ -100,44 +290,15 @@ class ImageDownloader:
         logger.info(f"调整图片尺寸: {image_path}")
         
         try:
-            img = Image.open(image_path)
-            width, height = img.size
-            
-            # 计算宽高比
-            ratio = width / height
-            
-            # 目标尺寸（保持宽高比，最大边为2048）
-            max_size = 2048
+            with Image.open(image_path) as img:
+                new_size = fit_size(*img.size)
+                resized = _to_rgb(img).resize(new_size, Image.Resampling.LANCZOS)
             
-            if ratio > 1:  # 横图
-                new_width = min(width, max_size)
-                new_height = int(new_width / ratio)
-            else:  # 竖图或方图
-                new_height = min(height, max_size)
-                new_width = int(new_height * ratio)
-            
-            # 确保在小红书要求范围内
-            if new_width < 1000:
-                new_width = 1000
-                new_height = int(new_width / ratio)
-            if new_height < 1000:
-                new_height = 1000
-                new_width = int(new_height * ratio)
-            
-            # 调整尺寸
-            resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 保存
             output_path = image_path.replace('.jpg', '_resized.jpg')
-            resized.save(output_path, 'JPEG', quality=90, optimize=True)
-            
-            # 检查文件大小
-            file_size = os.path.getsize(output_path) / (1024 * 1024)  # MB
-            if file_size > 5:
-                # 如果超过5MB，降低质量
-                resized.save(output_path, 'JPEG', quality=80, optimize=True)
+            with open(output_path, 'wb') as f:
+                f.write(encode_jpeg(resized))
             
-            logger.info(f"✅ 尺寸已调整: {new_width}x{new_height}")
+            logger.info(f"✅ 尺寸已调整: {new_size[0]}x{new_size[1]}")
             
             return output_path
         
@@ -145,6 +306,55 @@ class ImageDownloader:
             logger.warning(f"调整尺寸失败: {e}，使用原图")
             return image_path
     
+    def process_image_bytes(self, data: bytes) -> bytes:
+        """
+        在内存中完成去水印和尺寸调整
+        
+        只解码一次：裁剪和缩放合并为一次 resize（通过 box 参数），
+        最后只编码一次，避免多次 JPEG 重编码带来的画质损失和磁盘读写。
+        源图远大于目标尺寸时，JPEG 用 draft 模式按 1/2、1/4、1/8 直接解码出
+        小图，其他格式用 reducing_gap 先做整数倍 reduce，再做最终的 LANCZOS 缩放。
+        
+        Args:
+            data: 原始图片数据
+        
+        Returns:
+            处理后的JPEG数据
+        """
+        with span("image.encode", bytes_in=len(data)) as s:
+            processed = self._process(data)
+            s.set(bytes_out=len(processed))
+        return processed
+    
+    def _process(self, data: bytes) -> bytes:
+        with Image.open(BytesIO(data)) as img:
+            width, height = img.size
+            crop_height = int(height * WATERMARK_CROP_RATIO)
+            new_size = fit_size(width, crop_height)
+            
+            reducing_gap = None
+            if self.draft_decode:
+                reducing_gap = REDUCING_GAP
+                if img.format == 'JPEG':
+                    # 解码结果不小于目标尺寸（按裁剪前的整图换算）
+                    img.draft('RGB', (new_size[0], int(new_size[1] / WATERMARK_CROP_RATIO)))
+            
+            # draft 后尺寸可能变小，裁剪框按比例换算
+            scale = img.size[0] / width
+            box = (0, 0, img.size[0], min(img.size[1], int(crop_height * scale)))
+            
+            # 裁剪底部水印 + 调整尺寸
+            processed = _to_rgb(img).resize(
+                new_size,
+                Image.Resampling.LANCZOS,
+                box=box,
+                reducing_gap=reducing_gap
+            )
+        
+        logger.info(f"✅ 已去除水印并调整尺寸: {width}x{height} -> {new_size[0]}x{new_size[1]}")
+        
+        return encode_jpeg(processed)
+    
     def download_and_process(self, url: str, index: int) -> str:
         """
         下载并处理图片（完整流程）
@@ -156,22 +366,119 @@ class ImageDownloader:
         Returns:
             处理后的本地图片路径
         """
-        # 下载
-        filename = f"image_{index:02d}.jpg"
-        local_path = self.download_image(url, filename)
+        with span("image.process", index=index, url=url[:80]):
+            return self._download_and_process(url, index)
+    
+    def _download_and_process(self, url: str, index: int) -> str:
+        data = None
+        if self.dedup:
+            # 拿到数据后立即计算感知哈希，近似重复的图片不进入裁剪/缩放/编码
+            data = self.fetch_image_bytes(url)
+            self.dedup.register(url, data)
         
-        # 去除水印
-        no_watermark_path = self.remove_watermark(local_path)
+        try:
+            processed = None
+            if data is not None:
+                content_hash = content_hash_of(data)
+            else:
+                content_hash = self.cache.lookup(url) if self.cache else None
+            if self.cache and content_hash:
+                processed = self.cache.get_processed(content_hash, self.process_variant)
+            
+            if processed is None:
+                if data is None:
+                    data = self.fetch_image_bytes(url)
+                processed = self.process_image_bytes(data)
+                if self.cache:
+                    self.cache.put_processed(content_hash_of(data), self.process_variant, processed)
+            else:
+                logger.info(f"使用缓存的处理结果: {url[:50]}...")
+            
+            # 只写一次磁盘
+            output_path = self.output_dir / f"image_{index:02d}.jpg"
+            with open(output_path, 'wb') as f:
+                f.write(processed)
         
-        # 调整尺寸
-        final_path = self.resize_for_xiaohongshu(no_watermark_path)
+        except Exception:
+            if self.dedup:
+                self.dedup.forget(url)
+            raise
         
-        return final_path
+        local_path = str(output_path.absolute())
+        self._sources[local_path] = url
+        return local_path
+    
+    def record_published(self, local_paths):
+        """
+        记录已发布图片的感知哈希，之后的运行不会再选用近似的图片
+        
+        Args:
+            local_paths: 已发布的本地图片路径列表
+        """
+        if not self.dedup:
+            return
+        if is_replaying():
+            # 回放没有真正发布，不更新线上使用的已发布索引
+            return
+        
+        hashes = [self.dedup.get_hash(self._sources.get(path, '')) for path in local_paths]
+        self.dedup.record_published(hashes)
+    
+    def download_and_process_many(self, urls, target_count: int, workers: int = 4) -> list:
+        """
+        并行下载并处理多张图片
+        
+        最多同时处理 workers 张图片，已成功和处理中的数量合计达到 target_count 后
+        不再提交新任务，只在有图片失败时按顺序补位（urls 按优先级排列时只下载需要的图片）。
+        返回结果按 urls 中的原始顺序排列，与逐张串行处理时选出的图片一致。
+        
+        Args:
+            urls: 图片URL列表
+            target_count: 目标图片数量
+            workers: 并发线程数
+        
+        Returns:
+            处理后的本地图片路径列表（最多 target_count 张）
+        """
+        results = {}
+        pending_urls = iter(enumerate(urls, 1))
+        running = {}
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image") as executor:
+            
+            def _fill():
+                while len(results) + len(running) < target_count and len(running) < workers:
+                    try:
+                        index, url = next(pending_urls)
+                    except StopIteration:
+                        return
+                    logger.info(f"处理第{index}张图片...")
+                    # 文件名使用URL序号，避免并行处理时文件名冲突
+                    future = executor.submit(bind_context(self.download_and_process), url, index)
+                    running[future] = index
+            
+            _fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        results[index] = future.result()
+                        logger.info(f"  ✅ 第{index}张已处理: {results[index]}")
+                    except (DuplicateImageError, ImageRejectedError) as e:
+                        logger.info(f"  ⏭️  第{index}张跳过: {e}")
+                    except Exception as e:
+                        logger.warning(f"  ⚠️  第{index}张处理失败: {e}，尝试下一张")
+                _fill()
+        
+        return [results[index] for index in sorted(results)][:target_count]
     
     def cleanup(self):
         """清理临时文件"""
         logger.info("清理临时图片文件...")
         
+        self.cancel_prefetch()
+        
         try:
             import shutil
             if self.output_dir.exists():
@@ -180,3 +487,78 @@ class ImageDownloader:
         except Exception as e:
             logger.warning(f"清理失败: {e}")
 
+
+def fit_size(width: int, height: int) -> tuple:
+    """
+    计算符合小红书要求的目标尺寸
+    
+    保持宽高比，最长边不超过 MAX_SIDE，最短边不小于 MIN_SIDE。
+    
+    Returns:
+        (new_width, new_height)
+    """
+    ratio = width / height
+    
+    if ratio > 1:  # 横图
+        new_width = min(width, MAX_SIDE)
+        new_height = int(new_width / ratio)
+    else:  # 竖图或方图
+        new_height = min(height, MAX_SIDE)
+        new_width = int(new_height * ratio)
+    
+    # 确保在小红书要求范围内
+    if new_width < MIN_SIDE:
+        new_width = MIN_SIDE
+        new_height = int(new_width / ratio)
+    if new_height < MIN_SIDE:
+        new_height = MIN_SIDE
+        new_width = int(new_height * ratio)
+    
+    return new_width, new_height
+
+
+def encode_jpeg(img, max_bytes: int = MAX_FILE_BYTES) -> bytes:
+    """
+    编码为JPEG，保证不超过 max_bytes
+    
+    先用默认质量编码；超出大小时在内存中二分查找满足限制的最高质量，
+    不产生任何中间文件。
+    
+    Args:
+        img: PIL图片
+        max_bytes: 文件大小上限
+    
+    Returns:
+        JPEG数据
+    """
+    def _encode(quality):
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=quality, optimize=True)
+        return buffer.getvalue()
+    
+    data = _encode(JPEG_QUALITY)
+    if len(data) <= max_bytes:
+        return data
+    
+    low, high = JPEG_MIN_QUALITY, JPEG_QUALITY - 1
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _encode(quality)
+        if len(candidate) <= max_bytes:
+            best, low = candidate, quality + 1
+        else:
+            high = quality - 1
+    
+    if best is None:
+        logger.warning(f"质量降到 {JPEG_MIN_QUALITY} 仍超过 {max_bytes // (1024 * 1024)}MB，使用最低质量")
+        best = _encode(JPEG_MIN_QUALITY)
+    
+    return best
+
+
+def _to_rgb(img):
+    """JPEG不支持透明通道和调色板，统一转为RGB"""
+    if img.mode in ('RGB', 'L'):
+        return img
+    return img.convert('RGB')
@@ -0,0 +1,177 @@
+"""
+预览图选图
+
+先并行下载所有候选图片的小尺寸预览图（urlPre）并打分，
+只把得分最高的图片交给 Step 2 下载原图，减少传输的数据量和无用的解码。
+
+打分项：
+- 分辨率：原图尺寸（width/height 提示）相对小红书最短边要求的比例
+- 清晰度：预览图灰度的拉普拉斯方差（numpy 向量化计算）
+- 多样性：与已选图片感知哈希的最小汉明距离（贪心逐张选取）
+"""
+
+import os
+from io import BytesIO
+from concurrent.futures import wait
+from typing import Optional
+from .async_image_fetcher import get_image_fetcher
+from .image_downloader import MIN_SOURCE_SIDE
+from .image_dedup import HASH_THUMB_SIZE
+from .xhs_payloads import ImageRef
+from ..utils.logger import logger
+from ..utils.tracing import traced
+
+# 计算清晰度时预览图缩放到的最长边（不同尺寸的预览图之间可比）
+SHARPNESS_SIDE = 256
+
+# 各项权重
+WEIGHT_RESOLUTION = 0.35
+WEIGHT_SHARPNESS = 0.4
+WEIGHT_DIVERSITY = 0.25
+
+# 汉明距离达到该值视为完全不同（多样性满分）
+DIVERSITY_FULL_DISTANCE = 24
+
+# 等待预览图下载的总超时（秒，所有预览图共用一个截止时间）
+PREVIEW_TIMEOUT = float(os.getenv("IMAGE_PREVIEW_TIMEOUT", "15"))
+
+
+def laplacian_variance(gray: "np.ndarray") -> float:
+    """
+    拉普拉斯方差（越大越清晰）
+    
+    4邻域拉普拉斯算子用数组切片一次算完，不逐像素循环。
+    """
+    center = gray[1:-1, 1:-1]
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * center
+    )
+    return float(laplacian.var())
+
+
+def analyze_preview(data: bytes) -> tuple:
+    """
+    分析预览图
+    
+    Returns:
+        (清晰度, pHash)
+    """
+    # numpy、imagehash 导入较慢，第一次打分时才导入
+    import imagehash
+    import numpy as np
+    from PIL import Image
+    
+    with Image.open(BytesIO(data)) as img:
+        img.draft('L', (SHARPNESS_SIDE, SHARPNESS_SIDE))
+        gray = img.convert('L')
+        gray.thumbnail((SHARPNESS_SIDE, SHARPNESS_SIDE))
+    
+    sharpness = laplacian_variance(np.asarray(gray, dtype=np.float32))
+    
+    gray.thumbnail((HASH_THUMB_SIZE, HASH_THUMB_SIZE))
+    return sharpness, imagehash.phash(gray)
+
+
+def resolution_score(ref: ImageRef) -> Optional[float]:
+    """原图尺寸得分（0~1），没有尺寸提示时返回None"""
+    width, height = ref.width, ref.height
+    if not width or not height:
+        return None
+    
+    short_side = min(int(width), int(height))
+    if short_side < MIN_SOURCE_SIDE:
+        # 下载时会被拒绝
+        return 0.0
+    # 最短边达到要求的1.5倍即满分
+    return min(1.0, short_side / (MIN_SOURCE_SIDE * 1.5))
+
+
+class ImageSelector:
+    """预览图打分选图"""
+    
+    def __init__(self, fetcher=None):
+        """
+        Args:
+            fetcher: AsyncImageFetcher，默认使用共享实例
+        """
+        self.fetcher = fetcher or get_image_fetcher()
+    
+    @traced("image.select")
+    def rank(self, refs: list, previews: Optional[dict] = None) -> list:
+        """
+        对候选图片打分排序
+        
+        Args:
+            refs: 图片信息列表 [ImageRef]
+            previews: 已开始下载的预览图 {预览图URL: Future}
+        
+        Returns:
+            按得分从高到低排列的原图URL列表（包含全部候选，供下载失败时依次补位）
+        """
+        previews = dict(previews or {})
+        
+        # 还没开始下载的预览图全部并行发出
+        for ref in refs:
+            preview_url = ref.preview
+            if preview_url and preview_url not in previews:
+                previews[preview_url] = self.fetcher.prefetch(preview_url, preview=True)
+        
+        # 所有预览图共用一个截止时间，超时未完成的只按分辨率打分
+        wait([previews[ref.preview] for ref in refs if ref.preview in previews], timeout=PREVIEW_TIMEOUT)
+        
+        candidates = []
+        for ref in refs:
+            candidate = {
+                'url': ref.url,
+                'resolution': resolution_score(ref),
+                'sharpness': None,
+                'hash': None
+            }
+            future = previews.get(ref.preview)
+            if future is not None and future.done():
+                try:
+                    candidate['sharpness'], candidate['hash'] = analyze_preview(future.result())
+                except Exception as e:
+                    logger.debug(f"预览图分析失败: {e}")
+            candidates.append(candidate)
+        
+        ranked = self._greedy_rank(candidates)
+        
+        analyzed = len([c for c in candidates if c['hash'] is not None])
+        logger.info(f"✅ 预览图选图: {analyzed}/{len(refs)} 张预览图参与打分")
+        
+        return [c['url'] for c in ranked]
+    
+    @staticmethod
+    def _greedy_rank(candidates: list) -> list:
+        """按基础得分 + 与已选图片的多样性逐张选取"""
+        max_sharpness = max((c['sharpness'] for c in candidates if c['sharpness'] is not None), default=0)
+        
+        for c in candidates:
+            # 缺少的信息按中间值处理，不因为预览图下载失败就排到最后
+            resolution = c['resolution'] if c['resolution'] is not None else 0.5
+            if c['sharpness'] is not None and max_sharpness > 0:
+                sharpness = c['sharpness'] / max_sharpness
+            else:
+                sharpness = 0.5
+            c['base'] = WEIGHT_RESOLUTION * resolution + WEIGHT_SHARPNESS * sharpness
+            # 尺寸不达标的图片下载时一定会被拒绝
+            c['rejected'] = c['resolution'] == 0.0
+        
+        ranked = []
+        remaining = list(candidates)
+        while remaining:
+            def _score(c):
+                diversity = 1.0
+                if c['hash'] is not None:
+                    distances = [c['hash'] - r['hash'] for r in ranked if r['hash'] is not None]
+                    if distances:
+                        diversity = min(1.0, min(distances) / DIVERSITY_FULL_DISTANCE)
+                return (not c['rejected'], c['base'] + WEIGHT_DIVERSITY * diversity)
+            
+            best = max(remaining, key=_score)
+            remaining.remove(best)
+            ranked.append(best)
+        
+        return ranked
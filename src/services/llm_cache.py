@@ -0,0 +1,162 @@
+"""
+大模型响应缓存
+
+按 服务商 + 模型 + temperature + 消息内容哈希 缓存文案生成结果（持久化到磁盘），
+相同的请求不再重复付费调用（限制见下文）。
+
+LLM_CACHE 配置：
+- auto（默认）：总是写入缓存，只在测试模式或带 --llm-cache 运行时读取
+  （正式发布默认不使用缓存，每天的文案都是新生成的）
+- on：总是读写缓存
+- off：不读不写
+
+只缓存解析成功的响应，解析失败的结果不会在重试时被反复命中。
+
+缓存键包含完整的消息内容，攻略文案的消息里有 Step 1 实时搜到的参考标题和标签，
+重新搜索后消息不同就不会命中。因此只有输入完全相同时（测试模式、cassette 回放、
+复用同一份搜索结果重跑）才能命中，发布失败后重新搜索重跑当天任务时仍会调用接口。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+from .cassette import is_replaying
+from ..utils.logger import logger
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "llm"
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE", "auto").lower()
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "72"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+
+
+def cache_key(provider: str, model: str, temperature, messages) -> str:
+    """缓存键：服务商 + 模型 + temperature + 消息内容"""
+    text = json.dumps(
+        {"provider": provider, "model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    大模型响应缓存
+    
+    每条响应一个文件：<缓存键>.json（{"created", "provider", "model", "text"}）。
+    读取时更新文件修改时间，条目数超过上限时按修改时间淘汰最久未使用的（LRU）；
+    超过 TTL 的条目视为未命中并删除。
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None, ttl_hours: float = LLM_CACHE_TTL_HOURS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir or os.getenv("LLM_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的响应文本（未命中或已过期返回None）"""
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            return None
+        
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("text")
+    
+    def put(self, key: str, text: str, **meta):
+        """写入响应文本（写入失败只记录警告）"""
+        path = self.cache_dir / f"{key}.json"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        entry = {"created": time.time(), **meta, "text": text}
+        
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入大模型缓存失败: {e}")
+            self._remove(tmp_path)
+            return
+        
+        self._evict()
+    
+    def _evict(self):
+        """条目数超过上限时删除最久未使用的条目"""
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    entries.append((path.stat().st_mtime, path))
+                except OSError:
+                    continue
+            
+            if len(entries) <= self.max_entries:
+                return
+            
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+    
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+_cache_lock = threading.Lock()
+_shared_cache = None
+_reads_enabled = LLM_CACHE_MODE == "on"
+
+
+def enable_llm_cache_reads():
+    """允许读取缓存（测试模式、--llm-cache 重跑时调用；LLM_CACHE=off 时无效）"""
+    global _reads_enabled
+    _reads_enabled = True
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """获取共享缓存（LLM_CACHE=off 或回放模式时返回None）"""
+    global _shared_cache
+    
+    if LLM_CACHE_MODE == "off" or is_replaying():
+        return None
+    
+    with _cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache()
+        return _shared_cache
+
+
+def cached_text(key: str) -> Optional[str]:
+    """读取缓存（未允许读取时总是返回None）"""
+    if not _reads_enabled:
+        return None
+    cache = get_llm_cache()
+    return cache.get(key) if cache else None
+
+
+def store_text(key: str, text: str, **meta):
+    """写入缓存（LLM_CACHE=off 时不写入）"""
+    cache = get_llm_cache()
+    if cache:
+        cache.put(key, text, **meta)
@@ -0,0 +1,541 @@
+"""
+流式文案生成
+
+以流式方式调用对话接口，边接收边解析JSON对象：
+- 每个顶层字段（title / content / tags）的值一完整就回调，后续环节不必等整段输出
+- 输出明显不是JSON、语法错误或标题超过长度限制时立即断开连接并重新请求，
+  不再等完整输出之后才发现解析失败
+
+最后一次尝试不提前中止，读完整段输出交给各客户端原有的解析逻辑兜底。
+
+span 中记录首个片段耗时（ttft_ms）、标题耗时（title_ms），以及服务商上下文缓存命中的输入token数。
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Optional
+from ..utils.logger import logger
+from ..utils.tracing import current_span
+from .cassette import chat_completion, chat_completion_stream
+from .llm_cache import cache_key, cached_text, store_text
+
+# 是否使用流式输出（off 时一次性返回完整响应）
+LLM_STREAM = os.getenv("LLM_STREAM", "on").lower() != "off"
+
+# 输出格式错误时最多请求几次
+STREAM_MAX_ATTEMPTS = int(os.getenv("LLM_STREAM_MAX_ATTEMPTS", "3"))
+
+# 小红书标题上限
+TITLE_MAX_LENGTH = 20
+
+REQUIRED_FIELDS = ("title", "content", "tags")
+
+# 解析状态
+_PREAMBLE = "preamble"
+_KEY_OR_END = "key_or_end"
+_KEY = "key"
+_COLON = "colon"
+_VALUE_START = "value_start"
+_VALUE = "value"
+_COMMA_OR_END = "comma_or_end"
+_DONE = "done"
+_FAILED = "failed"
+
+_WHITESPACE = " \t\r\n"
+_PRIMITIVE_START = "-0123456789tfn"
+
+
+class MalformedOutputError(ValueError):
+    """模型输出不符合要求（非JSON、语法错误、缺少字段、标题过长）"""
+
+
+class RequestCancelled(Exception):
+    """请求已被其他线程取消（对冲请求中另一家先返回）"""
+
+
+class StreamHandle:
+    """
+    流式请求句柄
+    
+    cancel() 可在其他线程调用：立即断开正在接收的连接，服务端随即停止生成；
+    请求结束后 usage 为用量（dict），received_chars 为已收到的字符数。
+    """
+    
+    def __init__(self):
+        self.usage = None
+        self.received_chars = 0
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._stream = None
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+    
+    def cancel(self):
+        """取消请求（断开连接失败时，接收线程在下一段文本到达时退出）"""
+        self._cancelled.set()
+        with self._lock:
+            stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+    
+    def check(self):
+        """已取消时抛出 RequestCancelled"""
+        if self.cancelled:
+            raise RequestCancelled("请求已取消")
+    
+    def _attach(self, stream):
+        with self._lock:
+            self._stream = stream
+        # 绑定前已被取消
+        if self.cancelled:
+            stream.close()
+    
+    def _detach(self):
+        with self._lock:
+            self._stream = None
+
+
+class JsonFieldStream:
+    """
+    增量解析顶层JSON对象
+    
+    feed() 每次传入新收到的文本，返回这次完整解析出的字段 [(字段名, 值)]。
+    允许外层包裹 ```json 代码块。
+    
+    Example:
+        parser = JsonFieldStream(max_lengths={"title": 20})
+        for delta in stream:
+            for name, value in parser.feed(delta):
+                ...
+        fields = parser.close()
+    """
+    
+    def __init__(self, max_lengths=None, required=REQUIRED_FIELDS, strict: bool = True):
+        """
+        Args:
+            max_lengths: 字符串字段的最大长度 {字段名: 长度}（接收过程中超出即报错）
+            required: 必需字段
+            strict: 为False时出错不抛异常，只停止解析（记录在 error 中）
+        """
+        self.max_lengths = max_lengths or {}
+        self.required = required
+        self.strict = strict
+        self.fields = {}
+        self.error = None
+        self.text = ""
+        
+        self._pos = 0
+        self._state = _PREAMBLE
+        self._allow_end = True
+        self._key = None
+        self._start = 0
+        self._kind = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+    
+    def feed(self, text: str) -> list:
+        """追加文本，返回新完成的字段"""
+        self.text += text
+        completed = []
+        
+        if self._state in (_DONE, _FAILED):
+            return completed
+        
+        try:
+            self._parse(completed)
+            self._check_partial()
+        except MalformedOutputError as e:
+            self._fail(e)
+        
+        return completed
+    
+    def close(self) -> dict:
+        """输出结束，返回全部字段（不完整或缺少字段时报错）"""
+        if self._state == _FAILED:
+            return self.fields
+        
+        if self._state != _DONE:
+            self._fail(MalformedOutputError("输出不完整"))
+        else:
+            missing = [name for name in self.required if name not in self.fields]
+            if missing:
+                self._fail(MalformedOutputError(f"缺少字段: {', '.join(missing)}"))
+        return self.fields
+    
+    def _fail(self, error: MalformedOutputError):
+        self._state = _FAILED
+        self.error = error
+        if self.strict:
+            raise error
+    
+    def _parse(self, completed):
+        text = self.text
+        
+        while self._pos < len(text):
+            state = self._state
+            ch = text[self._pos]
+            
+            if state == _PREAMBLE:
+                if ch in _WHITESPACE:
+                    self._pos += 1
+                elif ch == "{":
+                    self._state = _KEY_OR_END
+                    self._allow_end = True
+                    self._pos += 1
+                elif ch == "`":
+                    # ```json 代码块：跳过开头这一行
+                    rest = text[self._pos:]
+                    if not rest.startswith("```"):
+                        if "```".startswith(rest):
+                            return
+                        raise MalformedOutputError("输出不是JSON对象")
+                    newline = text.find("\n", self._pos)
+                    if newline == -1:
+                        return
+                    self._pos = newline + 1
+                else:
+                    raise MalformedOutputError(f"输出不是JSON对象: {text[self._pos:self._pos + 20]!r}")
+            
+            elif state == _KEY_OR_END:
+                if ch in _WHITESPACE:
+                    self._pos += 1
+                elif ch == '"':
+                    self._state = _KEY
+                    self._start = self._pos
+                    self._escape = False
+                    self._pos += 1
+                elif ch == "}" and self._allow_end:
+                    self._state = _DONE
+                    self._pos += 1
+                else:
+                    raise MalformedOutputError(f"应为字段名: {ch!r}")
+            
+            elif state == _KEY:
+                end = self._scan_string()
+                if end is None:
+                    return
+                try:
+                    self._key = json.loads(text[self._start:end])
+                except ValueError as e:
+                    raise MalformedOutputError(f"字段名不是合法JSON: {e}")
+                self._state = _COLON
+            
+            elif state == _COLON:
+                if ch in _WHITESPACE:
+                    self._pos += 1
+                elif ch == ":":
+                    self._state = _VALUE_START
+                    self._pos += 1
+                else:
+                    raise MalformedOutputError(f"字段 {self._key} 后应为冒号: {ch!r}")
+            
+            elif state == _VALUE_START:
+                if ch in _WHITESPACE:
+                    self._pos += 1
+                    continue
+                
+                self._start = self._pos
+                self._escape = False
+                if ch == '"':
+                    self._kind = "string"
+                    self._pos += 1
+                elif ch in "{[":
+                    self._kind = "container"
+                    self._depth = 1
+                    self._in_string = False
+                    self._pos += 1
+                elif ch in _PRIMITIVE_START:
+                    self._kind = "primitive"
+                else:
+                    raise MalformedOutputError(f"字段 {self._key} 的值无效: {ch!r}")
+                self._state = _VALUE
+            
+            elif state == _VALUE:
+                end = self._scan_value()
+                if end is None:
+                    return
+                completed.append(self._complete_value(end))
+                self._state = _COMMA_OR_END
+            
+            elif state == _COMMA_OR_END:
+                if ch in _WHITESPACE:
+                    self._pos += 1
+                elif ch == ",":
+                    self._state = _KEY_OR_END
+                    self._allow_end = False
+                    self._pos += 1
+                elif ch == "}":
+                    self._state = _DONE
+                    self._pos += 1
+                else:
+                    raise MalformedOutputError(f"字段 {self._key} 后应为逗号或右括号: {ch!r}")
+            
+            else:
+                # 对象已结束，忽略之后的内容（如代码块结尾）
+                return
+    
+    def _scan_string(self):
+        """扫描到字符串结尾，返回结尾位置（不含），未结束返回None"""
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                return self._pos
+        return None
+    
+    def _scan_value(self):
+        """扫描到值的结尾，返回结尾位置（不含），未结束返回None"""
+        if self._kind == "string":
+            return self._scan_string()
+        
+        text = self.text
+        if self._kind == "primitive":
+            while self._pos < len(text):
+                if text[self._pos] in ",}" or text[self._pos] in _WHITESPACE:
+                    return self._pos
+                self._pos += 1
+            return None
+        
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._pos
+        return None
+    
+    def _complete_value(self, end: int) -> tuple:
+        raw = self.text[self._start:end]
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            raise MalformedOutputError(f"字段 {self._key} 的值不是合法JSON: {e}")
+        
+        self._check_length(self._key, value)
+        self.fields[self._key] = value
+        return self._key, value
+    
+    def _check_partial(self):
+        """字符串字段接收到一半时检查长度（超出上限不必等到字段结束）"""
+        if self._state != _VALUE or self._kind != "string" or self._key not in self.max_lengths:
+            return
+        
+        raw = self.text[self._start + 1:self._pos]
+        try:
+            partial = json.loads(f'"{raw}"')
+        except ValueError:
+            # 结尾是不完整的转义序列，下次再检查
+            return
+        self._check_length(self._key, partial)
+    
+    def _check_length(self, key, value):
+        limit = self.max_lengths.get(key)
+        if limit is not None and isinstance(value, str) and len(value) > limit:
+            raise MalformedOutputError(f"{key} 超过{limit}字: {value[:limit + 5]}...")
+
+
+def cached_prompt_tokens(usage: Optional[dict]) -> Optional[int]:
+    """
+    服务商上下文缓存命中的输入token数（服务商没有返回时为None）
+    
+    DeepSeek 为 prompt_cache_hit_tokens，千问等 OpenAI 兼容接口为 prompt_tokens_details.cached_tokens。
+    """
+    if not usage:
+        return None
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        return usage["prompt_cache_hit_tokens"]
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+
+def record_usage(model: str, usage: Optional[dict]):
+    """把用量（含缓存命中的输入token数）记录到当前 span 并输出日志"""
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    cached = cached_prompt_tokens(usage)
+    
+    current_span().set(
+        model=model,
+        tokens=usage.get("total_tokens"),
+        prompt_tokens=prompt_tokens,
+        cached_tokens=cached
+    )
+    
+    if not prompt_tokens:
+        return
+    if cached is None:
+        logger.info(f"📈 输入 {prompt_tokens} tokens（未返回缓存命中数），输出 {usage.get('completion_tokens')} tokens")
+    else:
+        logger.info(
+            f"📈 输入 {prompt_tokens} tokens，缓存命中 {cached}（{cached / prompt_tokens:.0%}），"
+            f"输出 {usage.get('completion_tokens')} tokens"
+        )
+
+
+def stream_json_completion(client, provider: str, model: str, messages, temperature, max_tokens, on_field=None,
+                           handle: StreamHandle = None) -> str:
+    """
+    流式生成JSON文案
+    
+    Args:
+        client: OpenAI 兼容客户端
+        provider: 服务商（deepseek / qwen）
+        on_field: 字段完整时的回调 on_field(字段名, 原始值)（中止重试后会重新回调）
+        handle: 请求句柄（用于从其他线程取消、读取用量）
+    
+    Returns:
+        完整的输出文本（由调用方按原有逻辑解析）
+    
+    Raises:
+        RequestCancelled: 请求被 handle 取消
+    """
+    handle = handle or StreamHandle()
+    span = current_span()
+    attempts = max(1, STREAM_MAX_ATTEMPTS)
+    
+    for attempt in range(1, attempts + 1):
+        # 最后一次不提前中止，完整输出交给原有解析逻辑兜底
+        final = attempt == attempts
+        handle.check()
+        parser = JsonFieldStream(max_lengths={"title": TITLE_MAX_LENGTH}, strict=not final)
+        start = time.perf_counter()
+        
+        stream = chat_completion_stream(
+            client, provider,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        handle._attach(stream)
+        first_delta = True
+        try:
+            for delta in stream:
+                handle.check()
+                if first_delta:
+                    span.set(ttft_ms=round((time.perf_counter() - start) * 1000, 1))
+                    first_delta = False
+                handle.received_chars += len(delta)
+                for name, value in parser.feed(delta):
+                    if name == "title":
+                        span.set(title_ms=round((time.perf_counter() - start) * 1000, 1))
+                    if on_field:
+                        on_field(name, value)
+            parser.close()
+        except MalformedOutputError as e:
+            handle.check()
+            logger.warning(f"⚠️  模型输出不符合要求，中止并重新生成（{attempt}/{attempts}）: {e}")
+            span.add("stream_aborts")
+            continue
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            # 被其他线程断开连接时，接收线程收到的是连接错误
+            if handle.cancelled:
+                raise RequestCancelled("请求已取消") from e
+            raise
+        finally:
+            handle._detach()
+            stream.close()
+        
+        handle.check()
+        
+        if parser.error:
+            logger.warning(f"⚠️  模型输出不符合要求: {parser.error}，按原有方式解析")
+        
+        handle.usage = stream.usage
+        record_usage(model, stream.usage)
+        return parser.text
+
+
+def generate_json(client, provider: str, model: str, messages, temperature, max_tokens, parse, on_field=None,
+                  handle: StreamHandle = None):
+    """
+    调用对话接口并解析文案（DeepSeek / 千问客户端共用）
+    
+    允许读缓存时，相同请求（服务商、模型、temperature、消息内容都相同）直接使用缓存的响应，不发请求；
+    否则按 LLM_STREAM 流式或一次性请求，解析成功的响应写入缓存。
+    
+    Args:
+        client: OpenAI 兼容客户端
+        provider: 服务商（deepseek / qwen）
+        parse: 解析输出文本的函数（各客户端的 _parse_content），解析失败时抛出异常
+        on_field: 字段生成完整时的回调 on_field(字段名, 值)（流式输出时边生成边回调）
+        handle: 请求句柄 StreamHandle（对冲请求时用于从其他线程取消）
+    
+    Returns:
+        parse 解析出的文案
+    """
+    key = cache_key(provider, model, temperature, messages)
+    content_text = cached_text(key)
+    if content_text is not None:
+        logger.info("♻️  使用缓存的文案（未调用接口）")
+        current_span().set(model=model, cache="hit")
+        content = parse(content_text)
+        if on_field:
+            for name, value in content.items():
+                on_field(name, value)
+        return content
+    
+    if LLM_STREAM:
+        # 边接收边校验，格式错误或标题过长时提前中止重试
+        content_text = stream_json_completion(
+            client, provider,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            on_field=on_field,
+            handle=handle
+        ).strip()
+    else:
+        # 非流式请求无法中途断开，只能在返回后丢弃结果
+        if handle is not None:
+            handle.check()
+        response = chat_completion(
+            client, provider,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = response.usage.model_dump() if response.usage else None
+        record_usage(model, usage)
+        content_text = response.choices[0].message.content.strip()
+        if handle is not None:
+            handle.usage = usage
+            handle.check()
+    logger.debug(f"AI返回: {content_text[:100]}...")
+    
+    # 解析失败时抛出异常，不写入缓存
+    content = parse(content_text)
+    store_text(key, content_text, provider=provider, model=model)
+    return content
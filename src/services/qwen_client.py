@@ -6,9 +6,11 @@
 
 import os
 import json
-from openai import OpenAI
 from ..utils.logger import logger
 from ..utils.retry import retry_on_failure
+from ..utils.tracing import traced
+from .cassette import chat_completion, is_replaying
+from .llm_stream import RequestCancelled, generate_json
 
 
 class QwenClient:
@@ -17,12 +19,17 @@ class QwenClient:
     def __init__(self, api_key=None):
         self.api_key = api_key or os.getenv("QWEN_API_KEY")
         if not self.api_key:
-            raise ValueError("QWEN_API_KEY 未设置")
+            if not is_replaying():
+                raise ValueError("QWEN_API_KEY 未设置")
+            # 回放模式：响应来自 cassette，不访问接口
+            self.api_key = "cassette-replay"
+        
+        # 使用OpenAI兼容接口（openai 导入较慢，创建客户端时才导入）
+        from openai import OpenAI
         
-        # 使用OpenAI兼容接口
         self.client = OpenAI(
             api_key=self.api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url=os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
         )
         
         self.model_chat = "qwen-max"
@@ -44,7 +51,8 @@ class QwenClient:
         logger.debug(f"分析图片: {image_url}")
         
         try:
-            response = self.client.chat.completions.create(
+            response = chat_completion(
+                self.client, "qwen",
                 model=self.model_vision,
                 messages=[
                     {
@@ -75,6 +83,7 @@ class QwenClient:
             # 返回备用描述
             return "旅游场景图片"
     
+    @traced("llm.qwen")
     @retry_on_failure(max_attempts=3)
     def generate_content(self, city, image_descriptions):
         """
@@ -97,27 +106,17 @@ class QwenClient:
         prompt = self._build_content_prompt(city, image_descriptions)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_chat,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个小红书旅游博主，擅长写吸引人的旅游分享。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            
-            content_text = response.choices[0].message.content.strip()
-            logger.debug(f"AI返回: {content_text}")
-            
-            # 解析JSON
-            content = self._parse_content(content_text)
+            messages = [
+                {
+                    "role": "system",
+                    "content": "你是一个小红书旅游博主，擅长写吸引人的旅游分享。"
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+            content = self._generate_json(messages, self.temperature)
             
             logger.info(f"✅ 文案生成成功: {content['title']}")
             
@@ -128,6 +127,64 @@ class QwenClient:
             # 返回备用文案
             return self._generate_fallback_content(city, image_descriptions)
     
+    @traced("llm.qwen")
+    @retry_on_failure(max_attempts=3)
+    def generate_content_from_prompt(self, prompt, on_field=None, handle=None, system_prompt=None):
+        """
+        从自定义prompt生成文案
+        
+        Args:
+            prompt: 完整的prompt文本
+            on_field: 字段生成完整时的回调 on_field(字段名, 值)，
+                      流式输出时标题等字段生成完就回调，不必等整段文案
+            handle: 请求句柄 StreamHandle（对冲请求时用于从其他线程取消）
+            system_prompt: system 消息（固定不变的要求放在这里，服务商可缓存相同的前缀）
+        
+        Returns:
+            {
+                "title": "标题",
+                "content": "正文",
+                "tags": ["标签1", "标签2"]
+            }
+        """
+        logger.info(f"从自定义prompt生成文案")
+        
+        try:
+            messages = [
+                {
+                    "role": "system",
+                    "content": system_prompt or "你是一个真实的旅游博主，只根据事实写游记。"
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+            content = self._generate_json(messages, 0.7, on_field=on_field, handle=handle)
+            
+            logger.info(f"✅ 文案生成成功: {content['title']}")
+            
+            return content
+        
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"文案生成失败: {e}")
+            raise
+    
+    def _generate_json(self, messages, temperature, on_field=None, handle=None):
+        """
+        调用对话接口并解析文案（读写缓存、流式/一次性请求见 llm_stream.generate_json）
+        
+        Args:
+            on_field: 字段生成完整时的回调 on_field(字段名, 值)（流式输出时边生成边回调）
+            handle: 请求句柄 StreamHandle（对冲请求时用于从其他线程取消）
+        """
+        return generate_json(
+            self.client, "qwen", self.model_chat, messages, temperature, self.max_tokens,
+            self._parse_content, on_field=on_field, handle=handle
+        )
+    
     def _build_content_prompt(self, city, image_descriptions):
         """构建文案生成prompt"""
         
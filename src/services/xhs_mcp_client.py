@@ -5,10 +5,16 @@
 """
 
 import os
+import sys
 import asyncio
+import threading
 from typing import List, Dict, Optional
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from ..utils.logger import logger
+from ..utils.logger import logger, payload_preview
+from ..utils.tracing import span
+from .cassette import cassette_call_async, is_replaying
+from .xhs_payloads import Feed, FeedDetail, parse_search_result, parse_feed_detail
+
+MCP_SERVER_NAME = "xiaohongshu-mcp"
 
 
 class XhsMcpClient:
@@ -19,20 +25,77 @@ class XhsMcpClient:
         self.transport = os.getenv("MCP_TRANSPORT", "http")
         self.client = None
         self.tools = None
+        # 并发调用时只建立一次连接
+        self._connect_lock = asyncio.Lock()
+        self._session_task = None
+        self._closing = None
     
     async def _ensure_connected(self):
-        """确保MCP客户端已连接"""
-        if self.client is None:
+        """
+        确保MCP客户端已连接
+        
+        连接后会保持一个常驻的MCP会话（由后台任务持有），
+        之后所有工具调用都复用这个会话，不再重复握手和获取工具列表。
+        """
+        async with self._connect_lock:
+            if self.tools is not None:
+                return
+            
+            if is_replaying():
+                # 回放模式：工具调用结果来自 cassette，不连接MCP服务
+                return
+            
             logger.info("连接小红书MCP服务...")
-            self.client = MultiServerMCPClient({
-                "xiaohongshu-mcp": {
-                    "transport": self.transport,
-                    "url": self.mcp_url,
-                }
-            })
-            self.tools = await self.client.get_tools()
+            if self.client is None:
+                # langchain_mcp_adapters 导入耗时约1秒，连接时才导入
+                from langchain_mcp_adapters.client import MultiServerMCPClient
+                
+                self.client = MultiServerMCPClient({
+                    MCP_SERVER_NAME: {
+                        "transport": self.transport,
+                        "url": self.mcp_url,
+                    }
+                })
+            
+            ready = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            self._session_task = asyncio.ensure_future(self._hold_session(ready))
+            await ready
             logger.info(f"✅ 已连接，获取到 {len(self.tools)} 个工具")
     
+    async def _hold_session(self, ready):
+        """持有MCP会话，直到 close() 被调用或连接断开"""
+        from langchain_mcp_adapters.tools import load_mcp_tools
+        
+        try:
+            async with self.client.session(MCP_SERVER_NAME) as session:
+                self.tools = await load_mcp_tools(session)
+                ready.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not self._closing.is_set():
+                logger.warning(f"MCP会话已断开，下次调用时重连: {e}")
+        finally:
+            self.tools = None
+            if not ready.done():
+                ready.cancel()
+    
+    async def close(self):
+        """关闭常驻的MCP会话"""
+        if self._session_task is None:
+            return
+        
+        self._closing.set()
+        try:
+            await self._session_task
+        except Exception as e:
+            logger.debug(f"关闭MCP会话时出错: {e}")
+        finally:
+            self._session_task = None
+            logger.info("MCP会话已关闭")
+    
     def _get_tool(self, tool_name: str):
         """获取指定工具"""
         if self.tools is None:
@@ -44,13 +107,60 @@ class XhsMcpClient:
         
         raise ValueError(f"未找到工具: {tool_name}")
     
+    async def reconnect(self):
+        """关闭当前的MCP会话（连接已断开时也可调用）并重新连接"""
+        self.tools = None
+        await self.close()
+        await self._ensure_connected()
+    
+    async def _reconnect_quietly(self):
+        """重连（失败时只记录日志，下次调用时会再次连接）"""
+        try:
+            await self.reconnect()
+        except Exception as e:
+            logger.warning(f"MCP重连失败，下次调用时重试: {e}")
+    
+    async def call_tool(self, tool_name: str, args: Dict, idempotent: bool = True):
+        """
+        调用MCP工具（记录追踪 span：耗时和返回数据大小；支持录制/回放）
+        
+        Args:
+            tool_name: 工具名
+            args: 工具参数
+            idempotent: 重复调用是否无副作用。常驻会话的连接已关闭时会重连后重试一次；
+                        非幂等的工具（发布）不重试，重连后把异常抛给调用方
+        """
+        with span(f"mcp.{tool_name}") as s:
+            result = await cassette_call_async(
+                "mcp", tool_name, {"tool": tool_name, "args": args},
+                lambda: self._invoke_tool(tool_name, args, idempotent)
+            )
+            s.set(bytes=_result_size(result))
+        
+        return result
+    
+    async def _invoke_tool(self, tool_name: str, args: Dict, idempotent: bool):
+        try:
+            return await self._get_tool(tool_name).ainvoke(args)
+        except Exception as e:
+            if not _is_closed_transport(e):
+                raise
+            if not idempotent:
+                # 无法确定请求是否已发出，不自动重试（避免重复发布），重连后交给调用方处理
+                logger.error(f"MCP会话连接已关闭，{tool_name} 不自动重试，重连供下次调用: {e!r}")
+                await self._reconnect_quietly()
+                raise
+            logger.warning(f"MCP会话连接已关闭，重连后重试 {tool_name}: {e!r}")
+        
+        await self.reconnect()
+        return await self._get_tool(tool_name).ainvoke(args)
+    
     async def check_login_status(self) -> Dict:
         """检查登录状态"""
         await self._ensure_connected()
         
         logger.info("检查小红书登录状态...")
-        tool = self._get_tool("check_login_status")
-        result = await tool.ainvoke({})
+        result = await self.call_tool("check_login_status", {})
         
         logger.info(f"登录状态: {result}")
         
@@ -91,18 +201,18 @@ class XhsMcpClient:
             import asyncio
             
             logger.info("🔍 [2/5] 查找 MCP 工具: get_login_qrcode")
-            tool = self._get_tool("get_login_qrcode")
+            self._get_tool("get_login_qrcode")
             logger.info("✅ MCP 工具已找到")
             
             # 添加超时控制（60秒，MCP 生成二维码需要时间）
             logger.info("🔍 [3/5] 调用 MCP 服务生成二维码...")
             logger.info("⏱️  等待响应（可能需要 10-30 秒）...")
             result = await asyncio.wait_for(
-                tool.ainvoke({}),
+                self.call_tool("get_login_qrcode", {}),
                 timeout=60.0
             )
             logger.info(f"✅ MCP 返回响应，类型: {type(result)}")
-            logger.debug(f"   完整响应（前500字符）: {str(result)[:500]}")
+            logger.debug("   完整响应（前500字符）: {}", payload_preview(result, 500))
             
             # 处理返回结果，提取base64图片数据
             logger.info("🔍 [4/5] 解析二维码数据...")
@@ -111,7 +221,7 @@ class XhsMcpClient:
                 logger.info(f"   响应类型: 列表，长度={len(result)}")
                 # 遍历列表查找image类型的项
                 for i, item in enumerate(result):
-                    logger.debug(f"   项 {i}: {type(item)} - {str(item)[:100]}")
+                    logger.debug("   项 {}: {} - {}", i, type(item), payload_preview(item, 100))
                     if isinstance(item, dict) and item.get('type') == 'image':
                         qr_base64 = item.get('base64')
                         logger.info(f"✅ 在列表项 {i} 中找到 image 类型")
@@ -181,7 +291,7 @@ class XhsMcpClient:
             logger.info("请使用浏览器访问 http://localhost:18060 进行登录")
             return {"error": "get_login_qrcode tool not available"}
     
-    async def search_feeds(self, keyword: str, limit: int = 10) -> List[Dict]:
+    async def search_feeds(self, keyword: str, limit: int = 10) -> List[Feed]:
         """
         搜索小红书内容
         
@@ -195,8 +305,7 @@ class XhsMcpClient:
         await self._ensure_connected()
         
         logger.info(f"搜索小红书内容: {keyword}")
-        tool = self._get_tool("search_feeds")
-        result = await tool.ainvoke({"keyword": keyword})
+        result = await self.call_tool("search_feeds", {"keyword": keyword})
         
         # 解析结果
         feeds = self._parse_search_result(result, limit)
@@ -204,7 +313,7 @@ class XhsMcpClient:
         
         return feeds
     
-    async def get_feed_detail(self, feed_id: str, xsec_token: str) -> Dict:
+    async def get_feed_detail(self, feed_id: str, xsec_token: str) -> FeedDetail:
         """
         获取帖子详情
         
@@ -218,14 +327,13 @@ class XhsMcpClient:
         await self._ensure_connected()
         
         logger.info(f"获取帖子详情: {feed_id}")
-        tool = self._get_tool("get_feed_detail")
-        result = await tool.ainvoke({
+        result = await self.call_tool("get_feed_detail", {
             "feed_id": feed_id,
             "xsec_token": xsec_token
         })
         
         detail = self._parse_feed_detail(result)
-        logger.info(f"✅ 获取到帖子: {detail.get('title', 'N/A')[:30]}")
+        logger.info(f"✅ 获取到帖子: {(detail.title or 'N/A')[:30]}")
         
         return detail
     
@@ -261,164 +369,144 @@ class XhsMcpClient:
             tags_str = " ".join(tags)
             publish_params["content"] = f"{content}\n\n{tags_str}"
         
-        tool = self._get_tool("publish_content")
-        result = await tool.ainvoke(publish_params)
+        result = await self.call_tool("publish_content", publish_params, idempotent=False)
         
         logger.info(f"✅ 发布成功")
         return result
     
-    def _parse_search_result(self, result, limit: int) -> List[Dict]:
+    def _parse_search_result(self, result, limit: int) -> List[Feed]:
         """解析搜索结果"""
-        feeds = []
-        
-        logger.info(f"🔍 搜索结果类型: {type(result)}")
-        logger.info(f"🔍 搜索结果内容（前1000字符）: {str(result)[:1000]}")
-        
-        # 根据实际返回格式解析
-        if isinstance(result, list):
-            # 如果返回的是列表
-            for item in result[:limit]:
-                if isinstance(item, dict):
-                    # 检查是否是MCP返回的包装格式
-                    if item.get('type') == 'text' and 'text' in item:
-                        # 解析JSON字符串
-                        import json
-                        try:
-                            data = json.loads(item['text'])
-                            if 'feeds' in data:
-                                for feed in data['feeds'][:limit]:
-                                    feeds.append({
-                                        'feed_id': feed.get('id'),
-                                        'xsec_token': feed.get('xsecToken') or feed.get('xsec_token') or ''  # 注意驼峰命名
-                                    })
-                        except:
-                            pass
-                    else:
-                        feeds.append({
-                            'feed_id': item.get('id') or item.get('note_id') or item.get('feed_id'),
-                            'xsec_token': item.get('xsecToken') or item.get('xsec_token') or item.get('token') or ''  # 支持驼峰命名
-                        })
-                elif isinstance(item, str):
-                    # 如果列表项是字符串，尝试解析
-                    import json
-                    try:
-                        parsed = json.loads(item)
-                        feeds.append({
-                            'feed_id': parsed.get('id') or parsed.get('note_id'),
-                            'xsec_token': parsed.get('xsec_token') or ''
-                        })
-                    except:
-                        pass
+        logger.debug("🔍 搜索结果（{}，前1000字符）: {}", type(result).__name__, payload_preview(result, 1000))
         
-        elif isinstance(result, dict):
-            # 如果返回的是字典
-            items = result.get('items') or result.get('notes') or result.get('feeds') or []
-            for item in items[:limit]:
-                feeds.append({
-                    'feed_id': item.get('id') or item.get('note_id') or item.get('feed_id'),
-                    'xsec_token': item.get('xsec_token') or item.get('token') or ''
-                })
-        
-        elif isinstance(result, str):
-            # 如果返回的是字符串，尝试提取信息
-            import re
-            import json
-            
-            # 尝试解析为JSON
-            try:
-                parsed = json.loads(result)
-                return self._parse_search_result(parsed, limit)
-            except:
-                pass
-            
-            # 正则提取
-            feed_ids = re.findall(r'(?:feed_id|note_id|id)["\s:]+([a-zA-Z0-9]+)', result)
-            tokens = re.findall(r'xsec_token["\s:]+([a-zA-Z0-9_-]+)', result)
-            
-            for i, feed_id in enumerate(feed_ids[:limit]):
-                token = tokens[i] if i < len(tokens) else ''
-                feeds.append({
-                    'feed_id': feed_id,
-                    'xsec_token': token
-                })
+        feeds = parse_search_result(result, limit)
         
         logger.info(f"解析出 {len(feeds)} 个帖子")
         return feeds
     
-    def _parse_feed_detail(self, result) -> Dict:
+    def _parse_feed_detail(self, result) -> FeedDetail:
         """解析帖子详情"""
-        logger.info(f"🔍 帖子详情原始数据类型: {type(result)}")
-        logger.info(f"🔍 帖子详情原始数据（前3000字符）: {str(result)[:3000]}")
-        
-        detail = {
-            'title': '',
-            'content': '',
-            'images': [],
-            'tags': []
-        }
+        logger.debug("🔍 帖子详情原始数据（{}，前3000字符）: {}", type(result).__name__, payload_preview(result, 3000))
         
-        # 根据实际返回格式解析
-        if isinstance(result, list) and len(result) > 0:
-            # MCP可能返回列表格式
-            first_item = result[0]
-            if isinstance(first_item, dict) and first_item.get('type') == 'text':
-                # 解析JSON字符串
-                import json
-                try:
-                    data = json.loads(first_item['text'])
-                    
-                    # 数据结构是嵌套的：data.note.xxx
-                    note_data = data.get('data', {}).get('note', {})
-                    
-                    # 提取标题
-                    detail['title'] = note_data.get('title', '')
-                    detail['content'] = note_data.get('desc', '')
-                    
-                    # 提取图片（从imageList中获取urlDefault）
-                    if 'imageList' in note_data:
-                        detail['images'] = [
-                            img.get('urlDefault') or img.get('url') or img.get('urlPre') 
-                            for img in note_data['imageList'] 
-                            if img.get('urlDefault') or img.get('url') or img.get('urlPre')
-                        ]
-                    
-                    # 提取标签（从desc中提取#话题）
-                    import re
-                    tags = re.findall(r'#([^#\[]+)\[话题\]', note_data.get('desc', ''))
-                    detail['tags'] = [f"#{tag.strip()}" for tag in tags]
-                    
-                    logger.info(f"✅ 解析出标题: {detail['title']}")
-                    logger.info(f"✅ 解析出 {len(detail['images'])} 张图片")
-                    logger.info(f"✅ 解析出 {len(detail['tags'])} 个标签")
-                except Exception as e:
-                    logger.error(f"❌ JSON解析失败: {e}")
-        
-        elif isinstance(result, str):
-            import re
-            
-            # 提取标题
-            title_match = re.search(r'title["\s:]+([^\n"]+)', result)
-            if title_match:
-                detail['title'] = title_match.group(1).strip()
-            
-            # 提取图片URL
-            image_urls = re.findall(r'https?://[^\s"]+\.(?:jpg|jpeg|png|webp)', result)
-            detail['images'] = image_urls
-            
-            # 提取标签
-            tags = re.findall(r'#([^\s#]+)', result)
-            detail['tags'] = [f"#{tag}" for tag in tags]
+        detail = parse_feed_detail(result)
         
+        logger.info(f"✅ 解析出标题: {detail.title}")
+        logger.info(f"✅ 解析出 {len(detail.image_refs)} 张图片")
+        logger.info(f"✅ 解析出 {len(detail.tags)} 个标签")
         return detail
 
 
+def _is_closed_transport(e) -> bool:
+    """
+    是否为常驻会话的连接已关闭（anyio 的 ClosedResourceError / BrokenResourceError）
+    
+    anyio 随 MCP 客户端一起导入，这里不主动导入：没有导入过 anyio 时不可能抛出它的异常。
+    """
+    anyio = sys.modules.get("anyio")
+    return anyio is not None and isinstance(e, (anyio.ClosedResourceError, anyio.BrokenResourceError))
+
+
+def _result_size(result) -> int:
+    """MCP返回内容的大小（字节，按文本内容估算）"""
+    if isinstance(result, list):
+        return sum(_result_size(item) for item in result)
+    if isinstance(result, dict):
+        return len(str(result.get('text') or result.get('data') or '').encode('utf-8'))
+    return len(str(result).encode('utf-8'))
+
+
+# 进程级常驻异步运行时：一个后台线程中的事件循环 + 一个共享的MCP客户端
+_runtime_lock = threading.Lock()
+_runtime_loop = None
+_runtime_thread = None
+_shared_client = None
+_shutdown_hooks = []
+
+
+def _get_runtime_loop():
+    """获取（必要时启动）常驻事件循环"""
+    global _runtime_loop, _runtime_thread
+    
+    with _runtime_lock:
+        if _runtime_loop is None:
+            _runtime_loop = asyncio.new_event_loop()
+            _runtime_thread = threading.Thread(
+                target=_runtime_loop.run_forever,
+                name="xhs-async-runtime",
+                daemon=True
+            )
+            _runtime_thread.start()
+        return _runtime_loop
+
+
 def run_async(coro):
-    """运行异步函数的同步包装"""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    """
+    运行异步函数的同步包装
     
-    return loop.run_until_complete(coro)
+    所有协程都提交到同一个常驻事件循环执行，MCP会话等异步资源可以跨步骤复用。
+    """
+    loop = _get_runtime_loop()
+    if threading.current_thread() is _runtime_thread:
+        coro.close()
+        raise RuntimeError("不能在异步运行时线程内调用 run_async")
+    
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def submit_async(coro):
+    """
+    把协程提交到常驻事件循环，不等待结果（可在任意线程调用，包括运行时线程）
+    
+    Returns:
+        concurrent.futures.Future（取消它会同时取消协程）
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_runtime_loop())
+
+
+def register_shutdown_hook(hook):
+    """
+    注册在 shutdown_runtime 时执行的清理协程函数（如关闭 aiohttp 会话）
+    
+    Args:
+        hook: 无参数的 async 函数
+    """
+    with _runtime_lock:
+        if hook not in _shutdown_hooks:
+            _shutdown_hooks.append(hook)
+
+
+def get_shared_client() -> XhsMcpClient:
+    """获取进程内共享的MCP客户端（所有步骤复用同一个会话）"""
+    global _shared_client
+    
+    with _runtime_lock:
+        if _shared_client is None:
+            _shared_client = XhsMcpClient()
+        return _shared_client
+
 
+def shutdown_runtime():
+    """关闭共享MCP会话并停止常驻事件循环（进程结束前调用）"""
+    global _runtime_loop, _runtime_thread, _shared_client
+    
+    with _runtime_lock:
+        loop, thread, client = _runtime_loop, _runtime_thread, _shared_client
+        _runtime_loop = _runtime_thread = _shared_client = None
+    
+    if loop is None:
+        return
+    
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭MCP会话失败: {e}")
+    
+    for hook in list(_shutdown_hooks):
+        try:
+            asyncio.run_coroutine_threadsafe(hook(), loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭异步资源失败: {e}")
+    
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
@@ -0,0 +1,220 @@
+"""
+小红书MCP返回内容解析
+
+MCP工具的返回值可能是：文本块列表 [{'type': 'text', 'text': '<JSON>'}]、字典、
+JSON字符串或纯文本。这里先把各种形态统一展开成JSON对象，再按字段表取值，
+解析结果为紧凑的记录对象（Feed / FeedDetail / ImageRef）。
+
+安装了 orjson 时用 orjson 解码，否则使用标准库 json。
+纯文本（非JSON）只能用正则兜底提取。
+"""
+
+import re
+import json
+from typing import List, Optional
+
+try:
+    import orjson
+    
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+# 字段表：同一含义的字段在不同版本的MCP服务中名称不同，按顺序取第一个有值的
+FEED_LIST_KEYS = ("feeds", "items", "notes")
+FEED_ID_KEYS = ("id", "note_id", "feed_id")
+XSEC_TOKEN_KEYS = ("xsecToken", "xsec_token", "token")
+IMAGE_URL_KEYS = ("urlDefault", "url", "urlPre")
+
+# 纯文本兜底
+_FEED_ID_PATTERN = re.compile(r'(?:feed_id|note_id|id)["\s:]+([a-zA-Z0-9]+)')
+_XSEC_TOKEN_PATTERN = re.compile(r'xsec_token["\s:]+([a-zA-Z0-9_-]+)')
+_TITLE_PATTERN = re.compile(r'title["\s:]+([^\n"]+)')
+_IMAGE_URL_PATTERN = re.compile(r'https?://[^\s"]+\.(?:jpg|jpeg|png|webp)')
+_TEXT_TAG_PATTERN = re.compile(r'#([^\s#]+)')
+
+# 正文中的话题：#标签[话题]#
+_TOPIC_PATTERN = re.compile(r'#([^#\[]+)\[话题\]')
+
+
+class Feed:
+    """搜索结果中的帖子"""
+    
+    __slots__ = ("feed_id", "xsec_token")
+    
+    def __init__(self, feed_id: Optional[str], xsec_token: str = ""):
+        self.feed_id = feed_id
+        self.xsec_token = xsec_token
+    
+    def __repr__(self):
+        return f"Feed({self.feed_id!r})"
+
+
+class ImageRef:
+    """帖子中的一张图片：原图URL、预览图URL（urlPre，与原图相同时为None）、原图尺寸"""
+    
+    __slots__ = ("url", "preview", "width", "height")
+    
+    def __init__(self, url: str, preview: Optional[str] = None, width=None, height=None):
+        self.url = url
+        self.preview = preview
+        self.width = width
+        self.height = height
+    
+    def __repr__(self):
+        return f"ImageRef({self.url!r})"
+
+
+class FeedDetail:
+    """帖子详情"""
+    
+    __slots__ = ("title", "content", "image_refs", "tags")
+    
+    def __init__(self, title: str = "", content: str = "", image_refs: Optional[List[ImageRef]] = None,
+                 tags: Optional[List[str]] = None):
+        self.title = title
+        self.content = content
+        self.image_refs = image_refs or []
+        self.tags = tags or []
+    
+    @property
+    def images(self) -> List[str]:
+        """原图URL列表"""
+        return [ref.url for ref in self.image_refs]
+    
+    def __repr__(self):
+        return f"FeedDetail({self.title!r}, {len(self.image_refs)} images)"
+
+
+def _first(obj: dict, keys):
+    """按字段表取第一个有值的字段"""
+    for key in keys:
+        value = obj.get(key)
+        if value:
+            return value
+    return None
+
+
+def _decode(text):
+    """解码JSON文本，不是JSON时返回None"""
+    try:
+        return _loads(text)
+    except ValueError:
+        return None
+
+
+def _iter_objects(payload):
+    """
+    把MCP返回值展开为JSON对象
+    
+    文本块和JSON字符串先解码；列表逐项展开；无法解码的文本原样产出（由调用方兜底）。
+    """
+    if isinstance(payload, list):
+        for item in payload:
+            if isinstance(item, dict) and item.get("type") == "text" and "text" in item:
+                decoded = _decode(item["text"])
+                if decoded is not None:
+                    yield from _iter_objects(decoded)
+            elif isinstance(item, str):
+                decoded = _decode(item)
+                if isinstance(decoded, dict):
+                    yield decoded
+            else:
+                yield item
+    elif isinstance(payload, str):
+        decoded = _decode(payload)
+        if decoded is None:
+            yield payload
+        else:
+            yield from _iter_objects(decoded)
+    else:
+        yield payload
+
+
+def parse_search_result(payload, limit: int) -> List[Feed]:
+    """
+    解析 search_feeds 的返回值
+    
+    Args:
+        payload: MCP返回值
+        limit: 最多返回的帖子数
+    """
+    feeds = []
+    
+    for obj in _iter_objects(payload):
+        if len(feeds) >= limit:
+            break
+        
+        if isinstance(obj, str):
+            feeds.extend(_search_from_text(obj, limit - len(feeds)))
+            continue
+        if not isinstance(obj, dict):
+            continue
+        
+        # 包含帖子列表的对象，或者帖子本身
+        items = _first(obj, FEED_LIST_KEYS)
+        for item in (items if isinstance(items, list) else [obj]):
+            if len(feeds) >= limit:
+                break
+            if isinstance(item, dict):
+                feeds.append(Feed(_first(item, FEED_ID_KEYS), _first(item, XSEC_TOKEN_KEYS) or ""))
+    
+    return feeds
+
+
+def _search_from_text(text: str, limit: int) -> List[Feed]:
+    """从纯文本中用正则提取帖子ID和token（按出现顺序配对）"""
+    feed_ids = _FEED_ID_PATTERN.findall(text)
+    tokens = _XSEC_TOKEN_PATTERN.findall(text)
+    return [
+        Feed(feed_id, tokens[i] if i < len(tokens) else "")
+        for i, feed_id in enumerate(feed_ids[:limit])
+    ]
+
+
+def parse_feed_detail(payload) -> FeedDetail:
+    """
+    解析 get_feed_detail 的返回值（数据结构为 data.note.xxx）
+    
+    没有可识别的内容时返回空的 FeedDetail。
+    """
+    for obj in _iter_objects(payload):
+        if isinstance(obj, str):
+            return _detail_from_text(obj)
+        if isinstance(obj, dict):
+            data = obj.get("data")
+            note = data.get("note") if isinstance(data, dict) else None
+            if isinstance(note, dict):
+                return _detail_from_note(note)
+    
+    return FeedDetail()
+
+
+def _detail_from_note(note: dict) -> FeedDetail:
+    image_refs = []
+    for img in note.get("imageList") or []:
+        url = _first(img, IMAGE_URL_KEYS)
+        if not url:
+            continue
+        preview = img.get("urlPre")
+        image_refs.append(ImageRef(url, preview if preview != url else None, img.get("width"), img.get("height")))
+    
+    desc = note.get("desc") or ""
+    return FeedDetail(
+        title=note.get("title") or "",
+        content=desc,
+        image_refs=image_refs,
+        tags=[f"#{tag.strip()}" for tag in _TOPIC_PATTERN.findall(desc)]
+    )
+
+
+def _detail_from_text(text: str) -> FeedDetail:
+    """从纯文本中用正则提取标题、图片URL和标签"""
+    title_match = _TITLE_PATTERN.search(text)
+    return FeedDetail(
+        title=title_match.group(1).strip() if title_match else "",
+        image_refs=[ImageRef(url) for url in _IMAGE_URL_PATTERN.findall(text)],
+        tags=[f"#{tag}" for tag in _TEXT_TAG_PATTERN.findall(text)]
+    )
@@ -1,20 +1,34 @@
-"""核心流程步骤（V2）"""
-
-from .step0_context import generate_context
-from .step1_search_xhs import search_xhs_content
-from .step2_download_images import download_and_process_images
-from .step3_generate_guide import generate_guide_content
-from .step4_assembly import assemble_post
-from .step5_publish import publish_to_xhs
-from .step6_logging import log_to_feishu
-
-__all__ = [
-    "generate_context",
-    "search_xhs_content",
-    "download_and_process_images",
-    "generate_guide_content",
-    "assemble_post",
-    "publish_to_xhs",
-    "log_to_feishu"
-]
+"""
+核心流程步骤（V2）
 
+各步骤在第一次使用时才导入（PEP 562），避免导入一个步骤时加载全部步骤的依赖。
+"""
+
+import importlib
+
+# 名称 → 所在模块
+_LAZY_EXPORTS = {
+    "generate_context": ".step0_context",
+    "search_xhs_content": ".step1_search_xhs",
+    "download_and_process_images": ".step2_download_images",
+    "generate_guide_content": ".step3_generate_guide",
+    "assemble_post": ".step4_assembly",
+    "publish_to_xhs": ".step5_publish",
+    "log_to_feishu": ".step6_logging",
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
+
+
+__all__ = list(_LAZY_EXPORTS)
@@ -4,22 +4,51 @@ Step 1: 从小红书搜索真实内容
 使用MCP工具搜索小红书，获取真实的旅游内容和图片
 """
 
+import os
+import asyncio
 from ..utils.logger import logger
-from ..services.xhs_mcp_client import XhsMcpClient, run_async
+from ..services.xhs_mcp_client import get_shared_client, run_async
+from ..services.async_image_fetcher import get_image_fetcher
+from ..utils.config_cache import search_keywords
 
+# 同时获取帖子详情的最大并发数（每个详情请求都会在MCP服务端驱动一个浏览器页面）
+DETAIL_CONCURRENCY = int(os.getenv("XHS_DETAIL_CONCURRENCY", "3"))
 
-def search_xhs_content(ctx):
+# 每个帖子最多取几张图片
+IMAGES_PER_FEED = 3
+
+# 可用帖子数达到该值后停止搜索
+MIN_FEEDS = 3
+
+# 每个关键词取前几条搜索结果
+SEARCH_LIMIT = 5
+
+# 拿到帖子详情后立即在后台下载图片（与剩余详情请求重叠）
+IMAGE_PREFETCH = os.getenv("IMAGE_PREFETCH", "on").lower() != "off"
+
+# 预览图选图：只预取小尺寸的 urlPre 用于打分，原图留给 Step 2 按得分下载
+IMAGE_PREVIEW_SELECT = os.getenv("IMAGE_PREVIEW_SELECT", "on").lower() != "off"
+
+# 凑够结果后，进行中的搜索/详情请求最多再等几秒（结果丢弃），超时后取消，不再占用MCP浏览器会话
+LATE_REQUEST_TIMEOUT = float(os.getenv("XHS_LATE_REQUEST_TIMEOUT", "5"))
+
+
+def search_xhs_content(ctx, target_count=10):
     """
     从小红书搜索内容
     
     Args:
         ctx: 上下文（包含city、topic_name、topic_type等信息）
+        target_count: 需要收集的图片数量，凑够后不再获取剩余帖子详情
     
     Returns:
         {
-            'feeds': [帖子列表],
+            'feeds': [Feed],
             'selected_feed': 选中的帖子详情,
-            'images': 图片URL列表
+            'images': 图片URL列表,
+            'image_refs': [ImageRef]（原图URL、预览图URL、尺寸）,
+            'prefetched': {原图URL: 后台下载的Future},
+            'previews': {预览图URL: 后台下载的Future}
         }
     """
     city = ctx['city']
@@ -28,53 +57,13 @@ def search_xhs_content(ctx):
     
     logger.info(f"Step 1: 从小红书搜索内容 - {city} {topic_name} ({topic_type})")
     
-    client = XhsMcpClient()
-    
-    # 🆕 根据主题类型构建搜索关键词
-    if topic_type == 'landmark':
-        # 景点类：强调攻略、打卡、游玩
-        keywords = [
-            f"{city}{topic_name}攻略",
-            f"{city}{topic_name}游玩",
-            f"{topic_name}打卡"
-        ]
-    elif topic_type == 'food':
-        # 美食类：强调推荐、探店、好吃
-        keywords = [
-            f"{city}{topic_name}推荐",
-            f"{city}{topic_name}探店",
-            f"{city}好吃的{topic_name}"
-        ]
-    elif topic_type == 'drink':
-        # 饮品类：强调探店、推荐、咖啡馆/茶馆
-        keywords = [
-            f"{city}{topic_name}探店",
-            f"{city}{topic_name}推荐",
-            f"{city}{topic_name}店"
-        ]
-    else:  # general
-        # 通用类：保持原有的旅游攻略关键词
-        keywords = [
-            f"{city}旅游攻略",
-            f"{city}一日游",
-            f"{city}必去景点"
-        ]
+    client = get_shared_client()
     
-    all_feeds = []
+    # 🆕 根据主题类型构建搜索关键词（城市配置中的主题已预先构建）
+    keywords = search_keywords(city, topic_type, topic_name)
     
-    # 搜索多个关键词
-    for keyword in keywords:
-        try:
-            logger.info(f"搜索: {keyword}")
-            feeds = run_async(client.search_feeds(keyword, limit=5))
-            all_feeds.extend(feeds)
-            
-            if len(all_feeds) >= 3:
-                break
-        
-        except Exception as e:
-            logger.warning(f"搜索失败: {e}")
-            continue
+    # 所有关键词同时搜索，凑够可用帖子后取消其余搜索
+    all_feeds = run_async(_search_keywords(client, keywords, MIN_FEEDS, SEARCH_LIMIT))
     
     if not all_feeds:
         logger.error("未找到任何内容")
@@ -84,39 +73,35 @@ def search_xhs_content(ctx):
     
     # 策略：从多个帖子混合收集图片（降低重复率，避免侵权风险）
     all_images = []
+    all_refs = []
     reference_titles = []
     reference_tags = []
     
-    logger.info(f"从 {len(all_feeds)} 个帖子中提取图片...")
+    logger.info(f"从 {len(all_feeds)} 个帖子中提取图片（并发: {DETAIL_CONCURRENCY}）...")
     
-    for feed in all_feeds:
-        feed_id = feed.get('feed_id', 'N/A')
-        xsec_token = feed.get('xsec_token', '')
+    prefetched = {}
+    previews = {}
+    on_detail = None
+    if IMAGE_PREFETCH:
+        fetcher = get_image_fetcher()
         
-        try:
-            if xsec_token:
-                # 尝试获取详情
-                detail = run_async(client.get_feed_detail(feed_id, xsec_token))
-                
-                if detail:
-                    images = detail.get('images', [])
-                    if images:
-                        # 从每个帖子取部分图片（不是全部），增加多样性
-                        take_count = min(len(images), 3)  # 每个帖子最多取3张
-                        all_images.extend(images[:take_count])
-                        reference_titles.append(detail.get('title', ''))
-                        reference_tags.extend(detail.get('tags', []))
-                        
-                        logger.info(f"  ✅ 从帖子 {feed_id[:20]}... 获取 {take_count} 张图片")
-                    else:
-                        logger.warning(f"  ⚠️  帖子 {feed_id[:20]}... 没有图片")
-            else:
-                # 没有token，跳过
-                logger.warning(f"  ⚠️  帖子 {feed_id[:20]}... 缺少xsec_token，跳过")
-                
-        except Exception as e:
-            logger.warning(f"  ⚠️  获取帖子 {feed_id[:20]}... 失败: {e}")
-            continue
+        def on_detail(detail):
+            for ref in detail.image_refs[:IMAGES_PER_FEED]:
+                if IMAGE_PREVIEW_SELECT and ref.preview:
+                    if ref.preview not in previews:
+                        previews[ref.preview] = fetcher.prefetch(ref.preview, preview=True)
+                elif ref.url not in prefetched:
+                    prefetched[ref.url] = fetcher.prefetch(ref.url)
+    
+    details = run_async(_fetch_feed_details(client, all_feeds, target_count, DETAIL_CONCURRENCY, on_detail))
+    
+    for detail in details:
+        refs = detail.image_refs[:IMAGES_PER_FEED]
+        # 从每个帖子取部分图片（不是全部），增加多样性
+        all_refs.extend(refs)
+        all_images.extend(ref.url for ref in refs)
+        reference_titles.append(detail.title)
+        reference_tags.extend(detail.tags)
     
     # 如果没有获取到图片，直接抛出异常
     if not all_images:
@@ -133,11 +118,190 @@ def search_xhs_content(ctx):
     
     logger.info(f"✅ 共获取 {len(all_images)} 张图片（混合自 {len([t for t in reference_titles if t])} 个帖子）")
     
+    images = all_images[:target_count]
+    image_refs = all_refs[:target_count]
+    
+    # 不会用到的图片停止预取
+    for url in set(prefetched) - set(images):
+        prefetched.pop(url).cancel()
+    for url in set(previews) - {ref.preview for ref in image_refs}:
+        previews.pop(url).cancel()
+    
     return {
         'feeds': all_feeds,
-        'images': all_images[:10],  # 最多10张，后续会筛选到6张
+        'images': images,  # 默认最多10张，后续会筛选到6张
+        'image_refs': image_refs,
         'reference_title': reference_titles[0] if reference_titles else f"{city}旅游攻略",
         'reference_content': '',  # 混合模式下不保存原文
-        'reference_tags': list(set(reference_tags))[:10]  # 去重，最多10个
+        'reference_tags': list(set(reference_tags))[:10],  # 去重，最多10个
+        'prefetched': prefetched,
+        'previews': previews
     }
 
+
+async def _search_keywords(client, keywords, quorum, limit):
+    """
+    并发搜索多个关键词
+    
+    所有关键词的搜索同时发出，结果按返回先后合并并按 feed_id 去重；
+    可用帖子（有 feed_id 和 xsec_token）数量达到 quorum 后立即返回，
+    仍在进行中的搜索在后台最多再进行 LATE_REQUEST_TIMEOUT 秒（结果丢弃），之后取消。
+    
+    Args:
+        client: XhsMcpClient
+        keywords: 关键词列表（按优先级排列）
+        quorum: 需要的可用帖子数
+        limit: 每个关键词的结果数
+    
+    Returns:
+        去重后的帖子列表（先返回的关键词结果排在前面）
+    """
+    async def _search(keyword):
+        logger.info(f"搜索: {keyword}")
+        return await client.search_feeds(keyword, limit=limit)
+    
+    tasks = {asyncio.ensure_future(_search(keyword)): keyword for keyword in keywords}
+    pending = set(tasks)
+    all_feeds = []
+    seen_ids = set()
+    usable = 0
+    
+    try:
+        while pending and usable < quorum:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            
+            # 同一批完成的任务按关键词优先级排序
+            for task in sorted(done, key=lambda t: keywords.index(tasks[t])):
+                try:
+                    feeds = task.result()
+                except Exception as e:
+                    logger.warning(f"搜索失败（{tasks[task]}）: {e}")
+                    continue
+                
+                for feed in feeds:
+                    feed_id = feed.feed_id
+                    if not feed_id or feed_id in seen_ids:
+                        continue
+                    seen_ids.add(feed_id)
+                    all_feeds.append(feed)
+                    if feed.xsec_token:
+                        usable += 1
+    finally:
+        if pending:
+            logger.info(f"已找到 {usable} 个可用帖子，不再等待剩余 {len(pending)} 个搜索")
+            _finish_in_background(pending)
+    
+    return all_feeds
+
+
+async def _fetch_feed_details(client, feeds, target_count, concurrency, on_detail=None):
+    """
+    并发获取帖子详情
+    
+    所有详情请求在同一个事件循环中发出，用信号量限制并发数；
+    收集到的图片数达到 target_count 后不再发起新的请求并立即返回，
+    进行中的请求在后台最多再进行 LATE_REQUEST_TIMEOUT 秒（结果丢弃），之后取消。
+    
+    Args:
+        client: XhsMcpClient
+        feeds: 搜索结果列表
+        target_count: 需要的图片数量
+        concurrency: 最大并发数
+        on_detail: 每拿到一个有图片的帖子详情时调用（参数为帖子详情），用于提前开始下载
+    
+    Returns:
+        有图片的帖子详情列表（按搜索结果顺序）
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    enough = asyncio.Event()
+    results = {}
+    collected = 0
+    
+    async def _fetch(index, feed):
+        nonlocal collected
+        feed_id = str(feed.feed_id or 'N/A')
+        xsec_token = feed.xsec_token
+        
+        if not xsec_token:
+            # 没有token，跳过
+            logger.warning(f"  ⚠️  帖子 {feed_id[:20]}... 缺少xsec_token，跳过")
+            return
+        
+        async with semaphore:
+            if enough.is_set():
+                return
+            try:
+                detail = await client.get_feed_detail(feed_id, xsec_token)
+            except Exception as e:
+                logger.warning(f"  ⚠️  获取帖子 {feed_id[:20]}... 失败: {e}")
+                return
+        
+        if enough.is_set():
+            # 图片已凑够（函数已返回），丢弃结果
+            return
+        
+        images = detail.image_refs if detail else []
+        if not images:
+            logger.warning(f"  ⚠️  帖子 {feed_id[:20]}... 没有图片")
+            return
+        
+        results[index] = detail
+        take_count = min(len(images), IMAGES_PER_FEED)
+        collected += take_count
+        logger.info(f"  ✅ 从帖子 {feed_id[:20]}... 获取 {take_count} 张图片")
+        
+        if on_detail:
+            on_detail(detail)
+        
+        if collected >= target_count:
+            enough.set()
+    
+    tasks = [asyncio.ensure_future(_fetch(i, feed)) for i, feed in enumerate(feeds)]
+    pending = set(tasks)
+    
+    try:
+        while pending and not enough.is_set():
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.warning(f"  ⚠️  获取帖子详情出错: {task.exception()}")
+    finally:
+        # 排队中的请求不再发起，进行中的请求完成后丢弃结果
+        enough.set()
+        pending = [t for t in tasks if not t.done()]
+        if pending:
+            logger.info(f"已收集 {collected} 张图片，不再等待剩余 {len(pending)} 个详情请求")
+            _finish_in_background(pending)
+    
+    return [results[i] for i in sorted(results)]
+
+
+# 提前返回后仍在进行中的请求（保持引用直到完成）
+_background_tasks = set()
+
+
+def _finish_in_background(tasks):
+    """
+    让进行中的请求在后台完成，结果丢弃
+    
+    不立即取消：刚发出的MCP工具调用多数很快返回，给 LATE_REQUEST_TIMEOUT 秒完成；
+    超时仍未返回的取消，避免与后续步骤争用同一个MCP浏览器会话。
+    """
+    for task in tasks:
+        _background_tasks.add(task)
+        task.add_done_callback(_on_background_done)
+    asyncio.get_running_loop().call_later(LATE_REQUEST_TIMEOUT, _cancel_late_requests, tasks)
+
+
+def _cancel_late_requests(tasks):
+    pending = [t for t in tasks if not t.done()]
+    if pending:
+        logger.info(f"取消 {len(pending)} 个超过 {LATE_REQUEST_TIMEOUT:g} 秒未返回的请求（结果已不再需要）")
+        for task in pending:
+            task.cancel()
+
+
+def _on_background_done(task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"后台请求失败（结果已丢弃）: {task.exception()}")
@@ -4,8 +4,16 @@ Step 2: 下载并处理图片
 从小红书下载图片，去除水印，调整尺寸
 """
 
+import os
 from ..utils.logger import logger
 from ..services.image_downloader import ImageDownloader
+from ..services.image_selector import ImageSelector
+
+# 同时下载处理的图片数
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "4"))
+
+# 先用预览图打分，按得分从高到低下载原图
+IMAGE_PREVIEW_SELECT = os.getenv("IMAGE_PREVIEW_SELECT", "on").lower() != "off"
 
 
 def download_and_process_images(xhs_data, target_count=6):
@@ -26,27 +34,17 @@ def download_and_process_images(xhs_data, target_count=6):
     
     logger.info(f"Step 2: 下载并处理图片 - 来源: {len(images)}张，目标: {target_count}张")
     
-    downloader = ImageDownloader()
-    local_images = []
-    
-    # 处理图片，直到达到目标数量或所有图片处理完
-    for i, img_url in enumerate(images, 1):
-        if len(local_images) >= target_count:
-            logger.info(f"已达到目标数量 {target_count} 张，停止处理")
-            break
-            
-        try:
-            logger.info(f"处理第{i}张图片...")
-            
-            # 下载并处理（去水印、调整尺寸）
-            local_path = downloader.download_and_process(img_url, len(local_images) + 1)
-            local_images.append(local_path)
-            
-            logger.info(f"  ✅ 已处理: {local_path}")
-        
-        except Exception as e:
-            logger.warning(f"  ⚠️  处理失败: {e}，尝试下一张")
-            continue
+    image_refs = xhs_data.get('image_refs')
+    if IMAGE_PREVIEW_SELECT and image_refs and any(ref.preview for ref in image_refs):
+        # 得分低的图片排在后面，只在前面的下载失败时补位
+        images = ImageSelector().rank(image_refs, xhs_data.get('previews'))
+    
+    # Step 1 已开始下载的图片直接取用
+    downloader = ImageDownloader(prefetched=xhs_data.get('prefetched'))
+    
+    # 并行下载、去水印、调整尺寸，凑够目标数量后停止提交新任务
+    local_images = downloader.download_and_process_many(images, target_count, workers=IMAGE_WORKERS)
+    downloader.cancel_prefetch()
     
     if len(local_images) < target_count:
         logger.warning(f"⚠️  仅成功处理 {len(local_images)}/{target_count} 张图片")
@@ -5,17 +5,19 @@ Step 3: 生成攻略式文案
 """
 
 from ..utils.logger import logger
-from ..services import get_ai_client
-from ..prompts.guide_content import GUIDE_CONTENT_PROMPT
+from ..utils.config_cache import TOPIC_TYPE_NAMES
+from ..services import get_shared_ai_client
+from ..prompts.guide_content import GUIDE_SYSTEM_PROMPT, GUIDE_USER_PROMPT
 
 
-def generate_guide_content(ctx, xhs_data):
+def generate_guide_content(ctx, xhs_data, on_field=None):
     """
     生成攻略式文案
     
     Args:
         ctx: 上下文
         xhs_data: 小红书数据
+        on_field: 字段生成完整时的回调 on_field(字段名, 值)（流式输出时边生成边回调）
     
     Returns:
         {
@@ -26,8 +28,8 @@ def generate_guide_content(ctx, xhs_data):
     """
     logger.info(f"Step 3: 生成攻略式文案 - {ctx['city']}")
     
-    # 创建AI客户端
-    ai_client = get_ai_client()
+    # AI客户端（进程内共享）
+    ai_client = get_shared_ai_client()
     
     # 提取地标信息
     landmarks = _extract_landmarks(ctx, xhs_data)
@@ -47,17 +49,12 @@ def generate_guide_content(ctx, xhs_data):
     
     # 获取话题类型
     topic_type = ctx.get('topic_type', 'landmark')
-    topic_type_desc = {
-        'food': '美食',
-        'hotel': '住宿',
-        'activity': '活动/体验',
-        'landmark': '景点'
-    }.get(topic_type, '景点')
+    topic_type_desc = TOPIC_TYPE_NAMES.get(topic_type, '景点')
     
     logger.info(f"话题类型: {topic_type} ({topic_type_desc})")
     
-    # 构建prompt
-    prompt = GUIDE_CONTENT_PROMPT.format(
+    # 构建prompt（固定的要求在 system 消息中，这里只有每次运行不同的部分）
+    prompt = GUIDE_USER_PROMPT.format(
         city=ctx['city'],
         topic_type=topic_type,
         reference_content=reference_content,
@@ -67,9 +64,19 @@ def generate_guide_content(ctx, xhs_data):
     
     logger.debug(f"Prompt:\n{prompt[:200]}...")
     
+    def _on_field(name, value):
+        if name == 'title':
+            logger.info(f"  标题已生成: {value}")
+        if on_field:
+            on_field(name, value)
+    
     # 生成文案
     try:
-        content = ai_client.generate_content_from_prompt(prompt)
+        content = ai_client.generate_content_from_prompt(
+            prompt,
+            on_field=_on_field,
+            system_prompt=GUIDE_SYSTEM_PROMPT
+        )
         
         logger.info(f"✅ 攻略文案生成完成")
         logger.info(f"  标题: {content['title']}")
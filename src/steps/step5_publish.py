@@ -4,11 +4,11 @@ Step 5: 发布到小红书
 使用小红书MCP工具发布内容
 """
 
-import asyncio
 from datetime import datetime
-from ..utils.logger import logger
+from ..utils.logger import logger, payload_preview
 from .step4_assembly import cleanup_local_images
-from ..services.xhs_mcp_client import XhsMcpClient
+from ..services.xhs_mcp_client import get_shared_client, run_async
+from ..services.cassette import is_replaying
 
 
 def publish_to_xhs(post):
@@ -41,7 +41,7 @@ def publish_to_xhs(post):
     
     try:
         # 调用异步发布
-        result = asyncio.run(_publish_via_mcp_async(post))
+        result = run_async(_publish_via_mcp_async(post))
         
         # 如果使用了本地文件，发布后清理
         if post.get("is_local"):
@@ -66,21 +66,21 @@ async def _publish_via_mcp_async(post):
     """
     通过MCP异步发布到小红书
     """
-    client = XhsMcpClient()
+    client = get_shared_client()
     
     try:
-        # 确保连接并获取工具
+        # 确保连接并获取工具（复用进程内的MCP会话）
         logger.info("正在连接小红书MCP服务...")
         await client._ensure_connected()
         
-        # 查找发布工具
+        # 查找发布工具（回放模式下没有工具列表，发布结果来自 cassette）
         publish_tool = None
-        for tool in client.tools:
+        for tool in client.tools or []:
             if getattr(tool, "name", "") == "publish_content":
                 publish_tool = tool
                 break
         
-        if publish_tool is None:
+        if publish_tool is None and not is_replaying():
             raise Exception("未找到 publish_content 工具，请确认MCP服务是否正常运行")
         
         # 构建发布参数
@@ -124,10 +124,9 @@ async def _publish_via_mcp_async(post):
         
         # 调用发布工具
         logger.info("正在调用MCP发布工具...")
-        result = await publish_tool.ainvoke(payload)
+        result = await client.call_tool("publish_content", payload)
         
-        logger.info(f"MCP返回结果类型: {type(result)}")
-        logger.info(f"MCP返回内容（前1000字符）: {str(result)[:1000]}")
+        logger.debug("MCP返回内容（{}，前1000字符）: {}", type(result).__name__, payload_preview(result, 1000))
         
         # 解析结果 - MCP返回格式: [{'type': 'text', 'text': '...PostID:xxx...'}]
         note_id = None
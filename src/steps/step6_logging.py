@@ -4,9 +4,14 @@ Step 6: 飞书记录
 记录发布结果到飞书表格和发送通知
 """
 
+import os
 from datetime import datetime
 from ..utils.logger import logger
-from ..services.feishu_client import FeishuClient
+from ..services.feishu_client import get_shared_feishu_client
+
+# 多维表格中单独记录各步骤耗时的字段名（表格需有同名文本字段）；
+# 未设置时各步骤耗时附加在已有的「耗时」字段后面
+STEP_TIMINGS_FIELD = os.getenv("FEISHU_STEP_TIMINGS_FIELD", "")
 
 
 def log_to_feishu(ctx, result):
@@ -19,8 +24,8 @@ def log_to_feishu(ctx, result):
     """
     logger.info("Step 6: 记录到飞书")
     
-    # 创建飞书客户端
-    feishu = FeishuClient()
+    # 飞书客户端（进程内共享）
+    feishu = get_shared_feishu_client()
     
     # 发送通知
     if result.get("status") == "success":
@@ -49,6 +54,14 @@ def log_to_feishu(ctx, result):
         "失败原因": result.get("error", "")[:200] if not is_success else ""  # 限制长度
     }
     
+    # 各步骤耗时（来自运行追踪，详细数据见 logs/trace_*.json）
+    step_timings = result.get("step_timings")
+    if step_timings:
+        if STEP_TIMINGS_FIELD:
+            record[STEP_TIMINGS_FIELD] = step_timings
+        else:
+            record["耗时"] = f"{record['耗时']}（{step_timings}）"
+    
     feishu.append_table_record(record)
     
     logger.info("✅ 飞书记录完成")
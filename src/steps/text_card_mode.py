@@ -6,9 +6,9 @@
 
 import os
 import random
-import yaml
 from ..utils.logger import logger
 from ..utils.text_card_generator import TextCardGenerator
+from ..utils.config_cache import load_text_topics
 
 
 def generate_text_card_content():
@@ -27,12 +27,9 @@ def generate_text_card_content():
     """
     logger.info("📝 模式2: 文字卡片模式")
     
-    # 加载话题库
-    topics_file = "config/text_topics.yaml"
+    # 加载话题库（已编译缓存）
     try:
-        with open(topics_file, 'r', encoding='utf-8') as f:
-            topics_data = yaml.safe_load(f)
-            topics = topics_data.get('topics', [])
+        topics = load_text_topics()
     except Exception as e:
         logger.error(f"加载话题库失败: {e}")
         raise ValueError("无法加载话题库")
@@ -45,7 +42,7 @@ def generate_text_card_content():
     
     text = topic.get('text', '')
     emoji = topic.get('emoji', '')
-    tags = topic.get('tags', [])
+    tags = list(topic.get('tags', []))
     
     logger.info(f"  选中话题: {emoji} {text}")
     logger.info(f"  标签: {', '.join(tags)}")
@@ -0,0 +1,283 @@
+"""
+配置文件加载与编译缓存
+
+config/cities.yaml 和 config/text_topics.yaml 只在内容变化后解析一次：
+用 libyaml 的C加载器（未安装时用纯Python加载器）解析、校验字段，
+预先算好按优先级加权的城市表和每个主题的搜索关键词，
+编译结果保存在 cache/config/（按源文件的修改时间和大小失效），进程内再缓存一份。
+
+批量、常驻模式下每次生成上下文只需 stat 一次配置文件。
+"""
+
+import os
+import pickle
+import random
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from .logger import logger
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+    YAML_LOADER = "libyaml"
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+    YAML_LOADER = "python"
+
+CONFIG_DIR = Path(__file__).parent.parent.parent / "config"
+CITIES_PATH = CONFIG_DIR / "cities.yaml"
+TEXT_TOPICS_PATH = CONFIG_DIR / "text_topics.yaml"
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "config"
+
+# 编译缓存文件（off 时每个进程仍只解析一次）
+CONFIG_CACHE = os.getenv("CONFIG_CACHE", "on").lower() != "off"
+
+# 编译结果的格式版本，结构变化时递增使旧缓存失效
+COMPILED_VERSION = 1
+
+# 城市优先级权重：high=5, medium=3, low=1（没有优先级的城市不参与随机选择）
+PRIORITY_WEIGHTS = {"high": 5, "medium": 3, "low": 1}
+
+# 没有 topics 的城市使用的通用主题
+DEFAULT_TOPIC = {"type": "general", "name": "旅游攻略"}
+
+# Step 3 按话题类型生成对应攻略的类型及说明（其他类型按景点攻略生成）
+TOPIC_TYPE_NAMES = {
+    'food': '美食',
+    'hotel': '住宿',
+    'activity': '活动/体验',
+    'landmark': '景点'
+}
+
+# cities.yaml 中允许的主题类型：Step 3 支持的类型 + 只影响搜索关键词的 drink/general
+TOPIC_TYPES = tuple(TOPIC_TYPE_NAMES) + ("drink", "general")
+KEYWORD_FIELDS = ("landmarks", "food", "drinks", "atmosphere")
+
+
+def build_search_keywords(city: str, topic_type: str, topic_name: str) -> List[str]:
+    """根据主题类型构建小红书搜索关键词"""
+    if topic_type == 'landmark':
+        # 景点类：强调攻略、打卡、游玩
+        return [
+            f"{city}{topic_name}攻略",
+            f"{city}{topic_name}游玩",
+            f"{topic_name}打卡"
+        ]
+    if topic_type == 'food':
+        # 美食类：强调推荐、探店、好吃
+        return [
+            f"{city}{topic_name}推荐",
+            f"{city}{topic_name}探店",
+            f"{city}好吃的{topic_name}"
+        ]
+    if topic_type == 'drink':
+        # 饮品类：强调探店、推荐、咖啡馆/茶馆
+        return [
+            f"{city}{topic_name}探店",
+            f"{city}{topic_name}推荐",
+            f"{city}{topic_name}店"
+        ]
+    # 通用类：保持原有的旅游攻略关键词
+    return [
+        f"{city}旅游攻略",
+        f"{city}一日游",
+        f"{city}必去景点"
+    ]
+
+
+class CitiesConfig:
+    """编译后的城市配置"""
+    
+    __slots__ = ("cities", "by_name", "weighted", "search_keywords")
+    
+    def __init__(self, cities: List[dict]):
+        self.cities = cities
+        self.by_name = {c['name']: c for c in cities}
+        
+        # 与逐个优先级拼接列表的顺序一致（high×5 + medium×3 + low×1），
+        # 同一个随机状态下 random.choice 选中的城市不变
+        self.weighted = tuple(
+            c
+            for priority, weight in PRIORITY_WEIGHTS.items()
+            for c in [c for c in cities if c.get('priority') == priority] * weight
+        )
+        
+        self.search_keywords: Dict[Tuple[str, str, str], List[str]] = {}
+        for c in cities:
+            for topic in c.get('topics') or [DEFAULT_TOPIC]:
+                key = (c['name'], topic['type'], topic['name'])
+                self.search_keywords[key] = build_search_keywords(*key)
+    
+    def city(self, name: str) -> dict:
+        """按名称取城市配置（找不到时使用第一个城市）"""
+        return self.by_name.get(name, self.cities[0])
+    
+    def pick_weighted(self) -> dict:
+        """按优先级加权随机选择城市"""
+        return random.choice(self.weighted)
+    
+    def keywords_for(self, city: str, topic_type: str, topic_name: str) -> List[str]:
+        """主题的搜索关键词（配置里没有的主题现场构建）"""
+        keywords = self.search_keywords.get((city, topic_type, topic_name))
+        if keywords is None:
+            keywords = build_search_keywords(city, topic_type, topic_name)
+        return list(keywords)
+    
+    def __repr__(self):
+        return f"CitiesConfig({len(self.cities)} cities)"
+
+
+def _validate_cities(data, path: Path) -> List[dict]:
+    if not isinstance(data, dict) or not isinstance(data.get('cities'), list) or not data['cities']:
+        raise ValueError(f"{path.name}: 缺少 cities 列表")
+    
+    for i, c in enumerate(data['cities']):
+        where = f"{path.name}: 第{i + 1}个城市"
+        if not isinstance(c, dict) or not isinstance(c.get('name'), str) or not c['name']:
+            raise ValueError(f"{where} 缺少 name")
+        where = f"{path.name}: {c['name']}"
+        
+        keywords = c.get('keywords')
+        if not isinstance(keywords, dict):
+            raise ValueError(f"{where} 缺少 keywords")
+        for field in KEYWORD_FIELDS:
+            if not isinstance(keywords.get(field, []), list):
+                raise ValueError(f"{where} 的 keywords.{field} 必须是列表")
+        
+        priority = c.get('priority')
+        if priority is not None and priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"{where} 的 priority 必须是 {'/'.join(PRIORITY_WEIGHTS)}，实际为 {priority!r}")
+        
+        topics = c.get('topics') or []
+        if not isinstance(topics, list):
+            raise ValueError(f"{where} 的 topics 必须是列表")
+        # 单个主题格式错误时跳过该主题，不影响整个配置
+        valid_topics = []
+        for topic in topics:
+            if not isinstance(topic, dict) or not topic.get('name') or topic.get('type') not in TOPIC_TYPES:
+                logger.warning(f"⚠️  {where} 的主题格式错误，已跳过（需要 name 和 type: {'/'.join(TOPIC_TYPES)}）: {topic!r}")
+                continue
+            valid_topics.append(topic)
+        if 'topics' in c:
+            c['topics'] = valid_topics
+    
+    return data['cities']
+
+
+def _validate_text_topics(data, path: Path) -> List[dict]:
+    if not isinstance(data, dict) or not isinstance(data.get('topics'), list):
+        raise ValueError(f"{path.name}: 缺少 topics 列表")
+    
+    for i, topic in enumerate(data['topics']):
+        if not isinstance(topic, dict) or not isinstance(topic.get('text'), str) or not topic['text']:
+            raise ValueError(f"{path.name}: 第{i + 1}个话题缺少 text")
+        if not isinstance(topic.get('tags', []), list):
+            raise ValueError(f"{path.name}: 话题 {topic['text']} 的 tags 必须是列表")
+    
+    return data['topics']
+
+
+def _compile_cities(path: Path) -> CitiesConfig:
+    return CitiesConfig(_validate_cities(_parse_yaml(path), path))
+
+
+def _compile_text_topics(path: Path) -> List[dict]:
+    return _validate_text_topics(_parse_yaml(path), path)
+
+
+def _parse_yaml(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+class _CompiledConfig:
+    """
+    单个配置文件的编译结果
+    
+    源文件的修改时间或大小变化后重新编译（常驻进程里修改配置无需重启）。
+    """
+    
+    def __init__(self, name: str, path: Path, compile_func):
+        self.name = name
+        self.path = path
+        self.compile_func = compile_func
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._value = None
+    
+    def _cache_path(self) -> Path:
+        cache_dir = Path(os.getenv("CONFIG_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        return cache_dir / f"{self.name}.pickle"
+    
+    def get(self):
+        st = os.stat(self.path)
+        stamp = (str(self.path), st.st_mtime_ns, st.st_size, COMPILED_VERSION)
+        
+        with self._lock:
+            if stamp != self._stamp:
+                self._value = self._load(stamp)
+                self._stamp = stamp
+            return self._value
+    
+    def _load(self, stamp):
+        cache_path = self._cache_path()
+        if CONFIG_CACHE:
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get("stamp") == stamp:
+                    logger.debug(f"使用编译缓存: {cache_path}")
+                    return cached["value"]
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.debug(f"编译缓存不可用（{e}），重新解析 {self.path.name}")
+        
+        value = self.compile_func(self.path)
+        logger.debug(f"已解析 {self.path.name}（{YAML_LOADER}）")
+        
+        if CONFIG_CACHE:
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump({"stamp": stamp, "value": value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logger.warning(f"写入配置编译缓存失败: {e}")
+        
+        return value
+
+
+_cities = _CompiledConfig("cities", CITIES_PATH, _compile_cities)
+_text_topics = _CompiledConfig("text_topics", TEXT_TOPICS_PATH, _compile_text_topics)
+
+
+def load_cities() -> CitiesConfig:
+    """城市配置（config/cities.yaml）"""
+    return _cities.get()
+
+
+def load_text_topics() -> List[dict]:
+    """文字卡片话题库（config/text_topics.yaml）"""
+    return _text_topics.get()
+
+
+def search_keywords(city: str, topic_type: str, topic_name: str,
+                    config: Optional[CitiesConfig] = None) -> List[str]:
+    """
+    主题的搜索关键词
+    
+    城市配置里的主题使用预先构建的列表；城市配置无法加载时现场构建。
+    """
+    if config is None:
+        try:
+            config = load_cities()
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            logger.debug(f"城市配置不可用（{e}），直接构建搜索关键词")
+            return build_search_keywords(city, topic_type, topic_name)
+    return config.keywords_for(city, topic_type, topic_name)
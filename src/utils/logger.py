@@ -4,7 +4,11 @@
 使用loguru实现结构化日志
 """
 
+import os
 import sys
+import reprlib
+import zipfile
+import threading
 from pathlib import Path
 from loguru import logger as _logger
 
@@ -26,15 +30,32 @@ if not log_dir.exists():
     log_dir = Path(__file__).parent.parent.parent / "logs"
     log_dir.mkdir(exist_ok=True)
 
+
+def _compress_in_background(path):
+    """滚动下来的日志文件在后台线程中压缩（不阻塞日志写入）"""
+    threading.Thread(target=_zip_log, args=(path,), name="log-compress").start()
+
+
+def _zip_log(path):
+    try:
+        with zipfile.ZipFile(f"{path}.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(path, os.path.basename(path))
+        os.remove(path)
+    except OSError as e:
+        print(f"压缩日志失败: {path}: {e}", file=sys.stderr)
+
+
+# enqueue：日志由后台线程写入文件，调用方不等待磁盘IO
 _logger.add(
     log_dir / "xhs_bot_{time:YYYY-MM-DD}.log",
     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} - {message}",
     level="DEBUG",
     rotation="00:00",  # 每天午夜滚动
     retention="30 days",  # 保留30天
-    compression="zip",  # 压缩旧日志
+    compression=_compress_in_background,  # 压缩旧日志
     serialize=False,  # 使用文本格式（更易读）
-    encoding="utf-8"
+    encoding="utf-8",
+    enqueue=True
 )
 
 # 导出logger
@@ -53,3 +74,81 @@ def mask_sensitive(data):
         return masked
     return data
 
+
+class _Truncated(Exception):
+    """预览已达到长度上限"""
+
+
+class _PayloadPreview:
+    """payload 的截断预览，转成字符串时才生成"""
+    
+    __slots__ = ("payload", "limit")
+    
+    def __init__(self, payload, limit: int):
+        self.payload = payload
+        self.limit = limit
+    
+    def __str__(self):
+        writer = _PreviewWriter(self.limit)
+        try:
+            writer.render(self.payload)
+        except _Truncated:
+            writer.parts.append("…")
+        return "".join(writer.parts)
+
+
+class _PreviewWriter:
+    """按 str() 的格式逐段输出，超过长度上限时抛出 _Truncated"""
+    
+    def __init__(self, limit: int):
+        self.parts = []
+        self.remaining = limit
+        # 其他类型的对象用 reprlib 截断（避免 repr 出整个大对象）
+        self._repr = reprlib.Repr()
+    
+    def emit(self, text: str):
+        if len(text) > self.remaining:
+            self.parts.append(text[:self.remaining])
+            raise _Truncated
+        self.parts.append(text)
+        self.remaining -= len(text)
+    
+    def render(self, obj):
+        if isinstance(obj, dict):
+            self.emit("{")
+            for i, (key, value) in enumerate(obj.items()):
+                if i:
+                    self.emit(", ")
+                self.render(key)
+                self.emit(": ")
+                self.render(value)
+            self.emit("}")
+        elif isinstance(obj, (list, tuple)):
+            self.emit("[" if isinstance(obj, list) else "(")
+            for i, item in enumerate(obj):
+                if i:
+                    self.emit(", ")
+                self.render(item)
+            if isinstance(obj, tuple) and len(obj) == 1:
+                self.emit(",")
+            self.emit("]" if isinstance(obj, list) else ")")
+        elif isinstance(obj, str):
+            # 只转义用得到的部分
+            self.emit(repr(obj[:self.remaining + 1]))
+        elif isinstance(obj, (int, float, bool)) or obj is None:
+            self.emit(repr(obj))
+        else:
+            self._repr.maxother = max(self.remaining, 20)
+            self.emit(self._repr.repr(obj))
+
+
+def payload_preview(payload, limit: int = 1000):
+    """
+    大段返回内容的日志预览（最多 limit 个字符）
+    
+    只在日志真正输出时才生成，且不会先把整个对象转成字符串再截取：
+        logger.debug("MCP返回: {}", payload_preview(result, 1000))
+    
+    注意不要用 f-string，否则在判断日志级别之前就会生成。
+    """
+    return _PayloadPreview(payload, limit)
@@ -6,7 +6,7 @@
 
 import random
 import hashlib
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import pytz
 
 
@@ -81,6 +81,32 @@ class RandomHelper:
         
         return random_time
     
+    @staticmethod
+    def next_publish_time(start_time, end_time, now=None):
+        """
+        下一次发布时间（常驻模式使用）
+        
+        今天的随机时间还没到时返回今天的，否则返回明天的。
+        
+        Args:
+            start_time: 开始时间字符串，如 "09:00"
+            end_time: 结束时间字符串，如 "11:00"
+            now: 当前时间（带时区），默认为现在
+        
+        Returns:
+            datetime对象（Asia/Shanghai）
+        """
+        tz = pytz.timezone('Asia/Shanghai')
+        now = (now or datetime.now(tz)).astimezone(tz)
+        
+        target_time = RandomHelper.get_random_time_in_window(start_time, end_time, now.date())
+        if target_time <= now:
+            target_time = RandomHelper.get_random_time_in_window(
+                start_time, end_time, now.date() + timedelta(days=1)
+            )
+        
+        return target_time
+    
     @staticmethod
     def should_run_now(start_time, end_time):
         """
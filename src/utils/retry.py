@@ -4,14 +4,15 @@
 使用tenacity实现自动重试
 """
 
+import sys
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type
+    retry_if_exception
 )
-import requests
 from .logger import logger
+from .tracing import current_span
 
 
 def retry_on_failure(max_attempts=3, backoff_min=2, backoff_max=10):
@@ -31,18 +32,30 @@ def retry_on_failure(max_attempts=3, backoff_min=2, backoff_max=10):
     return retry(
         stop=stop_after_attempt(max_attempts),
         wait=wait_exponential(multiplier=1, min=backoff_min, max=backoff_max),
-        retry=retry_if_exception_type((
-            requests.exceptions.RequestException,
-            TimeoutError,
-            ConnectionError
-        )),
-        before_sleep=lambda retry_state: logger.warning(
-            f"重试 {retry_state.attempt_number}/{max_attempts}..."
-        ),
+        retry=retry_if_exception(_is_network_error),
+        before_sleep=lambda retry_state: _before_retry(retry_state, max_attempts),
         reraise=True
     )
 
 
+def _is_network_error(e):
+    """
+    是否为网络错误（requests 异常、超时、连接错误）
+    
+    requests 导入较慢，这里不主动导入：没有导入过 requests 时不可能抛出它的异常。
+    """
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(e, requests.exceptions.RequestException)
+
+
+def _before_retry(retry_state, max_attempts):
+    """重试前记录日志，并计入当前追踪 span 的重试次数"""
+    logger.warning(f"重试 {retry_state.attempt_number}/{max_attempts}...")
+    current_span().add("retries")
+
+
 def retry_on_network_error(func):
     """网络错误重试装饰器（快捷方式）"""
     return retry_on_failure(max_attempts=3, backoff_min=2, backoff_max=10)(func)
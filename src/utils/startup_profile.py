@@ -0,0 +1,118 @@
+"""
+启动耗时分析
+
+在子进程中以 `python -X importtime src/scheduler_v2.py --help` 冷启动调度器
+（导入全部模块、进入 main() 解析参数后退出），统计总耗时和各模块的导入耗时。
+"""
+
+import os
+import sys
+import time
+import subprocess
+from pathlib import Path
+from typing import List
+
+SCHEDULER_PATH = Path(__file__).parent.parent / "scheduler_v2.py"
+
+# 导入耗时较长、只应在第一次使用时导入的依赖（启动阶段不应出现）
+HEAVY_MODULES = ("openai", "langchain_mcp_adapters", "mcp", "aiohttp", "requests", "numpy", "imagehash")
+
+
+class ImportRecord:
+    """一个模块的导入耗时（微秒）"""
+    
+    __slots__ = ("name", "self_us", "cumulative_us", "depth")
+    
+    def __init__(self, name: str, self_us: int, cumulative_us: int, depth: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+    
+    @property
+    def package(self) -> str:
+        return self.name.split(".")[0]
+    
+    def __repr__(self):
+        return f"ImportRecord({self.name!r}, {self.cumulative_us}us)"
+
+
+class StartupProfile:
+    """一次冷启动的结果"""
+    
+    def __init__(self, wall_seconds: float, records: List[ImportRecord], returncode: int):
+        self.wall_seconds = wall_seconds
+        self.records = records
+        self.returncode = returncode
+    
+    @property
+    def modules(self) -> set:
+        return {r.name for r in self.records}
+    
+    def heavy_imports(self) -> List[str]:
+        """启动阶段导入了的重依赖"""
+        return [name for name in HEAVY_MODULES if name in self.modules]
+    
+    def import_seconds(self) -> float:
+        """顶层导入耗时之和"""
+        return sum(r.cumulative_us for r in self.records if r.depth == 0) / 1e6
+    
+    def by_package(self) -> List[tuple]:
+        """按顶层包汇总的导入耗时 [(包名, 微秒)]，从大到小"""
+        totals = {}
+        for r in self.records:
+            totals[r.package] = totals.get(r.package, 0) + r.self_us
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    
+    def format_report(self, top: int = 20) -> str:
+        lines = [
+            f"冷启动到 main(): {self.wall_seconds * 1000:.0f} ms（其中模块导入 {self.import_seconds() * 1000:.0f} ms）",
+            "",
+            f"按包汇总（前{top}）:",
+        ]
+        for package, us in self.by_package()[:top]:
+            lines.append(f"  {us / 1000:>9.1f} ms  {package}")
+        
+        lines += ["", f"累计耗时最长的模块（前{top}，-X importtime 格式）:", "  self [us] | cumulative | imported package"]
+        for r in sorted(self.records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+            lines.append(f"  {r.self_us:>9} | {r.cumulative_us:>10} | {'  ' * r.depth}{r.name}")
+        
+        heavy = self.heavy_imports()
+        lines += ["", f"启动阶段导入的重依赖: {', '.join(heavy) if heavy else '无'}"]
+        return "\n".join(lines)
+
+
+def parse_importtime(text: str) -> List[ImportRecord]:
+    """解析 -X importtime 的输出"""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # 表头
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        records.append(ImportRecord(stripped, self_us, cumulative_us, depth))
+    return records
+
+
+def profile_startup(script: Path = SCHEDULER_PATH, timeout: float = 60) -> StartupProfile:
+    """在子进程中冷启动一次调度器并统计耗时"""
+    env = dict(os.environ)
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(script), "--help"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        timeout=timeout,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    
+    return StartupProfile(wall, parse_importtime(proc.stderr), proc.returncode)
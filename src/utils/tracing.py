@@ -0,0 +1,239 @@
+"""
+运行追踪
+
+每次调度运行记录一棵嵌套的 span 树：各步骤、MCP工具调用、大模型请求、
+图片下载/编码、飞书调用，每个 span 记录耗时、字节数和重试次数，
+运行结束后写入 logs/trace_*.json。
+
+用法：
+    trace = start_trace("travel", city="成都")
+    with span("Step 1: 搜索小红书内容"):
+        ...
+    finish_trace(trace, status="success")
+
+没有正在进行的追踪时（单独调用某个步骤、工具脚本），span 不做任何记录。
+"""
+
+import os
+import json
+import time
+import inspect
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from .logger import logger, log_dir
+
+# 最多保留的追踪文件数
+MAX_TRACE_FILES = int(os.getenv("TRACE_KEEP", "200"))
+
+_current_span = contextvars.ContextVar("xhs_trace_span", default=None)
+
+# span 树会被多个线程（图片并行处理、Step 3 后台线程、异步运行时）同时修改
+_tree_lock = threading.Lock()
+
+
+class Span:
+    """一个计时区间"""
+    
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.children = []
+        self.error = None
+        self.start_time = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+    
+    def set(self, **attrs):
+        """设置属性（如 bytes、model、tokens）"""
+        with _tree_lock:
+            self.attrs.update(attrs)
+    
+    def add(self, key: str, amount=1):
+        """累加计数（如 retries）"""
+        with _tree_lock:
+            self.attrs[key] = self.attrs.get(key, 0) + amount
+    
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+    
+    def to_dict(self) -> dict:
+        data = {
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.start_time).isoformat(timespec="milliseconds"),
+            "duration_ms": round((self.duration if self.duration is not None else time.perf_counter() - self._start) * 1000, 1),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict() for child in self.children]
+        return data
+
+
+class _NullSpan:
+    """没有追踪时使用的空 span"""
+    
+    def set(self, **attrs):
+        pass
+    
+    def add(self, key: str, amount=1):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """一次运行的追踪"""
+    
+    def __init__(self, name: str, **attrs):
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.root = Span(name, attrs)
+        self._token = None
+    
+    def step_summary(self) -> str:
+        """各步骤耗时摘要，如 "Step 0 0.1s | Step 1 3.2s | ..." """
+        parts = []
+        with _tree_lock:
+            # 并行的步骤（Step 2 / Step 3）按名称排序
+            children = sorted(self.root.children, key=lambda child: child.name)
+        for child in children:
+            duration = child.duration if child.duration is not None else time.perf_counter() - child._start
+            label = child.name.split(":")[0]
+            parts.append(f"{label} {duration:.1f}s{'（失败）' if child.error else ''}")
+        return " | ".join(parts)
+    
+    def save(self, directory=None) -> Path:
+        """写入 JSON 文件"""
+        directory = Path(directory or log_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"trace_{self.run_id}.json"
+        
+        with _tree_lock:
+            data = {"run_id": self.run_id, **self.root.to_dict()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        
+        _prune_traces(directory)
+        return path
+
+
+def start_trace(name: str, **attrs) -> Trace:
+    """开始一次运行的追踪（当前上下文中的 span 都挂到这次追踪下）"""
+    trace = Trace(name, **attrs)
+    trace._token = _current_span.set(trace.root)
+    return trace
+
+
+def finish_trace(trace: Trace, **attrs):
+    """
+    结束追踪并写入文件（写入失败只记录警告）
+    
+    Returns:
+        追踪文件路径（写入失败时为None）
+    """
+    trace.root.finish()
+    trace.root.set(**attrs)
+    
+    try:
+        _current_span.reset(trace._token)
+    except ValueError:
+        # 在其他上下文中结束（不应发生），直接清空
+        _current_span.set(None)
+    
+    try:
+        path = trace.save()
+        logger.info(f"📊 运行追踪已保存: {path}（{trace.step_summary()}）")
+        return path
+    except Exception as e:
+        logger.warning(f"保存运行追踪失败: {e}")
+        return None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    记录一个子 span
+    
+    Example:
+        with span("image.download", url=url) as s:
+            data = download(url)
+            s.set(bytes=len(data))
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NULL_SPAN
+        return
+    
+    current = Span(name, attrs)
+    with _tree_lock:
+        parent.children.append(current)
+    
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+
+
+def current_span():
+    """当前 span（没有追踪时返回空 span）"""
+    return _current_span.get() or NULL_SPAN
+
+
+def traced(name: str):
+    """
+    把整个函数记录为一个 span 的装饰器（支持 async 函数）
+    
+    放在重试装饰器外层时，重试次数会记录在这个 span 上。
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    
+    return decorator
+
+
+def bind_context(func):
+    """
+    把当前追踪上下文绑定到函数上（提交给线程池前调用，线程中的 span 挂到当前 span 下）
+    
+    Example:
+        executor.submit(bind_context(download), url)
+    """
+    context = contextvars.copy_context()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return wrapper
+
+
+def _prune_traces(directory: Path):
+    """只保留最近 MAX_TRACE_FILES 个追踪文件"""
+    traces = sorted(directory.glob("trace_*.json"))
+    for path in traces[:-MAX_TRACE_FILES]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
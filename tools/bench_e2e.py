@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+端到端离线基准
+
+启动本地模拟服务（tools/fake_services.py），在独立子进程中多次完整运行
+run_normal_mode（旅游攻略模式 / 文字卡片模式），不访问任何线上账号。
+从每次运行的追踪文件（logs/trace_*.json）中读取各步骤耗时，输出：
+- 各步骤耗时 p50 / p95
+- 总耗时 p50 / p95
+- 峰值内存（RSS）和CPU时间
+
+每次运行都是新进程，包含导入依赖、建立MCP会话等冷启动开销，与定时任务一致。
+
+用法：
+    python3 tools/bench_e2e.py                        # 两种模式各跑5次，延迟按线上的1/10缩放
+    python3 tools/bench_e2e.py --runs 20 --mode travel
+    python3 tools/bench_e2e.py --latency-scale 1.0    # 接近线上的延迟
+    python3 tools/bench_e2e.py --latency llm=3,0.5    # 单独调整某个接口
+    python3 tools/bench_e2e.py --json result.json     # 同时保存原始数据
+    python3 tools/bench_e2e.py --replay logs/cassettes/xxx.zip   # 回放录制的线上响应（不启动模拟服务）
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import zipfile
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from fake_services import DEFAULT_MCP_PORT, DEFAULT_HTTP_PORT, service_env  # noqa: E402
+
+MODES = ["travel", "text_card"]
+
+
+def percentile(values, pct):
+    """线性插值百分位数"""
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    k = (len(values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def wait_for_port(port, timeout=60):
+    """等待端口可连接"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"模拟服务启动超时（端口 {port}）")
+
+
+def start_fake_services(args):
+    """在独立进程中启动模拟服务（它的CPU和内存不计入机器人）"""
+    cmd = [
+        sys.executable, os.path.join(project_root, "tools", "fake_services.py"),
+        "--mcp-port", str(args.mcp_port),
+        "--http-port", str(args.http_port),
+        "--latency-scale", str(args.latency_scale),
+    ]
+    for value in args.latency or []:
+        cmd += ["--latency", value]
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        wait_for_port(args.mcp_port)
+        wait_for_port(args.http_port)
+    except SystemExit:
+        proc.kill()
+        print(proc.stderr.read(), file=sys.stderr)
+        raise
+    return proc
+
+
+def cassette_mode(path):
+    """cassette 录制时运行的模式"""
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+    mode = manifest.get("meta", {}).get("mode")
+    if mode not in MODES:
+        raise SystemExit(f"cassette 中没有记录运行模式: {path}")
+    return mode
+
+
+def run_worker(mode, output_path):
+    """子进程：完整运行一次，把各步骤耗时和资源占用写入 output_path"""
+    from src.scheduler_v2 import run_normal_mode
+    from src.services.xhs_mcp_client import shutdown_runtime
+    from src.services.http_session import close_sessions
+    from src.utils.logger import log_dir
+
+    start = time.perf_counter()
+    try:
+        run_normal_mode(mode=mode)
+    finally:
+        shutdown_runtime()
+        close_sessions()
+    wall = time.perf_counter() - start
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    peak_rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+
+    # 本进程写出的追踪文件（文件名以进程号结尾）
+    traces = sorted(log_dir.glob(f"trace_*_{os.getpid()}.json"))
+    if not traces:
+        raise SystemExit("未找到本次运行的追踪文件")
+    with open(traces[-1], encoding="utf-8") as f:
+        trace = json.load(f)
+    os.remove(traces[-1])
+
+    steps = {child["name"]: child["duration_ms"] / 1000 for child in trace.get("children", [])}
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "mode": mode,
+            "status": trace.get("attrs", {}).get("status"),
+            "total": trace["duration_ms"] / 1000,
+            "wall": wall,
+            "steps": steps,
+            "peak_rss_mb": peak_rss,
+            "cpu_s": usage.ru_utime + usage.ru_stime,
+        }, f, ensure_ascii=False)
+
+
+def run_benchmark(args):
+    """启动模拟服务（回放时不启动），按模式多次运行子进程"""
+    services = None if args.replay else start_fake_services(args)
+    rows = []
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.update(service_env(args.mcp_port, args.http_port))
+            env["IMAGE_CACHE"] = "on" if args.cache else "off"
+            env["IMAGE_CACHE_DIR"] = os.path.join(tmp, "cache")
+            env["LLM_CACHE"] = "on" if args.cache else "off"
+            env["LLM_CACHE_DIR"] = os.path.join(tmp, "llm_cache")
+
+            if args.replay:
+                env["XHS_CASSETTE_MODE"] = "replay"
+                env["XHS_CASSETTE"] = os.path.abspath(args.replay)
+                env["XHS_CASSETTE_LATENCY"] = str(args.replay_latency)
+                modes = [cassette_mode(args.replay)]
+            else:
+                modes = MODES if args.mode == "both" else [args.mode]
+            for mode in modes:
+                for i in range(args.runs):
+                    output_path = os.path.join(tmp, f"{mode}_{i}.json")
+                    # 每次运行使用新的已发布哈希索引，测试图片不会被判定为已发布
+                    env["IMAGE_DEDUP_INDEX"] = os.path.join(tmp, f"published_{mode}_{i}.json")
+
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--worker", mode, output_path],
+                        cwd=project_root,
+                        env=env,
+                        capture_output=True,
+                        text=True
+                    )
+                    if proc.returncode != 0 or not os.path.exists(output_path):
+                        print(proc.stdout[-3000:], file=sys.stderr)
+                        print(proc.stderr[-3000:], file=sys.stderr)
+                        raise SystemExit(f"基准子进程失败: {mode} 第{i + 1}次")
+
+                    with open(output_path, encoding="utf-8") as f:
+                        row = json.load(f)
+                    rows.append(row)
+                    print(f"  {mode} 第{i + 1}/{args.runs}次: {row['total']:.2f}s（{row['status']}）", flush=True)
+    finally:
+        if services is not None:
+            services.terminate()
+            services.wait(timeout=10)
+
+    return rows
+
+
+def print_report(rows):
+    """按模式打印各步骤 p50 / p95"""
+    for mode in MODES:
+        mode_rows = [r for r in rows if r["mode"] == mode]
+        if not mode_rows:
+            continue
+
+        failed = len([r for r in mode_rows if r["status"] != "success"])
+        print()
+        print(f"== {mode}（{len(mode_rows)} 次，失败 {failed} 次）==")
+        print(f"{'步骤':<32}{'p50(s)':>10}{'p95(s)':>10}")
+        print("-" * 52)
+
+        step_names = sorted({name for r in mode_rows for name in r["steps"]})
+        for name in step_names:
+            values = [r["steps"][name] for r in mode_rows if name in r["steps"]]
+            print(f"{name:<32}{percentile(values, 50):>10.2f}{percentile(values, 95):>10.2f}")
+
+        totals = [r["total"] for r in mode_rows]
+        print("-" * 52)
+        print(f"{'总耗时':<32}{percentile(totals, 50):>10.2f}{percentile(totals, 95):>10.2f}")
+
+        rss = [r["peak_rss_mb"] for r in mode_rows]
+        cpu = [r["cpu_s"] for r in mode_rows]
+        print(f"峰值RSS  p50 {percentile(rss, 50):.1f} MB，最大 {max(rss):.1f} MB")
+        print(f"CPU时间  p50 {percentile(cpu, 50):.2f} s，p95 {percentile(cpu, 95):.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端离线基准（本地模拟MCP / 大模型 / 飞书 / 图片CDN）")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式运行次数")
+    parser.add_argument("--mode", choices=MODES + ["both"], default="both")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="模拟延迟相对线上的缩放系数")
+    parser.add_argument("--latency", action="append", metavar="NAME=MEDIAN,SIGMA", help="覆盖某个接口的延迟分布（线上量级，秒）")
+    parser.add_argument("--cache", action="store_true", help="启用图片缓存和AI文案缓存（默认关闭，每次都重新下载、重新生成）")
+    parser.add_argument("--mcp-port", type=int, default=DEFAULT_MCP_PORT)
+    parser.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    parser.add_argument("--json", type=str, help="保存原始结果的JSON文件")
+    parser.add_argument("--replay", type=str, metavar="CASSETTE", help="回放录制的cassette（XHS_CASSETTE_MODE=record 时生成）")
+    parser.add_argument("--replay-latency", type=float, default=0.0, help="回放时按录制耗时等待的比例（默认0：全速）")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    print("回放cassette并开始基准测试..." if args.replay else "启动模拟服务并开始基准测试...")
+    rows = run_benchmark(args)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\n原始结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
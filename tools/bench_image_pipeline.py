@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+图片处理性能基准
+
+对比完整解码（draft_decode=False）和 draft/reduce 预缩放（draft_decode=True）
+两种处理方式，输出每张图片的平均耗时和峰值内存（RSS）。
+
+每张图片、每种方式都在独立子进程中运行，峰值内存互不影响。
+
+用法：
+    python3 tools/bench_image_pipeline.py                 # 使用自动生成的 3000~6000px 测试图
+    python3 tools/bench_image_pipeline.py --images dir/   # 使用目录中的真实图片
+    python3 tools/bench_image_pipeline.py --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 自动生成的测试图尺寸（小红书原图常见 3000~4000px）
+FIXTURE_SIZES = [(1080, 1440), (3000, 4000), (4000, 3000), (4500, 6000)]
+
+MODES = {
+    "full": False,   # 完整解码后 LANCZOS 缩放
+    "draft": True,   # draft / reduce 预缩放后再 LANCZOS 缩放
+}
+
+
+def _read_proc_status(field):
+    """读取 /proc/self/status 中的内存字段（MB），非Linux返回None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """重置峰值RSS（Linux: 写 /proc/self/clear_refs），排除导入依赖时的内存峰值"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _current_rss_mb():
+    """当前RSS（MB）"""
+    rss = _read_proc_status("VmRSS")
+    return rss if rss is not None else _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    """峰值RSS（MB）"""
+    peak = _read_proc_status("VmHWM")
+    if peak is not None:
+        return peak
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def make_fixtures(output_dir):
+    """生成带渐变和噪点的测试JPEG（接近真实照片的压缩率）"""
+    from PIL import Image, ImageFilter
+
+    paths = []
+    for width, height in FIXTURE_SIZES:
+        noise = Image.effect_noise((width // 4, height // 4), 64).convert("RGB")
+        gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        img = Image.blend(gradient, noise.resize((width, height)), 0.5)
+        img = img.filter(ImageFilter.DETAIL)
+
+        path = os.path.join(output_dir, f"fixture_{width}x{height}.jpg")
+        img.save(path, "JPEG", quality=92)
+        paths.append(path)
+
+    return paths
+
+
+def run_worker(mode, image_path, repeat):
+    """子进程：处理同一张图片 repeat 次，输出JSON结果"""
+    from src.services.image_downloader import ImageDownloader
+
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        downloader = ImageDownloader(output_dir=tmp, draft_decode=MODES[mode])
+
+        _reset_peak_rss()
+        baseline_rss = _current_rss_mb()
+        timings = []
+        output_size = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = downloader.process_image_bytes(data)
+            timings.append(time.perf_counter() - start)
+            output_size = len(output)
+
+    print(json.dumps({
+        "mode": mode,
+        "image": os.path.basename(image_path),
+        "avg_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+        "output_kb": output_size / 1024,
+    }))
+
+
+def run_benchmark(image_paths, repeat):
+    """为每张图片、每种模式启动子进程，汇总结果"""
+    rows = []
+    for image_path in image_paths:
+        for mode in MODES:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode, image_path, "--repeat", str(repeat)],
+                capture_output=True,
+                text=True
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                raise SystemExit(f"基准子进程失败: {mode} {image_path}")
+            rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    return rows
+
+
+def print_report(rows):
+    """打印对比表"""
+    print(f"{'图片':<28}{'模式':<8}{'平均耗时(ms)':>14}{'最快(ms)':>12}{'峰值RSS(MB)':>14}{'增量RSS(MB)':>14}{'输出(KB)':>12}")
+    print("-" * 102)
+    for row in rows:
+        print(
+            f"{row['image']:<28}{row['mode']:<8}"
+            f"{row['avg_ms']:>14.1f}{row['min_ms']:>12.1f}"
+            f"{row['peak_rss_mb']:>14.1f}{row['peak_rss_mb'] - row['baseline_rss_mb']:>14.1f}"
+            f"{row['output_kb']:>12.1f}"
+        )
+
+    # 按模式汇总
+    print()
+    for mode in MODES:
+        mode_rows = [r for r in rows if r["mode"] == mode]
+        if not mode_rows:
+            continue
+        avg_ms = sum(r["avg_ms"] for r in mode_rows) / len(mode_rows)
+        max_rss = max(r["peak_rss_mb"] for r in mode_rows)
+        print(f"{mode:<8} 平均耗时 {avg_ms:.1f} ms/张，最大峰值RSS {max_rss:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片处理性能基准（完整解码 vs draft预缩放）")
+    parser.add_argument("--images", type=str, help="图片目录（默认自动生成测试图）")
+    parser.add_argument("--repeat", type=int, default=3, help="每张图片重复处理次数")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "IMAGE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.repeat)
+        return
+
+    if args.images:
+        image_paths = sorted(
+            os.path.join(args.images, name)
+            for name in os.listdir(args.images)
+            if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+        )
+        print_report(run_benchmark(image_paths, args.repeat))
+    else:
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            print("生成测试图片...")
+            image_paths = make_fixtures(fixture_dir)
+            print_report(run_benchmark(image_paths, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
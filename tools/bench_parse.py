@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+MCP返回内容解析基准
+
+测量 src/services/xhs_payloads.py 解析 search_feeds / get_feed_detail 返回值的耗时，
+按帖子数折算为每个帖子的解析开销，分别使用标准库 json 和 orjson（已安装时）。
+
+用法：
+    python3 tools/bench_parse.py                                   # 使用自动生成的返回值（与模拟服务格式一致）
+    python3 tools/bench_parse.py --cassette logs/cassettes/xxx.zip # 使用录制的线上返回值
+    python3 tools/bench_parse.py --repeat 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.services import xhs_payloads  # noqa: E402
+
+# 自动生成的返回值：每次搜索的帖子数、每个帖子的图片数（与线上相近）
+FEEDS_PER_SEARCH = 20
+IMAGES_PER_NOTE = 9
+
+
+def make_payloads(searches=5, details=20):
+    """生成 MCP 文本块格式的返回值"""
+    search_payloads = []
+    for s in range(searches):
+        feeds = [
+            {
+                "id": f"{s * FEEDS_PER_SEARCH + i:024x}",
+                "xsecToken": f"ABxsec{s}{i}" * 4,
+                "modelType": "note",
+                "noteCard": {"displayTitle": f"宝藏路线分享{i}", "user": {"nickname": "旅行博主", "userId": f"u{i}"},
+                             "interactInfo": {"likedCount": str(i * 37)}},
+            }
+            for i in range(FEEDS_PER_SEARCH)
+        ]
+        text = json.dumps({"feeds": feeds, "count": len(feeds)}, ensure_ascii=False)
+        search_payloads.append([{"type": "text", "text": text, "id": f"lc_{s}"}])
+
+    detail_payloads = []
+    for d in range(details):
+        image_list = [
+            {
+                "urlDefault": f"https://sns-webpic-qc.xhscdn.com/{d:04d}/{i:02d}!nd_dft_wlteh_webp_3",
+                "urlPre": f"https://sns-webpic-qc.xhscdn.com/{d:04d}/{i:02d}!nd_prv_wlteh_webp_3",
+                "width": 1080 + i * 10,
+                "height": 1440,
+                "livePhoto": False,
+            }
+            for i in range(IMAGES_PER_NOTE)
+        ]
+        note = {
+            "noteId": f"{d:024x}",
+            "title": f"周末city walk路线{d}",
+            "desc": "周末去逛了一圈，人不多，拍照很出片。" * 8 + " #旅游攻略[话题]# #citywalk[话题]# #周末去哪儿[话题]#",
+            "imageList": image_list,
+            "user": {"nickname": "旅行博主", "userId": "u1"},
+            "interactInfo": {"likedCount": "1024", "collectedCount": "512", "commentCount": "64"},
+        }
+        text = json.dumps({"data": {"note": note, "comments": {"list": [], "cursor": ""}}}, ensure_ascii=False)
+        detail_payloads.append([{"type": "text", "text": text, "id": f"lc_d{d}"}])
+
+    return search_payloads, detail_payloads
+
+
+def load_cassette_payloads(path):
+    """从 cassette 读取录制的返回值"""
+    from src.services.cassette import Cassette, MODE_REPLAY
+
+    cassette = Cassette(path, MODE_REPLAY)
+    search_payloads = [payload for _, payload in cassette.iter_payloads("mcp", "search_feeds")]
+    detail_payloads = [payload for _, payload in cassette.iter_payloads("mcp", "get_feed_detail")]
+    return search_payloads, detail_payloads
+
+
+def measure(func, payloads, repeat):
+    """
+    Returns:
+        (每次解析的平均耗时（秒）, 解析出的帖子总数)
+    """
+    feeds = sum(func(payload) for payload in payloads)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in payloads:
+            func(payload)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(payloads)), feeds
+
+
+def run_benchmark(search_payloads, detail_payloads, repeat):
+    backends = {"json": json.loads}
+    try:
+        import orjson
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        print("未安装 orjson，只测试标准库 json")
+
+    cases = {
+        "search_feeds": (lambda payload: len(xhs_payloads.parse_search_result(payload, 100)), search_payloads),
+        "get_feed_detail": (lambda payload: 1 if xhs_payloads.parse_feed_detail(payload).image_refs else 0, detail_payloads),
+    }
+
+    results = []
+    default_loads = xhs_payloads._loads
+    try:
+        for backend, loads in backends.items():
+            # 切换解析模块使用的解码函数
+            xhs_payloads._loads = loads
+            for name, (func, payloads) in cases.items():
+                if not payloads:
+                    continue
+                per_call, feeds = measure(func, payloads, repeat)
+                per_feed = per_call * len(payloads) / feeds if feeds else float("nan")
+                results.append((backend, name, len(payloads), feeds, per_call, per_feed))
+    finally:
+        xhs_payloads._loads = default_loads
+
+    return results
+
+
+def print_report(results):
+    print()
+    print(f"{'解码':<8}{'工具':<18}{'返回值数':>8}{'帖子数':>8}{'每次(μs)':>12}{'每个帖子(μs)':>16}")
+    for backend, name, calls, feeds, per_call, per_feed in results:
+        print(f"{backend:<8}{name:<18}{calls:>8}{feeds:>8}{per_call * 1e6:>12.1f}{per_feed * 1e6:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP返回内容解析基准")
+    parser.add_argument("--cassette", type=str, help="录制的 cassette 文件（默认使用自动生成的返回值）")
+    parser.add_argument("--repeat", type=int, default=500, help="每个返回值重复解析次数")
+    args = parser.parse_args()
+
+    if args.cassette:
+        search_payloads, detail_payloads = load_cassette_payloads(args.cassette)
+        print(f"cassette: {len(search_payloads)} 个搜索结果，{len(detail_payloads)} 个帖子详情")
+    else:
+        search_payloads, detail_payloads = make_payloads()
+
+    print_report(run_benchmark(search_payloads, detail_payloads, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
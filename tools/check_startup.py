@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+冷启动耗时检查
+
+多次冷启动调度器（`python -X importtime src/scheduler_v2.py --help`，进入 main() 解析参数后退出），
+取中位数与预算比较；同时检查启动阶段没有导入 openai、langchain_mcp_adapters、numpy 等重依赖。
+超出预算或导入了重依赖时退出码为 1，可放在部署脚本或 CI 中防止启动变慢。
+
+用法：
+    python3 tools/check_startup.py                  # 默认预算 800ms（或 STARTUP_BUDGET_MS）
+    python3 tools/check_startup.py --budget-ms 500 --runs 7
+    python3 tools/check_startup.py --report         # 同时打印各模块导入耗时
+"""
+
+import os
+import sys
+import argparse
+import statistics
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.utils.startup_profile import profile_startup  # noqa: E402
+
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "800"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时检查")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="冷启动到 main() 的耗时预算（毫秒）")
+    parser.add_argument("--runs", type=int, default=5, help="冷启动次数（取中位数）")
+    parser.add_argument("--report", action="store_true", help="打印中位数那次的各模块导入耗时")
+    args = parser.parse_args()
+
+    # 第一次启动会编译 .pyc，不计入结果
+    warmup = profile_startup()
+    if warmup.returncode != 0:
+        print(f"❌ 调度器启动失败（退出码 {warmup.returncode}）")
+        sys.exit(1)
+
+    profiles = sorted((profile_startup() for _ in range(args.runs)), key=lambda p: p.wall_seconds)
+    median = profiles[len(profiles) // 2]
+    median_ms = statistics.median(p.wall_seconds for p in profiles) * 1000
+
+    if args.report:
+        print(median.format_report())
+        print()
+
+    print(f"冷启动到 main(): 中位数 {median_ms:.0f} ms，最快 {profiles[0].wall_seconds * 1000:.0f} ms，"
+          f"最慢 {profiles[-1].wall_seconds * 1000:.0f} ms（{args.runs} 次，预算 {args.budget_ms:.0f} ms）")
+
+    failed = False
+    heavy = sorted({name for p in profiles for name in p.heavy_imports()})
+    if heavy:
+        print(f"❌ 启动阶段导入了重依赖: {', '.join(heavy)}（应在第一次使用时再导入）")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"❌ 超出预算 {median_ms - args.budget_ms:.0f} ms")
+        failed = True
+
+    if failed:
+        if not args.report:
+            print()
+            print(median.format_report())
+        sys.exit(1)
+
+    print("✅ 启动耗时在预算内")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+本地模拟服务（离线基准测试用）
+
+在一个独立进程中启动：
+- 小红书MCP服务（FastMCP，streamable-http）：search_feeds / get_feed_detail /
+  publish_content / check_login_status / get_login_qrcode
+- HTTP 服务：
+    /v1/chat/completions      OpenAI 兼容接口（DeepSeek / 通义千问，支持 stream）
+    /open-apis/...            飞书开放平台（token、多维表格、图片上传）
+    /webhook                  飞书机器人 Webhook
+    /images/<name>            图片CDN（自动生成的测试JPEG及预览图）
+
+每个接口的延迟按对数正态分布采样（中位数 + sigma），可整体缩放，
+模拟真实服务的长尾延迟。
+
+用法：
+    python3 tools/fake_services.py                              # 默认端口 18160(MCP) / 18161(HTTP)
+    python3 tools/fake_services.py --latency-scale 1.0          # 接近线上的延迟
+    python3 tools/fake_services.py --latency llm=8,0.3 --latency get_feed_detail=1.5,0.5
+"""
+
+import json
+import math
+import random
+import asyncio
+import argparse
+from io import BytesIO
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+DEFAULT_MCP_PORT = 18160
+DEFAULT_HTTP_PORT = 18161
+
+# 各接口延迟（秒）：(中位数, 对数正态 sigma)，接近线上观测值
+DEFAULT_LATENCY = {
+    "search_feeds": (2.0, 0.4),
+    "get_feed_detail": (2.5, 0.4),
+    "publish_content": (10.0, 0.3),
+    "check_login_status": (0.5, 0.3),
+    "llm": (15.0, 0.3),
+    "feishu": (0.2, 0.4),
+    "image": (0.15, 0.6),
+}
+
+# 每次搜索返回的帖子数、每个帖子的图片数
+FEEDS_PER_SEARCH = 6
+IMAGES_PER_NOTE = 4
+
+# 测试图片：原图尺寸（预览图统一缩到短边 270px）
+FIXTURE_COUNT = 24
+FIXTURE_SIZES = [(1080, 1440), (1440, 1080), (1242, 1656), (3000, 4000)]
+PREVIEW_SHORT_SIDE = 270
+
+GUIDE_RESPONSE = {
+    "title": "周末city walk攻略，人少景美",
+    "content": "第一站先去老街吃早饭，再沿着河边走到博物馆。\n\n交通：地铁2号线直达。\n门票：免费，需提前预约。\n\n小贴士：下午四点后光线最好，适合拍照。",
+    "tags": ["#旅游攻略", "#citywalk", "#周末去哪儿", "#小众景点", "#拍照打卡"],
+}
+
+
+class LatencyProfile:
+    """接口延迟分布"""
+
+    def __init__(self, overrides=None, scale=1.0, seed=None):
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(overrides or {})
+        self.scale = scale
+        self._random = random.Random(seed)
+
+    def sample(self, name):
+        median, sigma = self.latency[name]
+        return median * self.scale * math.exp(self._random.gauss(0, sigma))
+
+    async def wait(self, name):
+        await asyncio.sleep(self.sample(name))
+
+
+def make_image_fixtures(count=FIXTURE_COUNT, seed=7):
+    """
+    生成测试图片（每张内容不同，避免被感知哈希去重）
+
+    Returns:
+        {文件名: JPEG数据}，包含原图 img_XX.jpg 和预览图 pre_XX.jpg
+    """
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    fixtures = {}
+    for i in range(count):
+        width, height = FIXTURE_SIZES[i % len(FIXTURE_SIZES)]
+        noise = Image.effect_noise((width // 8, height // 8), 48).convert("RGB").resize((width, height))
+        base = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(base)
+        for _ in range(12):
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            x1, y1 = x0 + rng.randrange(width // 2), y0 + rng.randrange(height // 2)
+            draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+        img = Image.blend(base, noise, 0.35).filter(ImageFilter.DETAIL)
+
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        fixtures[f"img_{i:02d}.jpg"] = buffer.getvalue()
+
+        scale = PREVIEW_SHORT_SIDE / min(width, height)
+        preview = img.resize((int(width * scale), int(height * scale)))
+        buffer = BytesIO()
+        preview.save(buffer, "JPEG", quality=75)
+        fixtures[f"pre_{i:02d}.jpg"] = buffer.getvalue()
+
+    return fixtures
+
+
+def build_mcp(profile, http_base, fixture_sizes, port):
+    """模拟小红书MCP服务"""
+    mcp = FastMCP("xiaohongshu-mcp-fake", host="127.0.0.1", port=port, log_level="WARNING")
+    counter = {"feed": 0}
+
+    @mcp.tool()
+    async def check_login_status() -> str:
+        """检查登录状态"""
+        await profile.wait("check_login_status")
+        return "✅ 已登录\n用户名: bench"
+
+    @mcp.tool()
+    async def get_login_qrcode() -> str:
+        """获取登录二维码"""
+        return "✅ 已登录，无需扫码"
+
+    @mcp.tool()
+    async def search_feeds(keyword: str) -> str:
+        """搜索笔记"""
+        await profile.wait("search_feeds")
+        feeds = []
+        for _ in range(FEEDS_PER_SEARCH):
+            counter["feed"] += 1
+            feeds.append({"id": f"{counter['feed']:024x}", "xsecToken": f"token{counter['feed']}"})
+        return json.dumps({"feeds": feeds, "count": len(feeds)}, ensure_ascii=False)
+
+    @mcp.tool()
+    async def get_feed_detail(feed_id: str, xsec_token: str) -> str:
+        """笔记详情"""
+        await profile.wait("get_feed_detail")
+        start = int(feed_id, 16) * IMAGES_PER_NOTE
+        image_list = []
+        for offset in range(IMAGES_PER_NOTE):
+            index = (start + offset) % len(fixture_sizes)
+            width, height = fixture_sizes[index]
+            image_list.append({
+                "urlDefault": f"{http_base}/images/img_{index:02d}.jpg",
+                "urlPre": f"{http_base}/images/pre_{index:02d}.jpg",
+                "width": width,
+                "height": height,
+            })
+        note = {
+            "noteId": feed_id,
+            "title": f"宝藏路线分享{feed_id[-4:]}",
+            "desc": "周末去逛了一圈，人不多 #旅游攻略[话题]# #citywalk[话题]#",
+            "imageList": image_list,
+        }
+        return json.dumps({"data": {"note": note}}, ensure_ascii=False)
+
+    @mcp.tool()
+    async def publish_content(title: str, content: str, images: list, tags: list = None) -> str:
+        """发布图文"""
+        await profile.wait("publish_content")
+        post_id = "".join(random.choice("0123456789abcdef") for _ in range(24))
+        return f"发布成功 Status:published PostID:{post_id}"
+
+    return mcp
+
+
+def build_http_app(profile, fixtures):
+    """模拟 OpenAI 兼容接口、飞书开放平台和图片CDN"""
+
+    # 见过的 system 消息（模拟服务商的前缀缓存：相同前缀按64 token为单位命中）
+    seen_prefixes = set()
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await profile.wait("llm")
+        text = json.dumps(GUIDE_RESPONSE, ensure_ascii=False)
+        messages = body.get("messages", [])
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        model = body.get("model", "fake-chat")
+
+        prefix = str(messages[0].get("content", "")) if messages and messages[0].get("role") == "system" else ""
+        cached = len(prefix) // 64 * 64 if prefix in seen_prefixes else 0
+        seen_prefixes.add(prefix)
+
+        usage = {
+            "prompt_tokens": prompt_chars,
+            "completion_tokens": len(text),
+            "total_tokens": prompt_chars + len(text),
+        }
+        if model.startswith("deepseek"):
+            usage.update(prompt_cache_hit_tokens=cached, prompt_cache_miss_tokens=prompt_chars - cached)
+        else:
+            usage["prompt_tokens_details"] = {"cached_tokens": cached}
+
+        if body.get("stream"):
+            async def events():
+                for i in range(0, len(text), 16):
+                    chunk = {
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": text[i:i + 16]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(0.005)
+                last = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+                }
+                yield f"data: {json.dumps(last, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return JSONResponse({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def feishu_token(request: Request):
+        await profile.wait("feishu")
+        return JSONResponse({"code": 0, "tenant_access_token": "t-fake", "expire": 7200})
+
+    async def feishu_tables(request: Request):
+        await profile.wait("feishu")
+        return JSONResponse({"code": 0, "data": {"items": [{"table_id": "tbl_fake", "name": "发布记录"}]}})
+
+    async def feishu_records(request: Request):
+        await request.json()
+        await profile.wait("feishu")
+        return JSONResponse({"code": 0, "data": {"record": {"record_id": "rec_fake"}}})
+
+    async def feishu_images(request: Request):
+        await request.body()
+        await profile.wait("feishu")
+        return JSONResponse({"code": 0, "data": {"image_key": "img_fake"}})
+
+    async def webhook(request: Request):
+        await request.json()
+        await profile.wait("feishu")
+        return JSONResponse({"code": 0, "msg": "success"})
+
+    async def image(request: Request):
+        data = fixtures.get(request.path_params["name"])
+        if data is None:
+            return Response(status_code=404)
+        await profile.wait("image")
+        return Response(data, media_type="image/jpeg")
+
+    async def health(request: Request):
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/chat/completions", chat_completions, methods=["POST"]),
+        Route("/open-apis/auth/v3/tenant_access_token/internal", feishu_token, methods=["POST"]),
+        Route("/open-apis/bitable/v1/apps/{app}/tables", feishu_tables, methods=["GET"]),
+        Route("/open-apis/bitable/v1/apps/{app}/tables/{table}/records", feishu_records, methods=["POST"]),
+        Route("/open-apis/im/v1/images", feishu_images, methods=["POST"]),
+        Route("/webhook", webhook, methods=["POST"]),
+        Route("/images/{name}", image, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+    ])
+
+
+def service_env(mcp_port=DEFAULT_MCP_PORT, http_port=DEFAULT_HTTP_PORT):
+    """让机器人连接模拟服务的环境变量"""
+    http_base = f"http://127.0.0.1:{http_port}"
+    return {
+        "XHS_MCP_URL": f"http://127.0.0.1:{mcp_port}/mcp",
+        "MCP_TRANSPORT": "http",
+        "AI_PROVIDER": "deepseek",
+        "DEEPSEEK_API_KEY": "sk-fake",
+        "DEEPSEEK_BASE_URL": f"{http_base}/v1",
+        "QWEN_API_KEY": "sk-fake",
+        "QWEN_BASE_URL": f"{http_base}/v1",
+        "FEISHU_BASE_URL": http_base,
+        "FEISHU_APP_ID": "cli_fake",
+        "FEISHU_APP_SECRET": "fake",
+        "FEISHU_WEBHOOK_URL": f"{http_base}/webhook",
+        "FEISHU_WEBHOOK_SECRET": "",
+        "FEISHU_TABLE_ID": "app_fake",
+        "FEISHU_TABLE_TABLE_ID": "",
+    }
+
+
+def parse_latency(values):
+    """解析 --latency name=中位数,sigma"""
+    overrides = {}
+    for value in values or []:
+        name, _, spec = value.partition("=")
+        median, _, sigma = spec.partition(",")
+        if name not in DEFAULT_LATENCY:
+            raise SystemExit(f"未知的接口: {name}（可选: {', '.join(DEFAULT_LATENCY)}）")
+        overrides[name] = (float(median), float(sigma or DEFAULT_LATENCY[name][1]))
+    return overrides
+
+
+async def serve(mcp_port, http_port, profile):
+    fixtures = make_image_fixtures()
+    fixture_sizes = []
+    from PIL import Image
+    for i in range(FIXTURE_COUNT):
+        with Image.open(BytesIO(fixtures[f"img_{i:02d}.jpg"])) as img:
+            fixture_sizes.append(img.size)
+
+    mcp = build_mcp(profile, f"http://127.0.0.1:{http_port}", fixture_sizes, mcp_port)
+    servers = [
+        uvicorn.Server(uvicorn.Config(mcp.streamable_http_app(), host="127.0.0.1", port=mcp_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(build_http_app(profile, fixtures), host="127.0.0.1", port=http_port, log_level="warning")),
+    ]
+    print(f"模拟服务已启动: MCP http://127.0.0.1:{mcp_port}/mcp  HTTP http://127.0.0.1:{http_port}", flush=True)
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟服务（MCP / OpenAI 兼容接口 / 飞书 / 图片CDN）")
+    parser.add_argument("--mcp-port", type=int, default=DEFAULT_MCP_PORT)
+    parser.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="所有延迟乘以该系数")
+    parser.add_argument("--latency", action="append", metavar="NAME=MEDIAN,SIGMA", help="覆盖某个接口的延迟分布")
+    parser.add_argument("--seed", type=int, help="延迟采样随机种子")
+    parser.add_argument("--print-env", action="store_true", help="打印连接模拟服务所需的环境变量")
+    args = parser.parse_args()
+
+    if args.print_env:
+        for key, value in service_env(args.mcp_port, args.http_port).items():
+            print(f"export {key}={value}")
+        return
+
+    profile = LatencyProfile(parse_latency(args.latency), args.latency_scale, args.seed)
+    asyncio.run(serve(args.mcp_port, args.http_port, profile))
+
+
+if __name__ == "__main__":
+    main()